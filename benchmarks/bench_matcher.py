@@ -0,0 +1,87 @@
+'''
+Benchmark del emparejamiento de evidencias: buscar_evidencia (original) frente a IndiceEvidencias.
+
+Genera carpetas sintéticas de 1k a 50k ficheros con nombres "<Empleado>_<Subproyecto> [Tipo].png",
+comprueba que ambas implementaciones asignan exactamente los mismos ficheros y mide el tiempo.
+
+Uso:
+    uv run python benchmarks/bench_matcher.py
+    uv run python benchmarks/bench_matcher.py --tamanos 1000 5000 --filas 200
+'''
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from matcher_evidencias import IndiceEvidencias, buscar_evidencia  # noqa: E402
+
+NOMBRES = ['Joel', 'Alberto', 'María', 'Lucía', 'Javier', 'Carmen', 'Sergio', 'Ana', 'David', 'Elena',
+           'Pablo', 'Laura', 'Jorge', 'Marta', 'Raúl', 'Sara', 'Iván', 'Paula', 'Óscar', 'Nuria']
+APELLIDOS = ['Urraco', 'López', 'Blasco', 'García', 'Martínez', 'Sánchez', 'Pérez', 'Gómez', 'Ruiz',
+             'Hernández', 'Jiménez', 'Moreno', 'Muñoz', 'Álvarez', 'Romero', 'Navarro', 'Torres', 'Gil']
+SUBPROYECTOS = ['Menu Planner', 'Group-e MVP', 'Centauro- Scrapping & Consultoría Data', 'Cookbook',
+                'Plataforma de reservas', 'Motor de recomendaciones', 'App logística', 'Portal de formación',
+                'Integración ERP', 'Cuadro de mando comercial', 'Chatbot de soporte', 'Gestor documental']
+TIPOS = ['JIRA', 'Commit', 'Confluence', 'Figma']
+
+
+def generar_datos(num_archivos: int, num_filas: int, semilla: int = 42):
+    """Genera nombres de fichero y filas (empleado, subproyecto) sintéticos."""
+    rnd = random.Random(semilla)
+    empleados = [f"{n} {a}" for n in NOMBRES for a in APELLIDOS]
+    archivos = []
+    vistos = set()
+    while len(archivos) < num_archivos:
+        nombre = f"{rnd.choice(empleados)}_{rnd.choice(SUBPROYECTOS)} [{rnd.choice(TIPOS)}]"
+        # Como en una carpeta real, los nombres repetidos se numeran
+        copia = 1
+        while (nombre, copia) in vistos:
+            copia += 1
+        vistos.add((nombre, copia))
+        archivos.append(f"{nombre}.png" if copia == 1 else f"{nombre} ({copia}).png")
+    filas = []
+    for _ in range(num_filas):
+        empleado = rnd.choice(empleados)
+        if rnd.random() < 0.2:
+            # Variantes habituales: apellido distinto, sin tilde, mayúsculas
+            empleado = rnd.choice([empleado.split()[0] + ' ' + rnd.choice(APELLIDOS), empleado.upper(),
+                                   empleado.replace('á', 'a').replace('é', 'e').replace('ó', 'o')])
+        filas.append((empleado, rnd.choice(SUBPROYECTOS)))
+    return archivos, filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del emparejamiento de evidencias')
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[1000, 5000, 20000, 50000],
+                        help='Número de ficheros de evidencia sintéticos')
+    parser.add_argument('--filas', type=int, default=100, help='Filas del Excel sintético')
+    parser.add_argument('--max-referencia', type=int, default=5000,
+                        help='No ejecutar buscar_evidencia por encima de este número de ficheros')
+    args = parser.parse_args()
+
+    print(f"{'ficheros':>9} {'filas':>6} {'original (s)':>13} {'indexado (s)':>13} {'mejora':>8} {'iguales':>8}")
+    for tamano in args.tamanos:
+        archivos, filas = generar_datos(tamano, args.filas)
+
+        inicio = time.perf_counter()
+        indice = IndiceEvidencias(archivos)
+        asignaciones = [indice.buscar(empleado, subproyecto) for empleado, subproyecto in filas]
+        tiempo_indexado = time.perf_counter() - inicio
+
+        if tamano <= args.max_referencia:
+            inicio = time.perf_counter()
+            referencia = [buscar_evidencia(empleado, subproyecto, archivos) for empleado, subproyecto in filas]
+            tiempo_original = time.perf_counter() - inicio
+            iguales = 'sí' if referencia == asignaciones else 'NO'
+            print(f"{tamano:>9} {len(filas):>6} {tiempo_original:>13.3f} {tiempo_indexado:>13.3f} "
+                  f"{tiempo_original / tiempo_indexado:>7.1f}x {iguales:>8}")
+        else:
+            print(f"{tamano:>9} {len(filas):>6} {'-':>13} {tiempo_indexado:>13.3f} {'-':>8} {'-':>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+'''
+Benchmark sin red del procesamiento completo de evidencias y del emparejamiento.
+
+Genera un CSV de evidencias y una carpeta de imágenes sintéticas (100, 1k y 10k filas por
+defecto), ejecuta ProcesadorEvidencias.procesar_csv con el modelo falso (latencia y tasas de
+error configurables, resultados reproducibles con --semilla) y mide el emparejamiento con
+IndiceEvidencias sobre el mismo número de ficheros. Cada caso se ejecuta en un proceso
+aparte para que el pico de memoria (RSS) de uno no contamine al siguiente.
+
+Uso:
+    uv run python benchmarks/bench_procesador.py
+    uv run python benchmarks/bench_procesador.py --tamanos 100 1000 --workers 8 --latencia 0.02
+    uv run python benchmarks/bench_procesador.py --tasa-429 0.05 --tasa-malformada 0.02 --lote 4
+'''
+
+import argparse
+import csv
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DIR_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIR_BENCHMARKS, '..', 'src'))
+sys.path.insert(0, DIR_BENCHMARKS)
+
+from bench_matcher import generar_datos  # noqa: E402
+
+COLUMNAS_ENTRADA = ['ID_Empleado', 'Nombre_Empleado', 'ID_Subproyecto', 'Nombre_Subproyecto',
+                    'ID_Proyecto', 'Nombre_Proyecto', 'Evidencia', 'Ruta_Evidencia']
+
+
+def pico_memoria_mb() -> float:
+    """Pico de memoria residente del proceso actual en MB."""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux da el valor en KB y macOS en bytes
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+def generar_dataset(directorio: str, num_filas: int, semilla: int = 42) -> str:
+    """
+    Crea una carpeta de imágenes PNG pequeñas y el CSV de evidencias que las referencia.
+
+    Cada imagen tiene un color distinto para que su hash (y por tanto la caché) no coincida.
+
+    Returns:
+        Ruta del CSV generado
+    """
+    from PIL import Image
+
+    archivos, filas = generar_datos(num_filas, num_filas, semilla)
+    dir_imagenes = os.path.join(directorio, 'Evidencias')
+    os.makedirs(dir_imagenes, exist_ok=True)
+    rnd = random.Random(semilla)
+    ruta_csv = os.path.join(directorio, 'evidencias.csv')
+    with open(ruta_csv, 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(COLUMNAS_ENTRADA)
+        for i, (archivo, (empleado, subproyecto)) in enumerate(zip(archivos, filas)):
+            ruta = os.path.join(dir_imagenes, archivo)
+            color = (i % 256, (i // 256) % 256, rnd.randrange(256))
+            Image.new('RGB', (320, 200), color).save(ruta)
+            escritor.writerow([100 + i % 50, empleado, f"SUB{i % 12:03d}", subproyecto,
+                               1, 'Proyecto sintético', archivo, ruta])
+    return ruta_csv
+
+
+def medir_procesador(num_filas: int, opciones: dict) -> dict:
+    """Ejecuta procesar_csv sobre un dataset sintético con el modelo falso."""
+    # Los errores simulados se cuentan en la tabla; no hace falta verlos en el log
+    logging.disable(logging.CRITICAL)
+    from backends_modelo import crear_modelo
+    from check_evidencias import EvidenciaValidator, ProcesadorEvidencias
+    from preprocesado_imagenes import PreprocesadorImagenes
+
+    with tempfile.TemporaryDirectory(prefix='bench_aqe_') as directorio:
+        ruta_csv = generar_dataset(directorio, num_filas, opciones['semilla'])
+        modelo = crear_modelo(
+            'falso',
+            latencia=opciones['latencia'],
+            tasa_429=opciones['tasa_429'],
+            tasa_error=opciones['tasa_error'],
+            tasa_malformada=opciones['tasa_malformada'],
+            variacion_latencia=0.2,
+            semilla=opciones['semilla']
+        )
+        validator = EvidenciaValidator(
+            modelo,
+            preprocesador=PreprocesadorImagenes(dir_cache=os.path.join(directorio, 'cache')),
+            opciones_cliente={'max_reintentos': 3, 'backoff_base': 0.01, 'backoff_max': 0.1}
+        )
+        memoria_inicial = pico_memoria_mb()
+        inicio = time.perf_counter()
+        ProcesadorEvidencias(validator).procesar_csv(
+            ruta_csv,
+            os.path.join(directorio, 'resultados.csv'),
+            workers=opciones['workers'],
+            tamano_lote=opciones['lote']
+        )
+        duracion = time.perf_counter() - inicio
+        informe = validator.metricas.informe()
+        return {
+            'duracion': duracion,
+            'filas_por_s': num_filas / duracion,
+            'memoria_mb': pico_memoria_mb(),
+            'incremento_mb': pico_memoria_mb() - memoria_inicial,
+            'llamadas': modelo.llamadas,
+            'parseo_p50_ms': informe['etapas'].get('parseo', {}).get('p50_s', 0) * 1000,
+            'validacion_p50_ms': informe['etapas'].get('validacion', {}).get('p50_s', 0) * 1000,
+            'errores': sum(informe['errores'].values()),
+        }
+
+
+def medir_matcher(num_filas: int, opciones: dict) -> dict:
+    """Construye el índice sobre num_filas ficheros y empareja num_filas filas."""
+    from matcher_evidencias import IndiceEvidencias
+
+    archivos, filas = generar_datos(num_filas, num_filas, opciones['semilla'])
+    memoria_inicial = pico_memoria_mb()
+    inicio = time.perf_counter()
+    indice = IndiceEvidencias(archivos)
+    asignadas = sum(1 for empleado, subproyecto in filas if indice.buscar(empleado, subproyecto))
+    duracion = time.perf_counter() - inicio
+    return {
+        'duracion': duracion,
+        'filas_por_s': num_filas / duracion,
+        'memoria_mb': pico_memoria_mb(),
+        'incremento_mb': pico_memoria_mb() - memoria_inicial,
+        'asignadas': asignadas,
+    }
+
+
+def ejecutar_aislado(funcion, num_filas: int, opciones: dict) -> dict:
+    """Ejecuta la medición en un proceso nuevo para aislar el pico de memoria."""
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as pool:
+        return pool.submit(funcion, num_filas, opciones).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sin red de procesar_csv y del emparejamiento')
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='Número de filas (y de imágenes) sintéticas')
+    parser.add_argument('--workers', type=int, default=8, help='Evidencias validadas en paralelo')
+    parser.add_argument('--lote', type=int, default=1, help='Evidencias por petición al modelo')
+    parser.add_argument('--latencia', type=float, default=0.01, help='Latencia media del modelo falso (s)')
+    parser.add_argument('--tasa-429', type=float, default=0.0, help='Probabilidad de error 429')
+    parser.add_argument('--tasa-error', type=float, default=0.0, help='Probabilidad de error 503')
+    parser.add_argument('--tasa-malformada', type=float, default=0.0, help='Probabilidad de JSON inválido')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla de datos y errores simulados')
+    parser.add_argument('--solo', choices=['procesador', 'matcher'], help='Ejecutar solo una de las mediciones')
+    args = parser.parse_args()
+
+    opciones = {
+        'workers': args.workers,
+        'lote': args.lote,
+        'latencia': args.latencia,
+        'tasa_429': args.tasa_429,
+        'tasa_error': args.tasa_error,
+        'tasa_malformada': args.tasa_malformada,
+        'semilla': args.semilla,
+    }
+
+    if args.solo != 'matcher':
+        print(f"procesar_csv (modelo falso, latencia {args.latencia} s, {args.workers} workers, lote {args.lote})")
+        print(f"{'filas':>7} {'tiempo (s)':>11} {'filas/s':>9} {'RSS (MB)':>9} {'+MB':>7} "
+              f"{'llamadas':>9} {'parseo p50 (ms)':>16} {'reglas p50 (ms)':>16} {'errores':>8}")
+        for tamano in args.tamanos:
+            r = ejecutar_aislado(medir_procesador, tamano, opciones)
+            print(f"{tamano:>7} {r['duracion']:>11.2f} {r['filas_por_s']:>9.1f} {r['memoria_mb']:>9.1f} "
+                  f"{r['incremento_mb']:>7.1f} {r['llamadas']:>9} {r['parseo_p50_ms']:>16.3f} "
+                  f"{r['validacion_p50_ms']:>16.3f} {r['errores']:>8}")
+
+    if args.solo != 'procesador':
+        print("\nEmparejamiento (IndiceEvidencias, mismos ficheros que filas)")
+        print(f"{'filas':>7} {'tiempo (s)':>11} {'filas/s':>9} {'RSS (MB)':>9} {'+MB':>7} {'asignadas':>10}")
+        for tamano in args.tamanos:
+            r = ejecutar_aislado(medir_matcher, tamano, opciones)
+            print(f"{tamano:>7} {r['duracion']:>11.2f} {r['filas_por_s']:>9.1f} {r['memoria_mb']:>9.1f} "
+                  f"{r['incremento_mb']:>7.1f} {r['asignadas']:>10}")
+
+
+if __name__ == '__main__':
+    main()
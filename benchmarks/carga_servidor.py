@@ -0,0 +1,156 @@
+'''
+Prueba de carga local del servidor de revisión (server.py o wsgi.py ya arrancado).
+
+Lanza varios clientes concurrentes (hilos con conexión keep-alive) durante un tiempo
+fijo contra los endpoints que usa el revisor y muestra, por endpoint, peticiones por
+segundo y latencias p50/p95/p99:
+
+    csv        -> GET /resultados_validacion.csv (con Accept-Encoding: gzip, br)
+    imagen     -> GET /evidencias/<fichero>?w=320 (miniatura WebP)
+    original   -> GET /evidencias/<fichero> (fichero original)
+    consulta   -> GET /api/resultados?pagina=1
+    guardar    -> PATCH /api/resultados/<fila> reescribiendo el valor que ya tiene
+                  (no cambia los datos, pero pasa por el registro de cambios y su bloqueo)
+
+Uso:
+    uv run python wsgi.py --workers 4 --threads 8 &
+    uv run python benchmarks/carga_servidor.py --concurrencia 16 --duracion 20
+    uv run python benchmarks/carga_servidor.py --endpoints csv guardar --url http://localhost:5001
+'''
+
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+from urllib.parse import quote, urlparse
+
+ENDPOINTS = ('csv', 'imagen', 'original', 'consulta', 'guardar')
+
+
+def _conexion(url: str) -> http.client.HTTPConnection:
+    partes = urlparse(url)
+    clase = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+    return clase(partes.hostname, partes.port, timeout=30)
+
+
+def preparar_objetivos(url: str) -> Dict:
+    """Consulta el servidor para elegir las filas y evidencias que se van a pedir."""
+    conexion = _conexion(url)
+    conexion.request('GET', '/api/resultados?pagina=1&por_pagina=200')
+    respuesta = conexion.getresponse()
+    cuerpo = respuesta.read()
+    if respuesta.status != 200:
+        raise RuntimeError(f"No se pudieron consultar los resultados ({respuesta.status}): {cuerpo[:200]!r}")
+    filas = json.loads(cuerpo)['resultados']
+    if not filas:
+        raise RuntimeError("El servidor no tiene resultados que consultar")
+    conexion.close()
+    return {
+        'filas': [(f['fila'], f.get('Link_imagen') or '', f.get('Nombre_ok') or '') for f in filas],
+        'imagenes': sorted({os.path.basename(f['Link_imagen']) for f in filas if f.get('Link_imagen')}),
+    }
+
+
+def peticion(endpoint: str, objetivos: Dict, rnd: random.Random):
+    """Devuelve (método, ruta, cabeceras, cuerpo) de una petición del endpoint."""
+    if endpoint == 'csv':
+        return 'GET', '/resultados_validacion.csv', {'Accept-Encoding': 'gzip, br'}, None
+    if endpoint in ('imagen', 'original'):
+        ruta = f"/evidencias/{quote(rnd.choice(objetivos['imagenes']))}"
+        return 'GET', ruta + ('?w=320' if endpoint == 'imagen' else ''), {}, None
+    if endpoint == 'consulta':
+        return 'GET', f"/api/resultados?pagina={rnd.randint(1, 5)}", {}, None
+    fila, link, valor = rnd.choice(objetivos['filas'])
+    cuerpo = json.dumps({'Link_imagen': link, 'campos': {'Nombre_ok': valor}})
+    return 'PATCH', f"/api/resultados/{fila}", {'Content-Type': 'application/json'}, cuerpo
+
+
+def cliente(url: str, endpoints: List[str], objetivos: Dict, fin: float, semilla: int, resultados: Dict):
+    """Hilo cliente: repite peticiones aleatorias a los endpoints hasta el instante fin."""
+    rnd = random.Random(semilla)
+    conexion = _conexion(url)
+    latencias = defaultdict(list)
+    errores = defaultdict(int)
+    while time.monotonic() < fin:
+        endpoint = rnd.choice(endpoints)
+        metodo, ruta, cabeceras, cuerpo = peticion(endpoint, objetivos, rnd)
+        inicio = time.perf_counter()
+        try:
+            conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status >= 400:
+                errores[endpoint] += 1
+        except (OSError, http.client.HTTPException):
+            errores[endpoint] += 1
+            conexion.close()
+            conexion = _conexion(url)
+            continue
+        latencias[endpoint].append(time.perf_counter() - inicio)
+    conexion.close()
+    resultados[semilla] = (latencias, errores)
+
+
+def percentil(valores: List[float], p: float) -> float:
+    if len(valores) < 2:
+        return valores[0] if valores else 0.0
+    return statistics.quantiles(valores, n=100, method='inclusive')[int(p) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga del servidor de revisión')
+    parser.add_argument('--url', default='http://localhost:5001', help='URL base del servidor')
+    parser.add_argument('--concurrencia', type=int, default=8, help='Clientes simultáneos')
+    parser.add_argument('--duracion', type=float, default=10.0, help='Segundos de prueba')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=['csv', 'imagen', 'guardar'],
+                        help='Endpoints a probar (se reparten al azar entre las peticiones)')
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args()
+
+    objetivos = preparar_objetivos(args.url)
+    if not objetivos['imagenes'] and {'imagen', 'original'} & set(args.endpoints):
+        raise SystemExit("Los resultados no tienen Link_imagen: no se pueden probar las evidencias")
+
+    resultados = {}
+    fin = time.monotonic() + args.duracion
+    hilos = [threading.Thread(target=cliente, args=(args.url, args.endpoints, objetivos, fin,
+                                                    args.semilla + i, resultados))
+             for i in range(args.concurrencia)]
+    inicio = time.monotonic()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.monotonic() - inicio
+
+    latencias = defaultdict(list)
+    errores = defaultdict(int)
+    for parciales, errores_parciales in resultados.values():
+        for endpoint, valores in parciales.items():
+            latencias[endpoint].extend(valores)
+        for endpoint, n in errores_parciales.items():
+            errores[endpoint] += n
+
+    print(f"{args.url}: {args.concurrencia} clientes durante {duracion:.1f} s")
+    print(f"{'endpoint':<10} {'peticiones':>10} {'errores':>8} {'req/s':>8} "
+          f"{'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'máx (ms)':>9}")
+    for endpoint in args.endpoints:
+        valores = latencias[endpoint]
+        if not valores:
+            print(f"{endpoint:<10} {0:>10} {errores[endpoint]:>8}")
+            continue
+        print(f"{endpoint:<10} {len(valores):>10} {errores[endpoint]:>8} {len(valores) / duracion:>8.1f} "
+              f"{percentil(valores, 50) * 1000:>9.1f} {percentil(valores, 95) * 1000:>9.1f} "
+              f"{percentil(valores, 99) * 1000:>9.1f} {max(valores) * 1000:>9.1f}")
+    total = sum(len(v) for v in latencias.values())
+    print(f"{'total':<10} {total:>10} {sum(errores.values()):>8} {total / duracion:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,4 @@
-import { useState, useEffect } from 'react'
-import Papa from 'papaparse'
+import { useState, useEffect, useRef } from 'react'
 import './index.css'
 import { HiPlus, HiMinus, HiCheck, HiX, HiUser, HiCalendar, HiClipboardList, HiArrowLeft, HiArrowRight, HiSave } from 'react-icons/hi'
 import SidebarList from './components/SidebarList'
@@ -8,9 +7,26 @@ import FieldCard from './components/FieldCard'
 import ToggleCheck from './components/ToggleCheck'
 import Navbar from './components/Navbar'
 import useGlobalHotkeys from './hooks/useGlobalHotkeys'
+import useEjecucionEnVivo from './hooks/useEjecucionEnVivo'
+import { API_URL } from './api'
 import { ToastContainer, toast } from 'react-toastify'
 import 'react-toastify/dist/ReactToastify.css'
 
+// Ancho de la miniatura (?w=) que se muestra al recorrer las evidencias; el original
+// solo se descarga al abrir la imagen
+const ANCHO_PREVIA = 320
+// Filas de cada página de /api/resultados
+const FILAS_POR_PAGINA = 200
+// Se pide la página siguiente cuando quedan menos de estas filas cargadas por delante
+const MARGEN_PRECARGA = 20
+
+// Las filas de la API traen números y null; la interfaz trabaja con el texto del CSV
+function filaComoTexto({ fila, ...datos }) {
+  return Object.fromEntries(
+    Object.entries(datos).map(([k, v]) => [k, v === null || v === undefined ? '' : String(v)])
+  )
+}
+
 // Hook para alto de ventana menos la barra
 function useWindowHeight(offset = 64) {
   const [height, setHeight] = useState(window.innerHeight - offset);
@@ -23,65 +39,91 @@ function useWindowHeight(offset = 64) {
 }
 
 function App() {
+  // Filas ya cargadas, desde la primera y en orden; total es el número de filas del servidor
   const [data, setData] = useState([])
+  const [total, setTotal] = useState(0)
+  const loadingPage = useRef(false)
   const [currentIndex, setCurrentIndex] = useState(0)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
   const [saving, setSaving] = useState(false)
   const [lastSaved, setLastSaved] = useState(null)
+  // Cambios pendientes de guardar: índice de fila -> { Link_imagen, campos }
+  const pendingChanges = useRef({})
   
   // Estados para zoom y arrastre de imagen
   const [imageZoom, setImageZoom] = useState(1)
   const [imagePosition, setImagePosition] = useState({ x: 0, y: 0 })
   const [isDragging, setIsDragging] = useState(false)
   const [dragStart, setDragStart] = useState({ x: 0, y: 0 })
+  const [showOriginal, setShowOriginal] = useState(false)
 
   const sidebarHeight = useWindowHeight(64);
 
-  useEffect(() => {
-    const fetchData = async () => {
-      try {
-        const response = await fetch('http://localhost:5001/resultados_validacion.csv', {
-          method: 'GET',
-          headers: {
-            'Accept': 'text/csv',
-          },
-          mode: 'cors'
-        })
-        if (!response.ok) {
-          throw new Error(`HTTP error! status: ${response.status}`)
-        }
-        const csv = await response.text()
-        Papa.parse(csv, {
-          header: true,
-          skipEmptyLines: true,
-          complete: (results) => {
-            setData(results.data)
-            setLoading(false)
-          },
-          error: (error) => {
-            setError('Error al procesar el archivo CSV: ' + error.message)
-            setLoading(false)
-          }
-        })
-      } catch (error) {
-        setError('Error al cargar los datos: ' + error.message)
-        setLoading(false)
+  // Resultados de una validación en curso: se añaden según llegan (la posición evita duplicados)
+  // Las que aún no se han cargado llegarán con su página
+  const progresoEjecucion = useEjecucionEnVivo((fila, datos) => {
+    setData(prev => (fila === prev.length ? [...prev, datos] : prev))
+    setTotal(prev => Math.max(prev, fila + 1))
+  })
+
+  // Carga una página de resultados y añade las filas que siguen a las ya cargadas
+  const loadPage = async (pagina) => {
+    loadingPage.current = true
+    try {
+      const response = await fetch(`${API_URL}/api/resultados?pagina=${pagina}&por_pagina=${FILAS_POR_PAGINA}`, {
+        headers: { 'Accept': 'application/json' },
+        mode: 'cors'
+      })
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`)
       }
+      const page = await response.json()
+      setTotal(prev => Math.max(prev, page.total))
+      setData(prev => {
+        // Las filas ya cargadas (quizá editadas o recibidas en vivo) no se sustituyen
+        const nuevas = page.resultados.filter(row => row.fila >= prev.length)
+        if (nuevas.length === 0 || nuevas[0].fila !== prev.length) return prev
+        return [...prev, ...nuevas.map(filaComoTexto)]
+      })
+    } finally {
+      loadingPage.current = false
     }
-    fetchData()
+  }
+
+  useEffect(() => {
+    loadPage(1)
+      .catch((error) => setError('Error al cargar los datos: ' + error.message))
+      .finally(() => setLoading(false))
   }, [])
 
+  // Pide la página siguiente al acercarse al final de lo cargado
+  useEffect(() => {
+    if (loading || loadingPage.current || data.length >= total) return
+    if (currentIndex >= data.length - MARGEN_PRECARGA) {
+      loadPage(Math.floor(data.length / FILAS_POR_PAGINA) + 1).catch((error) => {
+        console.error('Error al cargar resultados:', error)
+        toast.error('Error al cargar más resultados')
+      })
+    }
+  }, [currentIndex, data.length, total, loading])
+
   const handleCheckboxChange = (field) => {
     const newData = [...data]
     newData[currentIndex][field] = newData[currentIndex][field] === '1' || newData[currentIndex][field] === 1 ? 0 : 1
+    // Solo se envían al servidor los campos modificados de cada fila
+    const pending = pendingChanges.current[currentIndex] || { Link_imagen: newData[currentIndex].Link_imagen, campos: {} }
+    pending.campos[field] = newData[currentIndex][field]
+    pendingChanges.current[currentIndex] = pending
     setData(newData)
   }
 
-  const getImageUrl = (ruta) => {
+  // Con ancho se pide la miniatura WebP del servidor; sin él, el fichero original
+  const getImageUrl = (ruta, ancho) => {
     if (!ruta) return 'https://via.placeholder.com/600x800?text=Imagen+no+disponible';
     const filename = ruta.split('/').pop();
-    return `http://localhost:5001/evidencias/${encodeURIComponent(filename)}`;
+    const url = `${API_URL}/evidencias/${encodeURIComponent(filename)}`;
+    return ancho ? `${url}?w=${ancho}` : url;
   };
 
   // Funciones para zoom
@@ -122,37 +164,52 @@ function App() {
     setIsDragging(false)
   }
 
-  // Resetear zoom y posición cuando cambia la imagen
+  // Resetear zoom, posición y vista del original cuando cambia la imagen
   useEffect(() => {
     setImageZoom(1)
     setImagePosition({ x: 0, y: 0 })
+    setShowOriginal(false)
   }, [currentIndex])
 
-  // Función para guardar los datos en CSV
-  const saveDataToCSV = async () => {
+  // Precarga la miniatura de la siguiente evidencia para que la navegación sea inmediata
+  useEffect(() => {
+    const next = data[currentIndex + 1]
+    if (next && next.Link_imagen) {
+      new Image().src = getImageUrl(next.Link_imagen, ANCHO_PREVIA)
+    }
+  }, [currentIndex, data])
+
+  // Función para guardar los cambios pendientes (solo las filas y campos modificados)
+  const saveChanges = async () => {
+    const changes = pendingChanges.current
+    const rows = Object.keys(changes)
+    if (rows.length === 0) return
+    pendingChanges.current = {}
     setSaving(true)
     try {
-      // Generar CSV con Papa Parse
-      const csv = Papa.unparse(data, {
-        header: true,
-        skipEmptyLines: true
-      })
-      
-      // Enviar al backend
-      const response = await fetch('http://localhost:5001/save-results', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        mode: 'cors',
-        body: JSON.stringify({ csvData: csv })
-      })
-      
-      if (!response.ok) throw new Error(`Error al guardar: ${response.status}`)
+      for (const row of rows) {
+        const response = await fetch(`${API_URL}/api/resultados/${row}`, {
+          method: 'PATCH',
+          headers: { 'Content-Type': 'application/json' },
+          mode: 'cors',
+          body: JSON.stringify(changes[row])
+        })
+        if (!response.ok) throw new Error(`Error al guardar: ${response.status}`)
+        delete changes[row]
+      }
       setLastSaved(new Date())
       toast.success('Guardado', { autoClose: 1500 })
       
     } catch (error) {
       console.error('Error al guardar:', error)
       toast.error('Error al guardar')
+      // Los cambios no guardados se reintentan en el próximo guardado
+      for (const row of Object.keys(changes)) {
+        const newer = pendingChanges.current[row]
+        pendingChanges.current[row] = newer
+          ? { ...newer, campos: { ...changes[row].campos, ...newer.campos } }
+          : changes[row]
+      }
     } finally {
       setSaving(false)
     }
@@ -161,7 +218,7 @@ function App() {
   // Función para navegar y guardar automáticamente
   const navigateAndSave = (direction) => {
     // Primero guardamos los datos actuales
-    saveDataToCSV()
+    saveChanges()
     
     // Luego navegamos
     if (direction === 'prev') {
@@ -173,9 +230,9 @@ function App() {
 
   // Guardar automáticamente cuando cambian los datos
   useEffect(() => {
-    if (data.length > 0 && lastSaved) {
+    if (data.length > 0 && Object.keys(pendingChanges.current).length > 0) {
       const timer = setTimeout(() => {
-        saveDataToCSV()
+        saveChanges()
       }, 2000) // Guardar 2 segundos después del último cambio
       
       return () => clearTimeout(timer)
@@ -187,14 +244,14 @@ function App() {
     prev: () => navigateAndSave('prev'),
     next: () => navigateAndSave('next'),
     toggle: handleCheckboxChange,
-    save: saveDataToCSV
+    save: saveChanges
   })
 
   // Función para descarga rápida del CSV desde la barra
   const handleDownload = () => {
-    saveDataToCSV().then(() => {
+    saveChanges().then(() => {
       const link = document.createElement('a')
-      link.href = 'http://localhost:5001/resultados_validacion.csv'
+      link.href = `${API_URL}/resultados_validacion.csv`
       link.download = 'resultados_validacion.csv'
       link.click()
     })
@@ -254,12 +311,19 @@ function App() {
   return (
     <div className="h-screen flex flex-col">
       <Navbar
-        total={data.length}
+        total={total}
         current={currentIndex + 1}
         saving={saving}
         lastSaved={lastSaved}
         onDownload={handleDownload}
       />
+      {progresoEjecucion && progresoEjecucion.estado === 'validando' && (
+        <div className="px-4 py-1 text-sm bg-violet-50 text-violet-700 border-b">
+          Validando {progresoEjecucion.hechas}/{progresoEjecucion.total || '?'} evidencias
+          {progresoEjecucion.por_minuto > 0 && ` · ${progresoEjecucion.por_minuto} por minuto`}
+          {progresoEjecucion.eta_s != null && ` · quedan ~${Math.ceil(progresoEjecucion.eta_s / 60)} min`}
+        </div>
+      )}
       <div className="flex flex-1 min-h-0 overflow-hidden">
         {/* Sidebar lista */}
         <aside className="w-64 border-r bg-gradient-to-b from-violet-50 to-white flex-shrink-0 flex flex-col">
@@ -269,8 +333,18 @@ function App() {
         </aside>
 
         {/* Visor de imagen */}
-        <main className="flex-1 bg-gradient-to-br from-violet-50 via-blue-50 to-indigo-100 p-4 overflow-hidden flex items-center justify-center">
-          <EvidenceViewer imageUrl={getImageUrl(currentItem.Link_imagen)} />
+        <main className="relative flex-1 bg-gradient-to-br from-violet-50 via-blue-50 to-indigo-100 p-4 overflow-hidden flex items-center justify-center">
+          <EvidenceViewer
+            imageUrl={getImageUrl(currentItem.Link_imagen, showOriginal ? null : ANCHO_PREVIA)}
+          />
+          {currentItem.Link_imagen && !showOriginal && (
+            <button
+              onClick={() => setShowOriginal(true)}
+              className="absolute top-4 right-4 px-3 py-1 text-sm bg-white/90 text-violet-700 rounded-lg shadow hover:bg-white"
+            >
+              Abrir original
+            </button>
+          )}
         </main>
 
         {/* Panel de validación */}
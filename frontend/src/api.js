@@ -0,0 +1,4 @@
+// En desarrollo (npm run dev) el backend corre aparte en el puerto 5001; el build de
+// producción lo sirve el propio backend, así que basta con rutas relativas.
+// Se puede forzar otra URL con VITE_API_URL.
+export const API_URL = import.meta.env.VITE_API_URL ?? (import.meta.env.DEV ? 'http://localhost:5001' : '');
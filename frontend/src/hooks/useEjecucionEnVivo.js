@@ -0,0 +1,54 @@
+import { useEffect, useRef, useState } from 'react';
+import { API_URL as API } from '../api';
+
+/**
+ * Hook que sigue la validación en curso (si la hay) mediante Server-Sent Events.
+ * Cada evidencia validada se entrega a onFila(posicion, fila) en cuanto termina.
+ * @param {Function} onFila - callback (posicion, fila) para cada resultado nuevo
+ * @returns {Object|null} progreso {estado, hechas, total, por_minuto, eta_s}
+ */
+export default function useEjecucionEnVivo(onFila) {
+  const [progreso, setProgreso] = useState(null);
+  const onFilaRef = useRef(onFila);
+  onFilaRef.current = onFila;
+
+  useEffect(() => {
+    let fuente = null;
+    let cancelado = false;
+
+    fetch(`${API}/api/ejecuciones`, { mode: 'cors' })
+      .then(response => (response.ok ? response.json() : null))
+      .then(ejecucion => {
+        if (cancelado || !ejecucion || ejecucion.estado === 'terminada' || ejecucion.estado === 'error') return;
+        setProgreso(ejecucion);
+        // EventSource reconecta solo y envía Last-Event-ID para no repetir eventos
+        fuente = new EventSource(`${API}/api/ejecuciones/${ejecucion.id}/eventos`);
+        fuente.addEventListener('fila', (e) => {
+          const { fila, datos, ...resto } = JSON.parse(e.data);
+          // Mismo formato de texto que las filas cargadas de /api/resultados
+          const filaTexto = Object.fromEntries(
+            Object.entries(datos).map(([k, v]) => [k, v === null || v === undefined ? '' : String(v)])
+          );
+          onFilaRef.current(fila, filaTexto);
+          setProgreso(prev => ({ ...prev, ...resto, estado: 'validando' }));
+        });
+        const cerrar = (estado) => (e) => {
+          setProgreso(prev => ({ ...prev, ...JSON.parse(e.data), estado }));
+          fuente.close();
+        };
+        fuente.addEventListener('fin', cerrar('terminada'));
+        fuente.addEventListener('error', (e) => {
+          // Los errores de conexión no traen datos: EventSource reintenta solo
+          if (e.data) cerrar('error')(e);
+        });
+      })
+      .catch(() => {});
+
+    return () => {
+      cancelado = true;
+      if (fuente) fuente.close();
+    };
+  }, []);
+
+  return progreso;
+}
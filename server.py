@@ -1,35 +1,136 @@
-from flask import Flask, Response, send_from_directory, request, jsonify
+from flask import Flask, Response, send_file, send_from_directory, request, jsonify, stream_with_context
+from werkzeug.security import safe_join
 from flask_cors import CORS
+from email.utils import formatdate, parsedate_to_datetime
+import atexit
+import gzip
+import hashlib
 import os
+import sys
 import logging
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from almacen_resultados import AlmacenResultados, ConflictoFila
+from ejecuciones_validacion import EjecucionEnCurso, GestorEjecuciones, formato_sse
+from estaticos_frontend import EstaticosFrontend
+from indice_resultados import FILTROS, IndiceResultados
+from miniaturas import ANCHOS_POR_DEFECTO, GeneradorMiniaturas
+
+# brotli es opcional: si no está instalado se comprime solo con gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-# Configurar CORS para permitir todas las solicitudes
+# CORS se resuelve una sola vez por petición aquí (incluidas las preflight OPTIONS).
+# Orígenes permitidos configurables con CORS_ORIGENES=https://a.example,https://b.example
+ORIGENES_CORS = [o.strip() for o in os.getenv('CORS_ORIGENES', 'http://localhost:5173,http://127.0.0.1:5173').split(',')
+                 if o.strip()]
 CORS(app, resources={
     r"/*": {
-        "origins": ["http://localhost:5173", "http://127.0.0.1:5173"],
-        "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Accept"],
-        "expose_headers": ["Content-Type", "Content-Length"]
+        "origins": ORIGENES_CORS,
+        "methods": ["GET", "POST", "PATCH", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Accept", "Last-Event-ID"],
+        "expose_headers": ["Content-Type", "Content-Length", "Content-Range", "Accept-Ranges", "ETag"]
     }
 })
 
+RESULTADOS_FINALES = 'resultados_finales_validados.csv'
+# Entrada y salida de las validaciones lanzadas desde el servidor
+EVIDENCIAS_CSV = 'evidencias_2024.csv'
+RESULTADOS_VALIDACION = 'resultados_validacion.csv'
+# Relativa a server.py, igual que la resuelve send_from_directory, aunque se arranque desde otra carpeta
+DIR_EVIDENCIAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'Evidencias 2024')
+# Build del frontend (npm run build) que se sirve en / cuando existe
+DIR_FRONTEND = os.getenv('FRONTEND_DIST', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend', 'dist'))
+# Anchos de miniatura permitidos, configurables con MINIATURAS_ANCHOS=160,320,640
+ANCHOS_MINIATURA = tuple(int(a) for a in os.getenv('MINIATURAS_ANCHOS', '').split(',') if a.strip()) or ANCHOS_POR_DEFECTO
+# Las evidencias no cambian durante una campaña de revisión: el navegador puede guardarlas un día
+MAX_AGE_EVIDENCIAS = 24 * 3600
+
+
+class CacheFichero:
+    """
+    Contenido del CSV de resultados en memoria, con sus versiones comprimidas.
+    
+    El contenido se exporta del almacén con los cambios por fila pendientes ya
+    aplicados, sin compactar el fichero. Se regenera solo cuando cambia la firma
+    del almacén (el CSV en disco o su registro de cambios), o cuando se invalida
+    explícitamente tras guardarlo.
+    """
+    
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self._lock = threading.Lock()
+        self._firma = None
+        self._entrada = None
+    
+    def obtener(self):
+        """Devuelve un diccionario con el contenido, su ETag, Last-Modified y las versiones comprimidas."""
+        firma = self.almacen.firma()
+        with self._lock:
+            if self._firma != firma:
+                firma, contenido, modificado = self.almacen.exportar()
+                logger.info(f"Cargado {self.almacen.ruta_csv} en memoria ({len(contenido)} bytes)")
+                self._entrada = {
+                    'contenido': contenido,
+                    'etag': hashlib.sha1(contenido).hexdigest(),
+                    'last_modified': int(modificado),
+                    'gzip': gzip.compress(contenido, compresslevel=6),
+                    'br': brotli.compress(contenido) if brotli is not None else None,
+                }
+                self._firma = firma
+            return self._entrada
+    
+    def invalidar(self):
+        with self._lock:
+            self._firma = None
+            self._entrada = None
+
+
+almacen_resultados = AlmacenResultados(RESULTADOS_FINALES)
+cache_resultados = CacheFichero(almacen_resultados)
+indice_resultados = IndiceResultados(almacen_resultados)
+miniaturas = GeneradorMiniaturas(anchos=ANCHOS_MINIATURA)
+ejecuciones = GestorEjecuciones(almacen_resultados, EVIDENCIAS_CSV, RESULTADOS_VALIDACION)
+estaticos = EstaticosFrontend(DIR_FRONTEND)
+
+
+@atexit.register
+def _compactar_al_salir():
+    """Aplica al CSV los cambios por fila que queden en el registro al parar el servidor."""
+    if not os.path.exists(RESULTADOS_FINALES):
+        return
+    try:
+        almacen_resultados.compactar()
+    except Exception as e:
+        logger.error(f"Error al compactar {RESULTADOS_FINALES} al salir: {str(e)}")
+
+
+def _no_modificado(etag, last_modified):
+    """Comprueba las cabeceras condicionales (If-None-Match tiene prioridad sobre If-Modified-Since)."""
+    if request.headers.get('If-None-Match'):
+        return etag in request.if_none_match
+    desde = request.headers.get('If-Modified-Since')
+    if desde:
+        try:
+            return int(parsedate_to_datetime(desde).timestamp()) >= last_modified
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
 @app.route('/resultados_validacion.csv')
 def serve_csv():
     try:
-        # Listar archivos en el directorio actual
-        current_dir = os.getcwd()
-        logger.info(f"Directorio actual: {current_dir}")
-        logger.info("Archivos en el directorio:")
-        for file in os.listdir(current_dir):
-            logger.info(f"- {file}")
-        
         # Primero intentamos leer el archivo de resultados finales
-        csv_path = 'resultados_finales_validados.csv'
+        csv_path = RESULTADOS_FINALES
         
         # Si no existe, intentamos copiar desde el archivo original
         if not os.path.exists(csv_path):
@@ -44,42 +145,41 @@ def serve_csv():
                 logger.error("No se encontró ningún archivo de resultados")
                 return "No se encontró ningún archivo de resultados. Por favor, ejecute primero el validador de evidencias.", 404
         
-        logger.info(f"Intentando servir el archivo: {csv_path}")
+        # Servimos desde memoria con los cambios por fila pendientes aplicados; el CSV
+        # solo se compacta al llegar al umbral de cambios o al parar el servidor
+        entrada = cache_resultados.obtener()
         
-        # Leer el contenido del archivo
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        # Elegimos la codificación según lo que acepte el cliente
+        codificacion = None
+        cuerpo = entrada['contenido']
+        if entrada['br'] is not None and 'br' in request.accept_encodings:
+            codificacion, cuerpo = 'br', entrada['br']
+        elif 'gzip' in request.accept_encodings:
+            codificacion, cuerpo = 'gzip', entrada['gzip']
+        # Cada codificación es una representación distinta y lleva su propio ETag
+        etag = entrada['etag'] + (f"-{codificacion}" if codificacion else '')
         
-        logger.info("Archivo leído correctamente")
+        headers = {
+            'Content-Type': 'text/csv; charset=utf-8',
+            'ETag': f'"{etag}"',
+            'Last-Modified': formatdate(entrada['last_modified'], usegmt=True),
+            # El navegador puede guardar el CSV pero debe revalidarlo en cada petición
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding'
+        }
+        if _no_modificado(etag, entrada['last_modified']):
+            return Response(status=304, headers=headers)
         
-        # Crear respuesta con headers CORS
-        response = Response(
-            content,
-            mimetype='text/csv',
-            headers={
-                'Access-Control-Allow-Origin': 'http://localhost:5173',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Accept',
-                'Access-Control-Expose-Headers': 'Content-Type, Content-Length',
-                'Content-Type': 'text/csv; charset=utf-8'
-            }
-        )
-        return response
+        if codificacion:
+            headers['Content-Encoding'] = codificacion
+        return Response(cuerpo, headers=headers)
         
     except Exception as e:
         logger.error(f"Error al servir el archivo: {str(e)}")
         return str(e), 500
 
-@app.route('/save-results', methods=['POST', 'OPTIONS'])
+@app.route('/save-results', methods=['POST'])
 def save_results():
-    if request.method == 'OPTIONS':
-        # Respuesta preflight para CORS
-        response = jsonify({'message': 'OK'})
-        response.headers['Access-Control-Allow-Origin'] = 'http://localhost:5173'
-        response.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Accept'
-        return response
-    
     try:
         # Obtener los datos del CSV del frontend
         data = request.get_json()
@@ -89,34 +189,175 @@ def save_results():
             return jsonify({'error': 'No se recibieron datos CSV'}), 400
         
         # Guardar en el archivo de resultados finales
-        with open('resultados_finales_validados.csv', 'w', encoding='utf-8') as f:
-            f.write(csv_data)
+        almacen_resultados.reemplazar(csv_data)
+        cache_resultados.invalidar()
         
         logger.info("Resultados finales guardados correctamente")
         
-        response = jsonify({
+        return jsonify({
             'message': 'Datos guardados correctamente'
         })
-        response.headers['Access-Control-Allow-Origin'] = 'http://localhost:5173'
-        return response
         
     except Exception as e:
         logger.error(f"Error al guardar los datos: {str(e)}")
-        response = jsonify({'error': f'Error interno del servidor: {str(e)}'})
-        response.headers['Access-Control-Allow-Origin'] = 'http://localhost:5173'
-        return response, 500
+        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+
+@app.route('/api/resultados')
+def listar_resultados():
+    """
+    Consulta paginada de los resultados finales.
+    
+    Parámetros: pagina, por_pagina, orden, desc (1 para descendente), q (texto en
+    la justificación) y los filtros Nombre_ok, Periodo_ok, Tarea_ok, empleado y subproyecto.
+    """
+    if not os.path.exists(RESULTADOS_FINALES):
+        return jsonify({'error': 'No se encontró el archivo de resultados'}), 404
+    
+    filtros = {nombre: request.args[nombre] for nombre in FILTROS if request.args.get(nombre) not in (None, '')}
+    try:
+        resultado = indice_resultados.consultar(
+            pagina=request.args.get('pagina', 1, type=int),
+            por_pagina=request.args.get('por_pagina', 50, type=int),
+            orden=request.args.get('orden', 'fila'),
+            descendente=request.args.get('desc') in ('1', 'true'),
+            filtros=filtros,
+            texto=request.args.get('q')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(resultado)
+
+@app.route('/api/resultados/<int:fila>', methods=['PATCH'])
+def actualizar_resultado(fila):
+    """
+    Actualiza solo los campos modificados de una fila de los resultados finales.
+    
+    Cuerpo JSON: {"Link_imagen": "...", "campos": {"Nombre_ok": 1}}
+    Link_imagen es opcional y sirve para comprobar que la fila sigue siendo la misma.
+    """
+    data = request.get_json(silent=True) or {}
+    campos = data.get('campos')
+    if not isinstance(campos, dict) or not campos:
+        return jsonify({'error': 'No se recibieron campos a actualizar'}), 400
+    
+    if not os.path.exists(RESULTADOS_FINALES):
+        return jsonify({'error': 'No se encontró el archivo de resultados'}), 404
+    
+    try:
+        fila_actualizada = almacen_resultados.actualizar(fila, campos, data.get('Link_imagen'))
+    except IndexError as e:
+        return jsonify({'error': str(e)}), 404
+    except KeyError as e:
+        return jsonify({'error': str(e)}), 400
+    except ConflictoFila as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logger.error(f"Error al actualizar la fila {fila}: {str(e)}")
+        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+    
+    logger.info(f"Fila {fila} actualizada: {campos}")
+    return jsonify({'fila': fila, 'datos': fila_actualizada})
+
+@app.route('/api/ejecuciones', methods=['GET', 'POST'])
+def ejecuciones_validacion():
+    """
+    POST lanza una validación en segundo plano; GET devuelve el estado de la última.
+    
+    Cuerpo JSON del POST: {"opciones": {"limite": 50, "workers": 4, "backend": "falso"}, "sobrescribir": false}
+    Los resultados se añaden a los resultados finales según se validan, así que
+    el CSV de revisión debe estar vacío o hay que indicar sobrescribir (se guarda
+    antes una copia .bak, cuya ruta se devuelve en copia_seguridad).
+    """
+    if request.method == 'GET':
+        ejecucion = ejecuciones.actual()
+        if ejecucion is None:
+            return jsonify({'error': 'No se ha lanzado ninguna validación'}), 404
+        return jsonify(ejecucion.estado_actual())
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        ejecucion = ejecuciones.iniciar(data.get('opciones'), sobrescribir=bool(data.get('sobrescribir')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except EjecucionEnCurso as e:
+        return jsonify({'error': str(e)}), 409
+    cache_resultados.invalidar()
+    logger.info(f"Validación {ejecucion.id} lanzada con {ejecucion.opciones}")
+    return jsonify(ejecucion.estado_actual()), 202
+
+@app.route('/api/ejecuciones/<int:id_ejecucion>')
+def estado_ejecucion(id_ejecucion):
+    ejecucion = ejecuciones.obtener(id_ejecucion)
+    if ejecucion is None:
+        return jsonify({'error': f'No existe la ejecución {id_ejecucion}'}), 404
+    return jsonify(ejecucion.estado_actual())
+
+@app.route('/api/ejecuciones/<int:id_ejecucion>/eventos')
+def eventos_ejecucion(id_ejecucion):
+    """
+    Progreso en vivo de una validación como Server-Sent Events.
+    
+    Cada evidencia validada llega como evento "fila" con su posición en los
+    resultados finales (se puede corregir ya con PATCH /api/resultados/<fila>),
+    las evidencias por minuto y el tiempo estimado hasta terminar. Al reconectar,
+    el navegador envía Last-Event-ID y solo recibe los eventos que le faltan.
+    """
+    ejecucion = ejecuciones.obtener(id_ejecucion)
+    if ejecucion is None:
+        return jsonify({'error': f'No existe la ejecución {id_ejecucion}'}), 404
+    desde = request.headers.get('Last-Event-ID', type=int) or request.args.get('desde', 0, type=int)
+    
+    def generar():
+        for evento in ejecucion.eventos(desde):
+            yield formato_sse(evento)
+    
+    headers = {
+        'Cache-Control': 'no-cache',
+        # Evita que un proxy intermedio (nginx) acumule los eventos
+        'X-Accel-Buffering': 'no',
+    }
+    return Response(stream_with_context(generar()), mimetype='text/event-stream', headers=headers)
 
 @app.route('/evidencias/<path:filename>')
 def evidencias(filename):
-    return send_from_directory('data/Evidencias 2024', filename)
-
-@app.after_request
-def after_request(response):
-    response.headers['Access-Control-Allow-Origin'] = 'http://localhost:5173'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Accept'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    response.headers['Access-Control-Expose-Headers'] = 'Content-Type, Content-Length'
-    return response
+    """
+    Sirve una evidencia. Con ?w=<ancho> devuelve una miniatura WebP.
+    
+    Las respuestas llevan ETag y Cache-Control largo, y admiten peticiones
+    condicionales (304) y por rangos (útil para los PDF).
+    """
+    ancho = request.args.get('w', type=int)
+    if not ancho:
+        return send_from_directory(DIR_EVIDENCIAS, filename, conditional=True, max_age=MAX_AGE_EVIDENCIAS)
+    
+    ruta_original = safe_join(DIR_EVIDENCIAS, filename)
+    if ruta_original is None or not os.path.isfile(ruta_original):
+        return jsonify({'error': 'Evidencia no encontrada'}), 404
+    try:
+        ruta_miniatura, etag = miniaturas.obtener(ruta_original, ancho)
+    except ImportError as e:
+        # PDF sin pypdfium2 instalado: se sirve el original
+        logger.warning(f"No se pudo generar la miniatura de {filename}: {str(e)}")
+        return send_from_directory(DIR_EVIDENCIAS, filename, conditional=True, max_age=MAX_AGE_EVIDENCIAS)
+    except Exception as e:
+        logger.error(f"Error al generar la miniatura de {filename}: {str(e)}")
+        return jsonify({'error': f'No se pudo generar la miniatura: {str(e)}'}), 500
+    return send_file(os.path.abspath(ruta_miniatura), mimetype='image/webp', conditional=True, etag=etag, max_age=MAX_AGE_EVIDENCIAS)
+
+@app.route('/', defaults={'ruta': ''})
+@app.route('/<path:ruta>')
+def frontend(ruta):
+    """
+    Sirve el build del frontend (frontend/dist) con las versiones precomprimidas.
+    
+    Los ficheros de assets/ se cachean como inmutables; el resto de rutas devuelve index.html.
+    """
+    if ruta.startswith('api/'):
+        return jsonify({'error': 'Ruta no encontrada'}), 404
+    respuesta = estaticos.servir(ruta, request.accept_encodings)
+    if respuesta is None:
+        return "No se encontró el build del frontend. Ejecute 'npm run build' en frontend/ o use 'npm run dev'.", 404
+    return respuesta
 
 if __name__ == '__main__':
     logger.info("Iniciando servidor Flask en puerto 5001...")
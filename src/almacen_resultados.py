@@ -0,0 +1,305 @@
+'''
+Almacén de los resultados finales validados con actualizaciones por fila.
+
+El revisor solo cambia unas pocas celdas cada vez, así que en lugar de reescribir
+el CSV completo en cada guardado:
+
+- cada cambio se añade a un registro (fichero .cambios.jsonl junto al CSV)
+- el CSV se compacta (se aplican los cambios y se reescribe de forma atómica con
+  fichero temporal + rename) cuando el registro crece o al parar el servidor; para
+  servirlo completo se exporta desde memoria con los cambios pendientes aplicados
+- todas las operaciones se hacen con un bloqueo de fichero, así que varios
+  revisores (o varios procesos del servidor) pueden guardar a la vez sin perder
+  cambios: cada cambio solo toca los campos modificados de una fila
+
+Las filas se identifican por su posición en el CSV y se comprueba su Link_imagen
+para detectar que el fichero no ha cambiado de orden por debajo. Una validación en
+curso puede ir añadiendo filas al final (anadir) sin cambiar las posiciones existentes.
+'''
+
+import csv
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# fcntl solo existe en sistemas POSIX; en Windows el bloqueo queda limitado al proceso
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Número de cambios registrados a partir del cual se compacta el CSV
+UMBRAL_COMPACTACION = 200
+
+
+def _celda(valor) -> str:
+    """Valor de una celda del CSV: None y NaN (celda vacía leída con pandas) se guardan vacíos."""
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return ''
+    return str(valor)
+
+
+class ConflictoFila(Exception):
+    """La fila indicada ya no corresponde a la evidencia que el cliente tenía cargada."""
+
+
+class AlmacenResultados:
+    def __init__(self, ruta_csv: str, umbral_compactacion: int = UMBRAL_COMPACTACION):
+        self.ruta_csv = ruta_csv
+        self.ruta_registro = ruta_csv + '.cambios.jsonl'
+        self.umbral_compactacion = umbral_compactacion
+        self._lock = threading.Lock()
+        self._columnas: List[str] = []
+        self._filas: List[Dict] = []
+        self._firma_csv = None
+        self._offset_registro = 0
+        self._cambios_registrados = 0
+        # Versiones para que otros componentes (p. ej. el índice de búsqueda) sepan qué ha cambiado
+        self._version = 0
+        self._version_recarga = 0
+        self._version_fila: Dict[int, int] = {}
+
+    @contextmanager
+    def _bloqueo(self):
+        """Bloqueo exclusivo entre hilos y entre procesos."""
+        with self._lock:
+            with open(self.ruta_csv + '.lock', 'a') as fichero_lock:
+                if fcntl is not None:
+                    fcntl.flock(fichero_lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(fichero_lock, fcntl.LOCK_UN)
+
+    def _sincronizar(self):
+        """Recarga el CSV si otro proceso lo ha reescrito y aplica los cambios nuevos del registro."""
+        estado = os.stat(self.ruta_csv)
+        firma = (estado.st_mtime_ns, estado.st_size)
+        if firma != self._firma_csv:
+            with open(self.ruta_csv, 'r', encoding='utf-8', newline='') as f:
+                lector = csv.DictReader(f)
+                self._filas = list(lector)
+                self._columnas = list(lector.fieldnames or [])
+            self._firma_csv = firma
+            self._offset_registro = 0
+            self._cambios_registrados = 0
+            self._version += 1
+            self._version_recarga = self._version
+            self._version_fila = {}
+        if not os.path.exists(self.ruta_registro):
+            return
+        with open(self.ruta_registro, 'rb') as f:
+            f.seek(self._offset_registro)
+            for linea in f:
+                if not linea.endswith(b'\n'):
+                    # Línea a medio escribir: se leerá completa en la próxima sincronización
+                    break
+                cambio = json.loads(linea)
+                self._aplicar(cambio['fila'], cambio['campos'])
+                self._offset_registro += len(linea)
+                self._cambios_registrados += 1
+
+    def _aplicar(self, fila: int, campos: Dict):
+        self._filas[fila].update(campos)
+        self._version += 1
+        self._version_fila[fila] = self._version
+
+    def instantanea(self, desde_version: int = 0) -> Tuple[int, List[str], List[Tuple[int, Dict]], bool]:
+        """
+        Devuelve el estado actual para quien mantiene una copia derivada de los resultados.
+
+        Args:
+            desde_version: Última versión que conoce quien llama (0 si ninguna)
+
+        Returns:
+            (versión actual, columnas, filas, completa). Si completa es True, filas
+            contiene todas las filas como (posición, fila); si no, solo las que han
+            cambiado después de desde_version.
+        """
+        with self._bloqueo():
+            self._sincronizar()
+            if desde_version < self._version_recarga:
+                filas = [(posicion, dict(fila)) for posicion, fila in enumerate(self._filas)]
+                return self._version, list(self._columnas), filas, True
+            filas = [(posicion, dict(self._filas[posicion]))
+                     for posicion, version in self._version_fila.items() if version > desde_version]
+            return self._version, list(self._columnas), filas, False
+
+    def num_filas(self) -> int:
+        """Número de filas de datos del CSV (sin la cabecera)."""
+        with self._bloqueo():
+            self._sincronizar()
+            return len(self._filas)
+
+    def actualizar(self, fila: int, campos: Dict, link_imagen: str = None) -> Dict:
+        """
+        Actualiza solo los campos indicados de una fila.
+
+        Args:
+            fila: Posición de la fila en el CSV (empezando en 0)
+            campos: Columnas a modificar y sus nuevos valores
+            link_imagen: Link_imagen que el cliente espera en esa fila (se comprueba si se indica)
+
+        Returns:
+            La fila completa tras aplicar los cambios
+
+        Raises:
+            IndexError: Si la fila no existe
+            KeyError: Si algún campo no es una columna del CSV
+            ConflictoFila: Si la fila ya no corresponde a link_imagen
+        """
+        with self._bloqueo():
+            self._sincronizar()
+            if not 0 <= fila < len(self._filas):
+                raise IndexError(f"La fila {fila} no existe")
+            desconocidos = [campo for campo in campos if campo not in self._columnas]
+            if desconocidos:
+                raise KeyError(f"Columnas desconocidas: {', '.join(desconocidos)}")
+            if link_imagen is not None and self._filas[fila].get('Link_imagen') != link_imagen:
+                raise ConflictoFila(f"La fila {fila} ya no corresponde a {link_imagen}")
+
+            campos = {campo: _celda(valor) for campo, valor in campos.items()}
+            linea = (json.dumps({'fila': fila, 'campos': campos}, ensure_ascii=False) + '\n').encode('utf-8')
+            with open(self.ruta_registro, 'ab') as f:
+                f.write(linea)
+                f.flush()
+                os.fsync(f.fileno())
+            self._aplicar(fila, campos)
+            self._offset_registro += len(linea)
+            self._cambios_registrados += 1
+
+            if self._cambios_registrados >= self.umbral_compactacion:
+                self._compactar()
+            return dict(self._filas[fila])
+
+    def anadir(self, filas: List[Dict]) -> List[int]:
+        """
+        Añade filas nuevas al final del CSV (p. ej. resultados de una validación en curso).
+
+        Las filas quedan disponibles enseguida para consultarlas y actualizarlas.
+
+        Returns:
+            Posiciones que ocupan las filas añadidas
+        """
+        with self._bloqueo():
+            self._sincronizar()
+            filas = [{columna: _celda(fila.get(columna)) for columna in self._columnas} for fila in filas]
+            with open(self.ruta_csv, 'a', encoding='utf-8', newline='') as f:
+                # Un CSV guardado desde el navegador puede no terminar en salto de línea
+                if f.tell() > 0 and not self._termina_en_salto():
+                    f.write('\r\n')
+                escritor = csv.DictWriter(f, fieldnames=self._columnas)
+                escritor.writerows(filas)
+                f.flush()
+                os.fsync(f.fileno())
+            # Las filas se han añadido sin releer el CSV: se actualiza la firma para no recargarlo
+            estado = os.stat(self.ruta_csv)
+            self._firma_csv = (estado.st_mtime_ns, estado.st_size)
+            posiciones = []
+            for fila in filas:
+                self._filas.append(fila)
+                self._version += 1
+                self._version_fila[len(self._filas) - 1] = self._version
+                posiciones.append(len(self._filas) - 1)
+            return posiciones
+
+    def _termina_en_salto(self) -> bool:
+        with open(self.ruta_csv, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def compactar(self) -> bool:
+        """Aplica los cambios pendientes al CSV. Devuelve True si había cambios."""
+        with self._bloqueo():
+            self._sincronizar()
+            if not os.path.exists(self.ruta_registro):
+                return False
+            self._compactar()
+            return True
+
+    def firma(self) -> Tuple:
+        """Identifica el contenido actual: versión del CSV en disco y cambios del registro aplicados."""
+        with self._bloqueo():
+            self._sincronizar()
+            return self._firma_csv, self._offset_registro
+
+    def exportar(self) -> Tuple[Tuple, bytes, float]:
+        """
+        Contenido del CSV con los cambios pendientes aplicados, sin reescribir el fichero.
+
+        Returns:
+            (firma, contenido en UTF-8, fecha de la última modificación del CSV o del registro)
+        """
+        with self._bloqueo():
+            self._sincronizar()
+            modificado = os.stat(self.ruta_csv).st_mtime
+            if self._offset_registro == 0:
+                # Sin cambios pendientes el fichero ya es el contenido actual
+                with open(self.ruta_csv, 'rb') as f:
+                    contenido = f.read()
+            else:
+                contenido = self._serializar().encode('utf-8')
+                modificado = max(modificado, os.stat(self.ruta_registro).st_mtime)
+            return (self._firma_csv, self._offset_registro), contenido, modificado
+
+    def _serializar(self) -> str:
+        salida = io.StringIO()
+        escritor = csv.DictWriter(salida, fieldnames=self._columnas, extrasaction='ignore')
+        escritor.writeheader()
+        escritor.writerows(self._filas)
+        return salida.getvalue()
+
+    def _compactar(self):
+        cambios = self._cambios_registrados
+        self._escribir_csv(self._serializar())
+        logger.info(f"Compactados {cambios} cambios en {self.ruta_csv}")
+
+    def reemplazar(self, contenido_csv: str, copia_seguridad: bool = False) -> Optional[str]:
+        """
+        Sustituye el CSV completo (guardado clásico), descartando los cambios pendientes.
+
+        Args:
+            contenido_csv: Nuevo contenido del CSV
+            copia_seguridad: Copiar antes el CSV actual, con los cambios pendientes
+                aplicados, a <ruta>.<fecha>.bak
+
+        Returns:
+            Ruta de la copia de seguridad, o None si no se ha hecho
+        """
+        with self._bloqueo():
+            copia = None
+            if copia_seguridad and os.path.exists(self.ruta_csv):
+                self._sincronizar()
+                if os.path.exists(self.ruta_registro):
+                    self._compactar()
+                copia = f"{self.ruta_csv}.{time.strftime('%Y%m%d-%H%M%S')}.bak"
+                shutil.copy2(self.ruta_csv, copia)
+                logger.info(f"Copia de seguridad de {self.ruta_csv} en {copia}")
+            self._escribir_csv(contenido_csv)
+            self._firma_csv = None
+            return copia
+
+    def _escribir_csv(self, contenido: str):
+        """Escritura atómica: fichero temporal + rename, y después se descarta el registro."""
+        ruta_temporal = f"{self.ruta_csv}.{os.getpid()}.tmp"
+        with open(ruta_temporal, 'w', encoding='utf-8', newline='') as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta_temporal, self.ruta_csv)
+        # Si el proceso cae antes de borrar el registro, reaplicarlo es inocuo (los cambios son idempotentes)
+        if os.path.exists(self.ruta_registro):
+            os.remove(self.ruta_registro)
+        estado = os.stat(self.ruta_csv)
+        self._firma_csv = (estado.st_mtime_ns, estado.st_size)
+        self._offset_registro = 0
+        self._cambios_registrados = 0
@@ -0,0 +1,71 @@
+'''
+Backends de modelo intercambiables para el validador de evidencias.
+
+Cualquier objeto con un método generate_content(contents, generation_config=None) que
+devuelva una respuesta con atributo text (y, si puede, usage_metadata) sirve como modelo.
+Los backends registrados aquí se pueden elegir por nombre desde la línea de comandos:
+
+    gemini  -> genai.GenerativeModel (requiere GOOGLE_API_KEY)
+    falso   -> ModeloFalso, respuestas fijas sin red para pruebas y benchmarks
+
+Uso:
+    modelo = crear_modelo('falso', latencia=0.01, semilla=1)
+    validator = EvidenciaValidator(modelo)
+'''
+
+import logging
+import os
+from typing import Any, Callable, Dict, Protocol
+
+import google.generativeai as genai
+
+from modelo_falso import ModeloFalso
+
+logger = logging.getLogger(__name__)
+
+
+class BackendModelo(Protocol):
+    """Interfaz mínima que el validador necesita de un modelo."""
+
+    def generate_content(self, contents, generation_config=None) -> Any:
+        ...
+
+
+def crear_modelo_gemini(nombre_modelo: str) -> BackendModelo:
+    """Configura la API key y crea el modelo de Gemini."""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("No se encontró la API key de Google en el archivo .env")
+
+    genai.configure(api_key=api_key)
+    try:
+        modelo = genai.GenerativeModel(nombre_modelo)
+        logger.info(f"Modelo {nombre_modelo} inicializado correctamente")
+        return modelo
+    except Exception as e:
+        logger.error(f"Error al inicializar el modelo Gemini: {str(e)}")
+        raise
+
+
+BACKENDS: Dict[str, Callable[..., BackendModelo]] = {
+    'gemini': crear_modelo_gemini,
+    'falso': ModeloFalso,
+}
+
+
+def registrar_backend(nombre: str, fabrica: Callable[..., BackendModelo]):
+    """Añade un backend que luego se puede crear con crear_modelo(nombre, ...)."""
+    BACKENDS[nombre] = fabrica
+
+
+def crear_modelo(nombre: str, **opciones) -> BackendModelo:
+    """
+    Crea el modelo del backend indicado.
+
+    Args:
+        nombre: Nombre del backend registrado ('gemini', 'falso', ...)
+        **opciones: Parámetros propios de la fábrica del backend
+    """
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend de modelo desconocido: {nombre} (disponibles: {', '.join(BACKENDS)})")
+    return BACKENDS[nombre](**opciones)
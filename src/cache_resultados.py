@@ -0,0 +1,122 @@
+'''
+Caché persistente (SQLite) de respuestas de Gemini.
+
+La clave de cada entrada es un hash del contenido de la imagen, el prompt, el
+nombre del modelo y los parámetros de generación. Si nada de eso cambia, la
+respuesta guardada se reutiliza y no se vuelve a llamar a la API, lo que permite
+iterar sobre _procesar_respuesta sin coste.
+
+Cuando se supera el número máximo de entradas se eliminan las menos usadas
+recientemente (LRU).
+'''
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+RUTA_CACHE_POR_DEFECTO = '.cache/resultados_gemini.sqlite'
+
+
+class CacheResultados:
+    def __init__(self, ruta: str = RUTA_CACHE_POR_DEFECTO, max_entradas: int = 10000, refrescar: bool = False):
+        """
+        Abre (o crea) la caché de respuestas.
+
+        Args:
+            ruta: Fichero SQLite donde se guarda la caché
+            max_entradas: Número máximo de respuestas guardadas antes de desalojar
+            refrescar: Si es True no se leen entradas, pero se guardan las nuevas respuestas
+        """
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self.refrescar = refrescar
+        self.hits = 0
+        self.misses = 0
+        self.desalojos = 0
+        self._lock = threading.Lock()
+        # La conexión se comparte entre los workers protegida por el lock
+        self._conn = sqlite3.connect(ruta, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS respuestas (
+                clave TEXT PRIMARY KEY,
+                respuesta TEXT NOT NULL,
+                creado REAL NOT NULL,
+                ultimo_acceso REAL NOT NULL
+            )'''
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_ultimo_acceso ON respuestas (ultimo_acceso)')
+        self._conn.commit()
+
+    @staticmethod
+    def clave(hash_imagen: str, prompt: str, modelo: str, generation_config: Dict) -> str:
+        """Calcula la clave de caché a partir de todo lo que determina la respuesta."""
+        contenido = json.dumps(
+            [hash_imagen, prompt, modelo, generation_config],
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    def obtener(self, clave: str) -> Optional[str]:
+        """Devuelve la respuesta guardada para la clave o None si no existe."""
+        with self._lock:
+            if self.refrescar:
+                self.misses += 1
+                return None
+            fila = self._conn.execute('SELECT respuesta FROM respuestas WHERE clave = ?', (clave,)).fetchone()
+            if fila is None:
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE respuestas SET ultimo_acceso = ? WHERE clave = ?', (time.time(), clave))
+            self._conn.commit()
+            self.hits += 1
+            return fila[0]
+
+    def guardar(self, clave: str, respuesta: str):
+        """Guarda una respuesta y desaloja las entradas más antiguas si se supera el máximo."""
+        ahora = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO respuestas (clave, respuesta, creado, ultimo_acceso) VALUES (?, ?, ?, ?)',
+                (clave, respuesta, ahora, ahora),
+            )
+            total = self._conn.execute('SELECT COUNT(*) FROM respuestas').fetchone()[0]
+            sobrantes = total - self.max_entradas
+            if sobrantes > 0:
+                self._conn.execute(
+                    'DELETE FROM respuestas WHERE clave IN '
+                    '(SELECT clave FROM respuestas ORDER BY ultimo_acceso ASC LIMIT ?)',
+                    (sobrantes,),
+                )
+                self.desalojos += sobrantes
+            self._conn.commit()
+
+    def estadisticas(self) -> Dict:
+        """Devuelve los contadores de uso de la caché."""
+        with self._lock:
+            entradas = self._conn.execute('SELECT COUNT(*) FROM respuestas').fetchone()[0]
+        consultas = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'ratio_hits': self.hits / consultas if consultas else 0.0,
+            'desalojos': self.desalojos,
+            'entradas': entradas,
+        }
+
+    def cerrar(self):
+        """Cierra la conexión con la base de datos."""
+        with self._lock:
+            self._conn.close()
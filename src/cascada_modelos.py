@@ -0,0 +1,131 @@
+'''
+Cascada de dos niveles: un análisis rápido y barato antes del análisis completo.
+
+La mayoría de evidencias son capturas claras donde el nombre y la fecha se leen sin
+dificultad. Con la cascada activa, cada evidencia pasa primero por un nivel rápido:
+
+- un modelo más pequeño (por defecto gemini-1.5-flash-8b)
+- la imagen reducida (por defecto a 768 px en JPEG)
+- un prompt mínimo con salida estructurada: nombre, fecha, la actividad principal
+  y la confianza (0-1) del propio modelo en lo que ha leído
+
+Si la confianza llega al umbral y el nombre, el periodo y la tarea son válidos, ese
+es el resultado. Si no, o si la respuesta falla, se escala al análisis completo
+(modelo principal, imagen completa y el prompt de siempre). Como el nivel rápido
+solo se acepta cuando todo es válido, un resultado negativo siempre sale del
+análisis completo.
+
+Las métricas anotan en qué nivel se resolvió cada evidencia, el motivo de cada
+escalado y la latencia de cada nivel (etapas api_rapido y api), para ajustar el
+umbral y la resolución según el coste y el tiempo medio por evidencia.
+
+Uso:
+    uv run python src/check_evidencias.py --cascada --umbral-confianza 0.8 --dimension-rapida 768
+'''
+
+import logging
+from typing import Dict, Optional
+
+from backends_modelo import crear_modelo
+from preprocesado_imagenes import PreprocesadorImagenes
+
+logger = logging.getLogger(__name__)
+
+MODELO_RAPIDO = 'gemini-1.5-flash-8b'
+DIMENSION_RAPIDA = 768
+UMBRAL_CONFIANZA = 0.7
+# La respuesta rápida son cuatro campos cortos
+MAX_OUTPUT_TOKENS_RAPIDO = 160
+NIVELES = ('rapido', 'completo')
+MOTIVOS_ESCALADO = ('confianza', 'nombre', 'periodo', 'tarea', 'respuesta')
+
+ESQUEMA_RAPIDO = {
+    'type': 'object',
+    'properties': {
+        'nombre_encontrado': {
+            'type': 'string',
+            'description': 'Nombre completo visible en la imagen, o cadena vacía',
+        },
+        'fecha_encontrada': {
+            'type': 'string',
+            'description': 'Fecha visible en la imagen tal como aparece, o cadena vacía',
+        },
+        'actividad': {
+            'type': 'string',
+            'description': 'Tarea o actividad principal visible, como máximo 60 caracteres, o cadena vacía',
+        },
+        'confianza': {
+            'type': 'number',
+            'description': 'Seguridad de 0 a 1 de que el nombre y la fecha se han leído correctamente',
+        },
+    },
+    'required': ['nombre_encontrado', 'fecha_encontrada', 'actividad', 'confianza'],
+}
+
+
+class NivelRapido:
+    def __init__(self, modelo=None, nombre_modelo: str = MODELO_RAPIDO, preprocesador: PreprocesadorImagenes = None,
+                 umbral_confianza: float = UMBRAL_CONFIANZA):
+        """
+        Inicializa el nivel rápido de la cascada.
+
+        Args:
+            modelo: Objeto con método generate_content (por ejemplo un modelo falso).
+                Si es None se usa el modelo de Gemini nombre_modelo.
+            nombre_modelo: Modelo de Gemini del nivel rápido
+            preprocesador: Preprocesado de la imagen del nivel rápido (por defecto se
+                reduce a DIMENSION_RAPIDA píxeles en JPEG)
+            umbral_confianza: Confianza mínima para aceptar el resultado sin escalar
+        """
+        if not 0 <= umbral_confianza <= 1:
+            raise ValueError(f"El umbral de confianza debe estar entre 0 y 1: {umbral_confianza}")
+        if modelo is None:
+            modelo = crear_modelo('gemini', nombre_modelo=nombre_modelo)
+        else:
+            nombre_modelo = type(modelo).__name__
+        self.modelo = modelo
+        self.nombre_modelo = nombre_modelo
+        self.preprocesador = preprocesador or PreprocesadorImagenes(max_dimension=DIMENSION_RAPIDA, formato='JPEG')
+        self.umbral_confianza = umbral_confianza
+
+    @staticmethod
+    def config_generacion(base: Dict) -> Dict:
+        """generation_config del nivel rápido: JSON con el esquema mínimo y pocos tokens de salida."""
+        return dict(
+            base,
+            response_mime_type='application/json',
+            response_schema=ESQUEMA_RAPIDO,
+            max_output_tokens=MAX_OUTPUT_TOKENS_RAPIDO,
+        )
+
+    @staticmethod
+    def generar_prompt(proyecto: str) -> str:
+        """Prompt mínimo del nivel rápido (los campos los fija el esquema)."""
+        return (
+            f'Lee en esta evidencia del proyecto "{proyecto}" el nombre completo de la persona, la fecha '
+            f'y la actividad principal. Indica en confianza lo seguro que estás del nombre y la fecha.'
+        )
+
+    def motivo_escalado(self, datos: Dict, resultado: Dict) -> Optional[str]:
+        """Motivo para pasar al análisis completo, o None si el resultado rápido es suficiente."""
+        confianza = datos.get('confianza')
+        if not isinstance(confianza, (int, float)) or confianza < self.umbral_confianza:
+            return 'confianza'
+        for campo, motivo in (('Nombre_ok', 'nombre'), ('Periodo_ok', 'periodo'), ('Tarea_ok', 'tarea')):
+            if not resultado[campo]:
+                return motivo
+        return None
+
+    def respuesta(self, datos: Dict) -> Dict:
+        """Respuesta rápida con los campos de una respuesta completa, para las reglas y la caché de duplicados."""
+        actividad = str(datos.get('actividad') or '').strip()
+        confianza = datos.get('confianza')
+        detalle = self.nombre_modelo
+        if isinstance(confianza, (int, float)):
+            detalle += f", confianza {confianza:.2f}"
+        return {
+            'nombre_encontrado': datos.get('nombre_encontrado') or "No se encontró nombre",
+            'fecha_encontrada': datos.get('fecha_encontrada') or '',
+            'tareas_identificadas': [actividad] if actividad else [],
+            'justificacion': f"Análisis rápido ({detalle}): {actividad}",
+        }
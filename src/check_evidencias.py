@@ -1,14 +1,28 @@
 import os
 import pandas as pd
-from typing import Dict
-import google.generativeai as genai
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from itertools import islice
 from PIL import Image
 import logging
 from dotenv import load_dotenv
 import argparse
+import csv
 import json
-import re
-import unicodedata
+
+from backends_modelo import BACKENDS, crear_modelo
+from cache_resultados import CacheResultados
+from cliente_gemini import ClienteGemini
+from preprocesado_imagenes import PreprocesadorImagenes
+from prefiltro_evidencias import MODOS_DEDUP, EvidenciaDescartada, PrefiltroEvidencias
+from metricas import RegistroMetricas, categoria_error
+from escritor_resultados import (EscritorResultados, ResumenValidacion, limpiar_resultado, preparar_reanudacion,
+                                 reordenar_salida)
+from reglas_validacion import IndiceAlias, ReglasValidacion
+from cascada_modelos import DIMENSION_RAPIDA, ESQUEMA_RAPIDO, MODELO_RAPIDO, UMBRAL_CONFIANZA, NivelRapido
+from salida_estructurada import (CAMPOS_RESPUESTA, PresupuestoCampos, config_generacion, leer_presupuesto,
+                                 prompt_estructurado, prompt_lote_estructurado, recortar_campos, reparar_json)
 
 # Cargar variables de entorno
 load_dotenv()
@@ -24,21 +38,74 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Modelo y parámetros de generación usados en todas las llamadas a Gemini
+MODELO_GEMINI = 'gemini-1.5-flash'
+GENERATION_CONFIG = {
+    "temperature": 0.1,  # Más bajo para respuestas más precisas
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 2048,
+}
+# Límite de tokens de salida de gemini-1.5-flash, para las peticiones con varias imágenes
+MAX_OUTPUT_TOKENS_LOTE = 8192
+# Filas del CSV de entrada que se leen y agrupan de cada vez
+TAMANO_BLOQUE = 1000
+# Año de certificación que deben acreditar las evidencias
+PERIODO_POR_DEFECTO = '2024'
+
 class EvidenciaValidator:
-    def __init__(self):
-        """Inicializa el validador de evidencias con la API key de Gemini."""
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("No se encontró la API key de Google en el archivo .env")
-            
-        genai.configure(api_key=api_key)
-        # Usamos gemini-1.5-flash que es el modelo más reciente y recomendado
-        try:
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
-            logger.info("Modelo Gemini 1.5 Flash inicializado correctamente")
-        except Exception as e:
-            logger.error(f"Error al inicializar el modelo Gemini: {str(e)}")
-            raise
+    def __init__(self, modelo=None, cache: CacheResultados = None, preprocesador: PreprocesadorImagenes = None,
+                 opciones_cliente: Dict = None, metricas: RegistroMetricas = None,
+                 prefiltro: PrefiltroEvidencias = None, periodo: str = PERIODO_POR_DEFECTO,
+                 reglas: ReglasValidacion = None, salida_estructurada: bool = False,
+                 presupuesto: PresupuestoCampos = None, cascada: NivelRapido = None):
+        """
+        Inicializa el validador de evidencias con la API key de Gemini.
+        
+        Args:
+            modelo: Objeto con método generate_content que sustituye a Gemini
+                (por ejemplo un modelo falso para pruebas). Si es None se usa Gemini.
+            cache: Caché de respuestas a consultar antes de llamar a la API (None para desactivarla)
+            preprocesador: Preprocesado de imágenes antes del envío (por defecto se envían sin modificar)
+            opciones_cliente: Parámetros de ClienteGemini (límites de ritmo, reintentos, circuit breaker)
+            metricas: Registro donde se anotan los tiempos de cada etapa
+            prefiltro: Revisión local previa que descarta evidencias ilegibles y reutiliza
+                la respuesta de capturas repetidas (None para enviarlas todas)
+            periodo: Año que deben acreditar las fechas encontradas en las evidencias
+            reglas: Reglas de nombre, periodo y tarea (por defecto, las del periodo sin índice
+                de alias; procesar_csv lo construye a partir del CSV de entrada)
+            salida_estructurada: Pedir la respuesta como JSON restringido a un esquema con
+                solo los campos que usan las reglas, en lugar de describir el formato en el prompt
+            presupuesto: Longitud máxima de cada campo con salida estructurada
+            cascada: Nivel rápido que analiza cada evidencia antes del análisis completo,
+                que solo se hace si el rápido no es fiable o no valida (None para no usarlo)
+        """
+        self.cache = cache
+        self.prefiltro = prefiltro
+        self.periodo = str(periodo)
+        self.reglas = reglas or ReglasValidacion(self.periodo)
+        self.salida_estructurada = salida_estructurada
+        self.presupuesto = presupuesto or PresupuestoCampos()
+        if salida_estructurada:
+            self.generation_config = config_generacion(GENERATION_CONFIG, self.presupuesto)
+        else:
+            self.generation_config = GENERATION_CONFIG
+        self.metricas = metricas or RegistroMetricas()
+        self.preprocesador = preprocesador or PreprocesadorImagenes()
+        if modelo is not None:
+            self.nombre_modelo = type(modelo).__name__
+            logger.info(f"Usando modelo alternativo: {type(modelo).__name__}")
+        else:
+            modelo = crear_modelo('gemini', nombre_modelo=MODELO_GEMINI)
+            self.nombre_modelo = MODELO_GEMINI
+        # Todas las llamadas pasan por el cliente con límite de ritmo y reintentos
+        self.model = ClienteGemini(modelo, **(opciones_cliente or {}))
+        self.cascada = cascada
+        if cascada is not None:
+            logger.info(f"Cascada activa: {cascada.nombre_modelo} antes de {self.nombre_modelo} "
+                        f"(umbral de confianza {cascada.umbral_confianza})")
+            self.modelo_rapido = ClienteGemini(cascada.modelo, **(opciones_cliente or {}))
+            self.generation_config_rapida = cascada.config_generacion(GENERATION_CONFIG)
         
     def validar_evidencia(self, ruta_imagen: str, datos_empleado: Dict) -> Dict:
         """
@@ -54,14 +121,20 @@ class EvidenciaValidator:
         try:
             logger.info(f"Procesando evidencia para {datos_empleado['Nombre_Empleado']} - {datos_empleado['Nombre_Subproyecto']}")
             
-            # Cargar y procesar la imagen
-            imagen = Image.open(ruta_imagen)
-            
-            # Preparar el prompt para Gemini
-            prompt = self._generar_prompt(datos_empleado)
+            # Descartar sin llamar a la API las evidencias que faltan o no se pueden leer
+            huella = self._prefiltrar(ruta_imagen)
             
-            # Obtener respuesta de Gemini
-            respuesta = self._analizar_imagen(imagen, prompt)
+            # Obtener respuesta de Gemini (o la de una captura idéntica ya analizada)
+            respuesta = self.prefiltro.respuesta_duplicada(huella) if self.prefiltro else None
+            if respuesta is None:
+                try:
+                    respuesta = self._analizar_evidencia(ruta_imagen, datos_empleado)
+                except json.JSONDecodeError as e:
+                    # Respuesta cortada o sin JSON recuperable: fila de error que --resume reprocesa
+                    return self._resultado_respuesta_invalida(e, datos_empleado)
+                finally:
+                    if self.prefiltro:
+                        self.prefiltro.publicar(huella, respuesta)
             
             # Procesar la respuesta
             resultado = self._procesar_respuesta(respuesta, datos_empleado)
@@ -71,15 +144,158 @@ class EvidenciaValidator:
             
         except Exception as e:
             logger.error(f"Error al validar evidencia: {str(e)}", exc_info=True)
-            return {
-                "Nombre_ok": 0,
-                "Periodo_ok": 0,
-                "Tarea_ok": 0,
-                "Descripcion_tarea": f"Error al procesar: {str(e)}"
-            }
+            self.metricas.registrar_error(categoria_error(e))
+            return self._resultado_error(e, datos_empleado)
+    
+    def validar_lote(self, evidencias: List[Tuple[str, Dict]]) -> List[Dict]:
+        """
+        Valida varias evidencias con una sola llamada a Gemini.
+        
+        Las imágenes se envían juntas y se pide un array JSON con un objeto por
+        imagen, que se procesa con la misma lógica que una respuesta individual.
+        Si la respuesta del lote no se puede interpretar, cada evidencia se
+        valida por separado.
+        
+        Args:
+            evidencias: Lista de tuplas (ruta_imagen, datos_empleado)
+            
+        Returns:
+            Lista de resultados en el mismo orden que las evidencias
+        """
+        resultados = [None] * len(evidencias)
+        pendientes = []
+        for posicion, (ruta_imagen, datos_empleado) in enumerate(evidencias):
+            try:
+                huella = self._prefiltrar(ruta_imagen)
+                with self.metricas.medir('carga_imagen'):
+                    imagen = self.preprocesador.preparar(ruta_imagen)
+                with self.metricas.medir('prompt'):
+                    prompt = self._generar_prompt(datos_empleado)
+            except Exception as e:
+                logger.error(f"Error al preparar evidencia del lote: {str(e)}", exc_info=True)
+                self.metricas.registrar_error(categoria_error(e))
+                resultados[posicion] = self._resultado_error(e, datos_empleado)
+                continue
+            # Las evidencias ya cacheadas no se incluyen en la petición
+            respuesta_cacheada = self._respuesta_cacheada(self._clave_cache(imagen.hash, prompt))
+            if respuesta_cacheada is None and self.prefiltro:
+                # En lotes no se espera a otras peticiones en curso: solo se reutiliza lo ya respondido
+                respuesta_cacheada = self.prefiltro.respuesta_duplicada(huella, esperar=False)
+            if respuesta_cacheada is not None:
+                resultados[posicion] = self._procesar_respuesta(respuesta_cacheada, datos_empleado)
+            else:
+                pendientes.append((posicion, imagen, prompt, datos_empleado, huella))
+        
+        respuestas = None
+        if len(pendientes) > 1:
+            logger.info(f"Validando lote de {len(pendientes)} evidencias en una sola petición")
+            respuestas = self._analizar_lote([(imagen, datos) for _, imagen, _, datos, _ in pendientes])
+        for i, (posicion, imagen, prompt, datos_empleado, huella) in enumerate(pendientes):
+            respuesta = None
+            try:
+                if respuestas is None:
+                    # Una sola pendiente o fallback (la respuesta del lote no era válida): se valida la imagen sola
+                    respuesta = self._analizar_imagen(imagen.como_parte(), prompt, imagen.hash)
+                else:
+                    respuesta = respuestas[i]
+                    clave = self._clave_cache(imagen.hash, prompt)
+                    if clave:
+                        self.cache.guardar(clave, json.dumps(respuesta, ensure_ascii=False))
+            except json.JSONDecodeError as e:
+                resultados[posicion] = self._resultado_respuesta_invalida(e, datos_empleado)
+                continue
+            finally:
+                if self.prefiltro:
+                    self.prefiltro.publicar(huella, respuesta)
+            resultados[posicion] = self._procesar_respuesta(respuesta, datos_empleado)
+        
+        for resultado in resultados:
+            logger.info(f"Resultado validación - Nombre: {resultado['Nombre_ok']}, Periodo: {resultado['Periodo_ok']}, Tarea: {resultado['Tarea_ok']}")
+        return resultados
+    
+    def _analizar_evidencia(self, ruta_imagen: str, datos_empleado: Dict) -> Dict:
+        """Respuesta de Gemini a una evidencia: la del nivel rápido si basta o la del análisis completo."""
+        if self.cascada is not None:
+            respuesta = self._analisis_rapido(ruta_imagen, datos_empleado)
+            if respuesta is not None:
+                return respuesta
+        
+        # Cargar y preprocesar la imagen (el hash de lo enviado la identifica en la caché)
+        with self.metricas.medir('carga_imagen'):
+            imagen = self.preprocesador.preparar(ruta_imagen)
+        
+        # Preparar el prompt para Gemini
+        with self.metricas.medir('prompt'):
+            prompt = self._generar_prompt(datos_empleado)
+        
+        return self._analizar_imagen(imagen.como_parte(), prompt, imagen.hash)
+    
+    def _analisis_rapido(self, ruta_imagen: str, datos_empleado: Dict) -> Optional[Dict]:
+        """
+        Primer nivel de la cascada: imagen reducida, modelo rápido y prompt mínimo.
+        
+        Returns:
+            La respuesta (con los campos de una respuesta completa) si es fiable y
+            valida nombre, periodo y tarea, o None para escalar al análisis completo
+        """
+        with self.metricas.medir('carga_imagen'):
+            imagen = self.cascada.preprocesador.preparar(ruta_imagen)
+        with self.metricas.medir('prompt'):
+            prompt = self.cascada.generar_prompt(datos_empleado['Nombre_Subproyecto'])
+        try:
+            datos = self._analizar_imagen(imagen.como_parte(), prompt, imagen.hash, rapido=True)
+            if not isinstance(datos, dict):
+                raise ValueError("La respuesta rápida no es un objeto JSON")
+        except Exception as e:
+            logger.warning(f"Análisis rápido no válido, se escala al análisis completo: {str(e)}")
+            self.metricas.registrar_nivel('completo', 'respuesta')
+            return None
+        
+        respuesta = self.cascada.respuesta(datos)
+        with self.metricas.medir('validacion'):
+            motivo = self.cascada.motivo_escalado(datos, self._validar_datos(respuesta, datos_empleado))
+        if motivo is not None:
+            logger.debug(f"Análisis rápido insuficiente ({motivo}), se escala al análisis completo")
+            self.metricas.registrar_nivel('completo', motivo)
+            return None
+        self.metricas.registrar_nivel('rapido')
+        return respuesta
+    
+    def _prefiltrar(self, ruta_imagen: str):
+        """Pasa el prefiltro (si está activo) y devuelve la huella de la imagen para deduplicar."""
+        if self.prefiltro is None:
+            return None
+        with self.metricas.medir('prefiltro'):
+            return self.prefiltro.revisar(ruta_imagen)
+    
+    def _resultado_error(self, error: Exception, datos_empleado: Dict = None) -> Dict:
+        """
+        Resultado de una evidencia que no se ha podido procesar.
+
+        Lleva Link_imagen para que la revisión y --resume puedan emparejar la fila. Las
+        evidencias descartadas por el prefiltro quedan terminadas (revisarlas otra vez daría
+        lo mismo); el resto se marcan como 'Error' para que --resume las vuelva a procesar.
+        """
+        datos_empleado = datos_empleado or {}
+        return {
+            "Nombre_ok": 0,
+            "Periodo_ok": 0,
+            "Tarea_ok": 0,
+            "Nombre_a_validar": datos_empleado.get('Nombre_Empleado', ''),
+            "Nombre_encontrado": '' if isinstance(error, EvidenciaDescartada) else 'Error',
+            "Periodo_a_validar": self.periodo,
+            "Fecha_encontrada": '',
+            "Tarea_a_validar": datos_empleado.get('Nombre_Subproyecto', ''),
+            "Tareas_encontradas": '',
+            "Justificacion": '',
+            "Link_imagen": datos_empleado.get('Ruta_Evidencia', ''),
+            "Descripcion_tarea": f"Error al procesar: {str(error)}"
+        }
     
     def _generar_prompt(self, datos_empleado: Dict) -> str:
         """Genera el prompt para Gemini basado en los datos del empleado."""
+        if self.salida_estructurada:
+            return prompt_estructurado(datos_empleado['Nombre_Subproyecto'], self.presupuesto)
         return f"""
         Analiza esta imagen y proporciona una respuesta estructurada en formato JSON con los siguientes campos:
 
@@ -92,99 +308,180 @@ class EvidenciaValidator:
         Responde SOLO con el JSON, sin texto adicional.
         """
     
-    def _analizar_imagen(self, imagen: Image.Image, prompt: str) -> str:
-        """Analiza la imagen usando Gemini."""
-        try:
-            # Configurar parámetros de generación
-            generation_config = {
-                "temperature": 0.1,  # Más bajo para respuestas más precisas
-                "top_p": 0.8,
-                "top_k": 40,
-                "max_output_tokens": 2048,
-            }
-            
-            response = self.model.generate_content(
-                [prompt, imagen],
-                generation_config=generation_config
+    def _generar_prompt_lote(self, lista_datos: List[Dict]) -> str:
+        """Genera el prompt para analizar varias imágenes en una sola petición."""
+        if self.salida_estructurada:
+            return prompt_lote_estructurado([datos['Nombre_Subproyecto'] for datos in lista_datos], self.presupuesto)
+        proyectos = "\n".join(
+            f"        - Imagen {i}: proyecto \"{datos['Nombre_Subproyecto']}\""
+            for i, datos in enumerate(lista_datos, start=1)
+        )
+        return f"""
+        Vas a recibir {len(lista_datos)} imágenes numeradas. Analiza cada una por separado:
+{proyectos}
+
+        Para cada imagen proporciona un objeto JSON con los siguientes campos:
+
+        1. nombre_encontrado: Extrae el nombre completo que aparece en la imagen. Si no se encuentra ningún nombre, devuelve "No se encontró nombre"
+        2. fecha_encontrada: Extrae cualquier fecha visible en la imagen
+        3. contenido_relevante: Describe el contenido de la imagen y su relación con su proyecto
+        4. tareas_identificadas: Lista las tareas o actividades que se pueden identificar en la imagen
+        5. justificacion: Explica cómo el contenido justifica la participación en el proyecto
+
+        Responde SOLO con un array JSON de {len(lista_datos)} objetos, en el mismo orden que las imágenes, sin texto adicional.
+        """
+    
+    def _clave_cache(self, hash_imagen: str, prompt: str, rapido: bool = False) -> str:
+        """Clave de caché de una evidencia individual (None si la caché está desactivada)."""
+        if self.cache is None or not hash_imagen:
+            return None
+        if rapido:
+            return CacheResultados.clave(hash_imagen, prompt, self.cascada.nombre_modelo, self.generation_config_rapida)
+        return CacheResultados.clave(hash_imagen, prompt, self.nombre_modelo, self.generation_config)
+    
+    def _analizar_lote(self, evidencias: List[Tuple]) -> List[Dict]:
+        """
+        Analiza varias imágenes en una sola llamada.
+        
+        Returns:
+            Lista con un diccionario por imagen, o None si la respuesta no es un
+            array JSON con un objeto por imagen
+        """
+        contenido = [self._generar_prompt_lote([datos for _, datos in evidencias])]
+        for i, (imagen, _) in enumerate(evidencias, start=1):
+            contenido.extend([f"Imagen {i}:", imagen.como_parte()])
+        if self.salida_estructurada:
+            generation_config = config_generacion(GENERATION_CONFIG, self.presupuesto, len(evidencias))
+        else:
+            generation_config = dict(
+                GENERATION_CONFIG,
+                max_output_tokens=GENERATION_CONFIG["max_output_tokens"] * len(evidencias)
             )
+        generation_config['max_output_tokens'] = min(MAX_OUTPUT_TOKENS_LOTE, generation_config['max_output_tokens'])
+        try:
+            with self.metricas.medir('api'):
+                response = self.model.generate_content(contenido, generation_config=generation_config)
+            self.metricas.registrar_tokens(response)
+            datos = self._interpretar_respuesta(response.text)
+        except Exception as e:
+            logger.warning(f"Respuesta del lote no válida, se validará cada evidencia por separado: {str(e)}")
+            return None
+        if not isinstance(datos, list) or len(datos) != len(evidencias) or not all(isinstance(d, dict) for d in datos):
+            logger.warning("La respuesta del lote no tiene un objeto por imagen, se validará cada evidencia por separado")
+            return None
+        return datos
+    
+    def _respuesta_cacheada(self, clave: Optional[str], rapido: bool = False) -> Optional[Dict]:
+        """Respuesta guardada en la caché para la clave, o None si no hay (o no es válida)."""
+        if clave is None:
+            return None
+        with self.metricas.medir('cache'):
+            texto = self.cache.obtener(clave)
+        if texto is None:
+            return None
+        try:
+            with self.metricas.medir('parseo'):
+                datos, _ = reparar_json(texto, ESQUEMA_RAPIDO['required'] if rapido else CAMPOS_RESPUESTA)
+        except json.JSONDecodeError:
+            # Entrada antigua que hoy se consideraría mal formada: se vuelve a pedir
+            logger.debug("Respuesta cacheada no válida, se ignora")
+            return None
+        logger.debug("Respuesta obtenida de la caché")
+        return datos
+    
+    def _analizar_imagen(self, imagen: Union[Image.Image, Dict], prompt: str, hash_imagen: str = None,
+                         rapido: bool = False) -> Dict:
+        """
+        Analiza la imagen usando Gemini, consultando antes la caché si está activa.
+        
+        Con rapido=True se usa el modelo y la configuración del nivel rápido de la cascada.
+        
+        Returns:
+            Los datos extraídos de la respuesta
+        
+        Raises:
+            json.JSONDecodeError: Si la respuesta está cortada o no contiene un JSON recuperable
+        """
+        clave = self._clave_cache(hash_imagen, prompt, rapido)
+        respuesta_cacheada = self._respuesta_cacheada(clave, rapido)
+        if respuesta_cacheada is not None:
+            return respuesta_cacheada
+        
+        try:
+            modelo = self.modelo_rapido if rapido else self.model
+            with self.metricas.medir('api_rapido' if rapido else 'api'):
+                response = modelo.generate_content(
+                    [prompt, imagen],
+                    generation_config=self.generation_config_rapida if rapido else self.generation_config
+                )
+            self.metricas.registrar_tokens(response)
             
             # Asegurarnos de que la respuesta está en UTF-8
-            if response.text:
-                return response.text.encode('utf-8', errors='ignore').decode('utf-8')
-            return "{}"
-            
+            texto = (response.text or '').encode('utf-8', errors='ignore').decode('utf-8')
         except Exception as e:
+            # Se propaga para que la fila quede como error (y se reprocese con --resume)
+            # en lugar de convertirse en una validación con todo a 0
             logger.error(f"Error al analizar imagen con Gemini: {str(e)}", exc_info=True)
-            return "{}"
+            raise
+        
+        # Una respuesta vacía, cortada o sin JSON recuperable se propaga como error y no se cachea
+        datos = self._interpretar_respuesta(texto, ESQUEMA_RAPIDO['required'] if rapido else CAMPOS_RESPUESTA)
+        # Solo se cachean respuestas válidas (ya reparadas), nunca los errores
+        if clave is not None:
+            self.cache.guardar(clave, json.dumps(datos, ensure_ascii=False))
+        return datos
     
-    def _procesar_respuesta(self, respuesta: str, datos_empleado: Dict) -> Dict:
-        """Procesa la respuesta de Gemini y genera el resultado de validación."""
+    def _interpretar_respuesta(self, texto: str, requeridos=CAMPOS_RESPUESTA):
+        """
+        Interpreta el JSON recibido de Gemini (reparándolo si hace falta) y anota en las
+        métricas si era válido, se ha reparado o no se ha podido interpretar.
+        
+        Raises:
+            json.JSONDecodeError: Si la respuesta no contiene ningún JSON recuperable, está
+                cortada a mitad de un valor o a lo reparado le faltan campos requeridos
+        """
+        with self.metricas.medir('parseo'):
+            try:
+                datos, reparado = reparar_json(texto, requeridos)
+            except json.JSONDecodeError:
+                self.metricas.registrar_respuesta('malformada')
+                raise
+        if reparado:
+            logger.warning("Respuesta de Gemini con JSON mal formado, se ha reparado")
+        self.metricas.registrar_respuesta('reparada' if reparado else 'valida')
+        return datos
+    
+    def _procesar_respuesta(self, datos: Dict, datos_empleado: Dict) -> Dict:
+        """Aplica las reglas a los datos ya interpretados de la respuesta de Gemini."""
         try:
-            # Limpiar la respuesta de marcadores de código
-            respuesta_limpia = respuesta.strip()
-            if respuesta_limpia.startswith('```json'):
-                respuesta_limpia = respuesta_limpia[7:]
-            if respuesta_limpia.endswith('```'):
-                respuesta_limpia = respuesta_limpia[:-3]
-            respuesta_limpia = respuesta_limpia.strip()
-            
-            # Intentar parsear la respuesta como JSON
-            datos = json.loads(respuesta_limpia)
-            
-            # Extraer datos
-            nombre_a_validar = datos_empleado['Nombre_Empleado']
-            nombre_encontrado = datos.get('nombre_encontrado', 'No se encontró nombre')
-            # Normalizar para comparar ignorando tildes y mayúsculas
-            def normaliza(s):
-                return unicodedata.normalize('NFKD', s).encode('ASCII', 'ignore').decode('ASCII').lower().strip()
-            nombre_ok = 1 if normaliza(nombre_a_validar) == normaliza(nombre_encontrado) else 0
-            
-            periodo_a_validar = '2024'
-            fecha_encontrada = datos.get('fecha_encontrada', '')
-            # Buscar la última fecha completa (ej: 14 de febrero de 2024)
-            fechas = re.findall(r'\d{1,2} de [a-zA-Z]+ de 2024', fecha_encontrada)
-            if fechas:
-                fecha_encontrada = fechas[-1]
-            else:
-                fecha_encontrada = ''
-            periodo_ok = 1 if '2024' in fecha_encontrada else 0
-            
-            tarea_a_validar = datos_empleado['Nombre_Subproyecto']
-            tareas_encontradas = datos.get('tareas_identificadas', [])
-            tareas_encontradas_str = ', '.join(tareas_encontradas) if isinstance(tareas_encontradas, list) else tareas_encontradas
-            tarea_ok = 1 if tareas_encontradas else 0
-            
-            justificacion = datos.get('justificacion', 'No se pudo justificar')
-            link_imagen = datos_empleado.get('Ruta_Evidencia', '')
-            
-            return {
-                "Nombre_ok": nombre_ok,
-                "Periodo_ok": periodo_ok,
-                "Tarea_ok": tarea_ok,
-                "Nombre_a_validar": nombre_a_validar,
-                "Nombre_encontrado": nombre_encontrado,
-                "Periodo_a_validar": periodo_a_validar,
-                "Fecha_encontrada": fecha_encontrada,
-                "Tarea_a_validar": tarea_a_validar,
-                "Tareas_encontradas": tareas_encontradas_str,
-                "Justificacion": justificacion,
-                "Link_imagen": link_imagen
-            }
+            if self.salida_estructurada:
+                datos = recortar_campos(datos, self.presupuesto)
+            with self.metricas.medir('validacion'):
+                return self._validar_datos(datos, datos_empleado)
         except Exception as e:
-            logger.error(f"Error al procesar respuesta: {str(e)}", exc_info=True)
-            return {
-                "Nombre_ok": 0,
-                "Periodo_ok": 0,
-                "Tarea_ok": 0,
-                "Nombre_a_validar": datos_empleado.get('Nombre_Empleado', ''),
-                "Nombre_encontrado": 'Error',
-                "Periodo_a_validar": '2024',
-                "Fecha_encontrada": '',
-                "Tarea_a_validar": datos_empleado.get('Nombre_Subproyecto', ''),
-                "Tareas_encontradas": '',
-                "Justificacion": f"Error al procesar respuesta: {str(e)}",
-                "Link_imagen": datos_empleado.get('Ruta_Evidencia', '')
-            }
+            return self._resultado_respuesta_invalida(e, datos_empleado)
+    
+    def _resultado_respuesta_invalida(self, error: Exception, datos_empleado: Dict) -> Dict:
+        """Fila de error de una respuesta que no se ha podido usar (--resume la vuelve a procesar)."""
+        logger.error(f"Error al procesar respuesta: {str(error)}", exc_info=error)
+        self.metricas.registrar_error(categoria_error(error))
+        return {
+            "Nombre_ok": 0,
+            "Periodo_ok": 0,
+            "Tarea_ok": 0,
+            "Nombre_a_validar": datos_empleado.get('Nombre_Empleado', ''),
+            "Nombre_encontrado": 'Error',
+            "Periodo_a_validar": self.periodo,
+            "Fecha_encontrada": '',
+            "Tarea_a_validar": datos_empleado.get('Nombre_Subproyecto', ''),
+            "Tareas_encontradas": '',
+            "Justificacion": f"Error al procesar respuesta: {str(error)}",
+            "Link_imagen": datos_empleado.get('Ruta_Evidencia', '')
+        }
+    
+    def _validar_datos(self, datos: Dict, datos_empleado: Dict) -> Dict:
+        """Aplica las reglas de nombre, periodo y tarea a los datos extraídos por Gemini."""
+        return self.reglas.aplicar(datos, datos_empleado)
 
 class ProcesadorEvidencias:
     def __init__(self, validator: EvidenciaValidator):
@@ -192,91 +489,338 @@ class ProcesadorEvidencias:
         self.validator = validator
         logger.info("Procesador de evidencias inicializado")
         
-    def procesar_csv(self, ruta_csv: str, ruta_salida: str, limite_lineas: int = None):
+    def procesar_csv(self, ruta_csv: str, ruta_salida: str, limite_lineas: int = None, workers: int = 1,
+                     reanudar: bool = False, tamano_lote: int = 1, agrupar_por_empleado: bool = False,
+                     ruta_informe: str = None, tamano_bloque: int = TAMANO_BLOQUE,
+                     progreso: Callable[[int, int, Dict], None] = None):
         """
         Procesa el CSV de evidencias y genera un nuevo CSV con los resultados.
         
+        La entrada se lee por bloques de tamano_bloque filas y cada resultado se escribe
+        en el CSV de salida en cuanto está listo, así que la memoria no crece con el
+        tamaño del fichero y una ejecución interrumpida conserva todo lo validado.
+        
         Args:
             ruta_csv: Ruta al CSV de entrada
             ruta_salida: Ruta donde guardar el CSV de resultados
             limite_lineas: Número máximo de líneas a procesar (None para procesar todas)
+            workers: Número de llamadas a Gemini simultáneas (1 procesa en serie)
+            reanudar: Si es True se conservan las evidencias ya terminadas en ruta_salida
+                y solo se procesan las que faltan
+            tamano_lote: Número de evidencias enviadas en cada petición a Gemini (1 sin lotes)
+            agrupar_por_empleado: Formar los lotes con evidencias del mismo empleado
+                (dentro de cada bloque de lectura)
+            ruta_informe: Ruta del informe JSON de métricas (junto a él se va escribiendo
+                el detalle por evidencia en CSV). None para no guardarlo
+            tamano_bloque: Filas del CSV de entrada que se leen de cada vez
+            progreso: Función opcional que recibe (evidencias terminadas, total, resultado) tras
+                cada resultado, en el mismo orden en que se escribe en ruta_salida
         """
         try:
             logger.info(f"Iniciando procesamiento de CSV: {ruta_csv}")
             logger.info(f"Límite de líneas: {limite_lineas if limite_lineas else 'Sin límite'}")
+            logger.info(f"Workers: {workers}")
+            if tamano_lote > 1:
+                logger.info(f"Lotes de hasta {tamano_lote} evidencias{' por empleado' if agrupar_por_empleado else ''}")
+                if self.validator.cascada is not None:
+                    logger.warning("La cascada solo se aplica a las evidencias validadas de una en una: "
+                                   "los lotes van directamente al análisis completo")
             
-            # Leer CSV
-            df = pd.read_csv(ruta_csv)
-            total_original = len(df)
-            
-            # Aplicar límite si se especifica
+            # Contar filas sin cargar el CSV para poder mostrar el progreso
+            total_original = self._contar_filas(ruta_csv)
+            total = min(total_original, limite_lineas) if limite_lineas else total_original
             if limite_lineas:
-                df = df.head(limite_lineas)
-                logger.info(f"Se procesarán {limite_lineas} líneas de {total_original}")
+                logger.info(f"Se procesarán {total} líneas de {total_original}")
             
-            # Procesar cada fila
-            resultados = []
-            total = len(df)
-            for idx, row in df.iterrows():
-                logger.info(f"Procesando evidencia {idx + 1} de {total}")
-                resultado = self.validator.validar_evidencia(
-                    row['Ruta_Evidencia'],
-                    row.to_dict()
-                )
-                resultados.append(resultado)
+            # Todos los nombres con los que aparece cada ID_Empleado, para aceptar sus alias
+            if not len(self.validator.reglas.alias):
+                self.validator.reglas.alias = IndiceAlias.desde_csv(ruta_csv, tamano_bloque)
             
-            # Crear DataFrame con resultados
-            df_resultados = pd.DataFrame(resultados)
+            filas = self._leer_filas(ruta_csv, limite_lineas, tamano_bloque)
+            resumen = ResumenValidacion()
+            if ruta_informe:
+                self.validator.metricas.abrir_detalle(os.path.splitext(ruta_informe)[0] + '.csv')
             
-            # Guardar resultados
-            df_resultados.to_csv(ruta_salida, index=False)
+            # Al reanudar, saltamos las evidencias que ya tienen un resultado terminado
+            if reanudar:
+                terminadas = preparar_reanudacion(ruta_salida)
+                resumen.anadir_csv(ruta_salida)
+                logger.info(f"Reanudando: {resumen.total} evidencias ya terminadas")
+                filas = self._filtrar_pendientes(filas, terminadas)
+            
+            # Procesar cada fila (en paralelo si hay más de un worker) escribiendo
+            # cada resultado según llega, en el orden de entrada.
+            lotes = self._lotes_por_bloque(filas, tamano_lote, agrupar_por_empleado, tamano_bloque)
+            with EscritorResultados(ruta_salida, anadir=reanudar) as escritor:
+                for resultado in self._resultados_en_orden(lotes, workers, total):
+                    # Las celdas vacías de la entrada llegan como NaN: se limpian una sola vez
+                    # para que el CSV, el progreso (SSE) y el CSV de revisión vean lo mismo
+                    resultado = limpiar_resultado(resultado)
+                    escritor.escribir(resultado)
+                    resumen.anadir(resultado)
+                    self._registrar_detalle(resumen.total, resultado)
+                    if progreso is not None:
+                        progreso(resumen.total, total, resultado)
+            
+            if reanudar and escritor.filas_escritas < total:
+                links = (datos['Ruta_Evidencia'] for _, datos in self._leer_filas(ruta_csv, limite_lineas, tamano_bloque))
+                reordenar_salida(ruta_salida, links)
             logger.info(f"Resultados guardados en {ruta_salida}")
             
             # Generar resumen
-            self._generar_resumen(df_resultados)
+            self._generar_resumen(resumen)
+            self._registrar_informe(ruta_informe)
+            if self.validator.prefiltro is not None:
+                logger.info(f"Prefiltro local: {self.validator.prefiltro.resumen()}")
+            logger.info(f"Preprocesado de imágenes: {self.validator.preprocesador.resumen()}")
+            logger.info(f"Cliente Gemini: {self.validator.model.metricas()}")
+            if self.validator.cache is not None:
+                logger.info(f"Caché de respuestas: {self.validator.cache.estadisticas()}")
             
         except Exception as e:
             logger.error(f"Error al procesar CSV: {str(e)}", exc_info=True)
             raise
+        finally:
+            self.validator.metricas.cerrar_detalle()
             
-    def _generar_resumen(self, df_resultados: pd.DataFrame):
-        """Genera un resumen de los resultados."""
-        total = len(df_resultados)
-        nombre_ok = df_resultados['Nombre_ok'].sum()
-        periodo_ok = df_resultados['Periodo_ok'].sum()
-        tarea_ok = df_resultados['Tarea_ok'].sum()
-        
-        resumen = f"""
-        Resumen de validación:
-        - Total de evidencias procesadas: {total}
-        - Nombres validados correctamente: {nombre_ok} ({nombre_ok/total*100:.1f}%)
-        - Periodos validados correctamente: {periodo_ok} ({periodo_ok/total*100:.1f}%)
-        - Tareas validadas correctamente: {tarea_ok} ({tarea_ok/total*100:.1f}%)
+    @staticmethod
+    def _contar_filas(ruta_csv: str) -> int:
+        """Cuenta los registros del CSV (sin la cabecera) recorriéndolo sin cargarlo."""
+        with open(ruta_csv, 'r', encoding='utf-8', newline='') as f:
+            return max(0, sum(1 for _ in csv.reader(f)) - 1)
+    
+    @staticmethod
+    def _leer_filas(ruta_csv: str, limite_lineas: int = None, tamano_bloque: int = TAMANO_BLOQUE):
+        """Devuelve las filas del CSV como (índice, diccionario), leyendo de tamano_bloque en tamano_bloque."""
+        filas = (
+            (idx, datos)
+            for bloque in pd.read_csv(ruta_csv, chunksize=tamano_bloque)
+            for idx, datos in zip(bloque.index, bloque.to_dict('records'))
+        )
+        return islice(filas, limite_lineas)
+    
+    @staticmethod
+    def _filtrar_pendientes(filas, terminadas):
+        """Salta las filas cuyo Ruta_Evidencia ya tiene un resultado terminado (tantas veces como aparezca)."""
+        for idx, datos in filas:
+            link = datos['Ruta_Evidencia']
+            if isinstance(link, str) and terminadas[link] > 0:
+                terminadas[link] -= 1
+            else:
+                yield idx, datos
+    
+    def _lotes_por_bloque(self, filas, tamano_lote: int, agrupar_por_empleado: bool, tamano_bloque: int):
+        """Agrupa en lotes cada bloque de filas según se va leyendo la entrada."""
+        filas = iter(filas)
+        inicio = 0
+        while True:
+            bloque = list(islice(filas, tamano_bloque))
+            if not bloque:
+                return
+            yield from self._agrupar_en_lotes(bloque, tamano_lote, agrupar_por_empleado, inicio)
+            inicio += len(bloque)
+    
+    @staticmethod
+    def _agrupar_en_lotes(filas: List[Tuple[int, Dict]], tamano_lote: int, agrupar_por_empleado: bool,
+                          inicio: int = 0) -> List[List[Tuple[int, Tuple[int, Dict]]]]:
+        """
+        Reparte las filas en lotes de hasta tamano_lote evidencias.
         
-        Detalles de las evidencias procesadas:
+        Cada elemento de un lote es (posición global, fila), empezando a contar en inicio,
+        para poder devolver los resultados en el orden de entrada aunque los lotes agrupen por empleado.
+        """
+        posicionadas = list(enumerate(filas, inicio))
+        if agrupar_por_empleado:
+            grupos = {}
+            for posicion, fila in posicionadas:
+                grupos.setdefault(fila[1].get('Nombre_Empleado'), []).append((posicion, fila))
+            grupos = list(grupos.values())
+        else:
+            grupos = [posicionadas]
+        tamano_lote = max(1, tamano_lote)
+        return [grupo[i:i + tamano_lote] for grupo in grupos for i in range(0, len(grupo), tamano_lote)]
+    
+    def _resultados_en_orden(self, lotes, workers: int, total: int):
         """
+        Valida los lotes (en paralelo si hay más de un worker) y devuelve los resultados en el orden de entrada.
         
-        for idx, row in df_resultados.iterrows():
-            resumen += f"""
-            Evidencia {idx + 1}:
-            - Nombre a validar: {row['Nombre_a_validar']}
-            - Nombre encontrado: {row['Nombre_encontrado']}
-            - Periodo a validar: {row['Periodo_a_validar']}
-            - Fecha encontrada: {row['Fecha_encontrada']}
-            - Tarea a validar: {row['Tarea_a_validar']}
-            - Tareas encontradas: {row['Tareas_encontradas']}
-            - Justificación: {row['Justificacion']}
-            """
+        Los lotes se consumen bajo demanda: como mucho hay 2 * workers lotes en curso.
+        """
+        def validar(lote):
+            resultados = self._validar_lote([fila for _, fila in lote], total)
+            return [(posicion, resultado) for (posicion, _), resultado in zip(lote, resultados)]
         
-        logger.info(resumen)
+        if workers > 1:
+            executor = ThreadPoolExecutor(max_workers=workers)
+            resultados_lotes = self._map_acotado(executor, validar, lotes, 2 * workers)
+        else:
+            executor = None
+            resultados_lotes = map(validar, lotes)
+        try:
+            # Los lotes pueden terminar desordenados (p. ej. agrupados por empleado):
+            # se retienen los resultados hasta que llegan todos los anteriores
+            siguiente = 0
+            retenidos = {}
+            for resultados in resultados_lotes:
+                retenidos.update(resultados)
+                while siguiente in retenidos:
+                    yield retenidos.pop(siguiente)
+                    siguiente += 1
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    
+    @staticmethod
+    def _map_acotado(executor: ThreadPoolExecutor, funcion, elementos, max_en_curso: int):
+        """Como executor.map, pero sin leer toda la entrada por adelantado."""
+        en_curso = deque()
+        for elemento in elementos:
+            en_curso.append(executor.submit(funcion, elemento))
+            if len(en_curso) >= max_en_curso:
+                yield en_curso.popleft().result()
+        while en_curso:
+            yield en_curso.popleft().result()
+    
+    def _validar_lote(self, filas: List[Tuple[int, Dict]], total: int) -> List[Dict]:
+        """Valida un lote de filas; si falla la petición conjunta, valida cada fila por separado."""
+        if len(filas) == 1:
+            return [self._validar_fila(*filas[0], total)]
+        identificador = '+'.join(str(idx + 1) for idx, _ in filas)
+        logger.info(f"Procesando evidencias {', '.join(str(idx + 1) for idx, _ in filas)} de {total}")
+        try:
+            with self.validator.metricas.unidad(identificador, evidencias=len(filas)):
+                return self.validator.validar_lote([(datos['Ruta_Evidencia'], datos) for _, datos in filas])
+        except Exception as e:
+            logger.error(f"Error inesperado en el lote: {str(e)}", exc_info=True)
+            return [self._validar_fila(idx, datos, total) for idx, datos in filas]
+    
+    def _validar_fila(self, idx: int, datos_empleado: Dict, total: int) -> Dict:
+        """Valida una fila aislando sus errores para que no afecten al resto del lote."""
+        logger.info(f"Procesando evidencia {idx + 1} de {total}")
+        try:
+            with self.validator.metricas.unidad(idx + 1):
+                return self.validator.validar_evidencia(datos_empleado['Ruta_Evidencia'], datos_empleado)
+        except Exception as e:
+            logger.error(f"Error inesperado en la evidencia {idx + 1}: {str(e)}", exc_info=True)
+            return self.validator._resultado_error(e, datos_empleado)
+            
+    def _registrar_informe(self, ruta_informe: str = None):
+        """Muestra un resumen de tiempos y, si se indica ruta, guarda el informe de métricas."""
+        metricas = self.validator.metricas
+        if ruta_informe:
+            informe = metricas.guardar_informe(ruta_informe)
+        else:
+            informe = metricas.informe()
+        api = informe['etapas'].get('api', {})
+        logger.info(
+            f"Métricas: {informe['evidencias']} evidencias en {informe['duracion_s']:.1f} s "
+            f"({informe['evidencias_por_minuto']:.1f}/min), API p50={api.get('p50_s', 0):.2f} s "
+            f"p95={api.get('p95_s', 0):.2f} s, tokens salida={informe['tokens']['salida']} "
+            f"({informe['tokens']['salida_por_evidencia']:.0f}/evidencia), "
+            f"JSON reparados={informe['respuestas']['reparada']} "
+            f"mal formados={informe['respuestas']['malformada']} "
+            f"({informe['respuestas']['tasa_malformadas']:.1%}), errores={informe['errores']}"
+        )
+        if 'cascada' in informe:
+            rapido, completo = informe['cascada']['niveles']['rapido'], informe['cascada']['niveles']['completo']
+            logger.info(
+                f"Cascada: {rapido['evidencias']} evidencias resueltas en el nivel rápido ({rapido['tasa']:.1%}, "
+                f"p50={rapido['p50_s']:.2f} s) y {completo['evidencias']} escaladas (p50={completo['p50_s']:.2f} s), "
+                f"motivos={informe['cascada']['motivos_escalado']}"
+            )
+    
+    def _generar_resumen(self, resumen: ResumenValidacion):
+        """Muestra el resumen de los resultados a partir de los totales acumulados."""
+        correctos = resumen.correctos
+        logger.info(f"""
+        Resumen de validación:
+        - Total de evidencias procesadas: {resumen.total}
+        - Nombres validados correctamente: {correctos['Nombre_ok']} ({resumen.porcentaje('Nombre_ok'):.1f}%)
+        - Periodos validados correctamente: {correctos['Periodo_ok']} ({resumen.porcentaje('Periodo_ok'):.1f}%)
+        - Tareas validadas correctamente: {correctos['Tarea_ok']} ({resumen.porcentaje('Tarea_ok'):.1f}%)
+        """)
+    
+    @staticmethod
+    def _registrar_detalle(numero: int, resultado: Dict):
+        """Detalle de cada evidencia según se escribe (visible con --debug)."""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"""
+            Evidencia {numero}:
+            - Nombre a validar: {resultado.get('Nombre_a_validar')}
+            - Nombre encontrado: {resultado.get('Nombre_encontrado')}
+            - Periodo a validar: {resultado.get('Periodo_a_validar')}
+            - Fecha encontrada: {resultado.get('Fecha_encontrada')}
+            - Tarea a validar: {resultado.get('Tarea_a_validar')}
+            - Tareas encontradas: {resultado.get('Tareas_encontradas')}
+            - Justificación: {resultado.get('Justificacion')}
+            """)
 
 def main():
     """Función principal del programa."""
     try:
         # Configurar argumentos de línea de comandos
         parser = argparse.ArgumentParser(description='Validador de evidencias I+D')
+        parser.add_argument('--entrada', default='evidencias_2024.csv', help='CSV de evidencias a validar')
+        parser.add_argument('--salida', default='resultados_validacion.csv', help='CSV donde se guardan los resultados')
+        parser.add_argument('--periodo', default=PERIODO_POR_DEFECTO, help='Año que deben acreditar las evidencias')
         parser.add_argument('--limite', type=int, help='Número máximo de líneas a procesar')
         parser.add_argument('--debug', action='store_true', help='Activar modo debug')
+        parser.add_argument('--workers', type=int, default=1, help='Número de evidencias validadas en paralelo')
+        parser.add_argument('--backend', choices=sorted(BACKENDS), default='gemini',
+                            help='Modelo a usar: Gemini real o un modelo falso local para pruebas')
+        parser.add_argument('--latencia-falsa', type=float, default=0.5,
+                            help='Latencia artificial (segundos) del modelo falso')
+        parser.add_argument('--tasa-429-falsa', type=float, default=0.0,
+                            help='Probabilidad de que el modelo falso devuelva un error 429')
+        parser.add_argument('--tasa-error-falsa', type=float, default=0.0,
+                            help='Probabilidad de que el modelo falso devuelva un error 503')
+        parser.add_argument('--tasa-malformada-falsa', type=float, default=0.0,
+                            help='Probabilidad de que el modelo falso devuelva un JSON inválido')
+        parser.add_argument('--rpm', type=float, help='Límite de peticiones por minuto a Gemini')
+        parser.add_argument('--tpm', type=float, help='Límite de tokens por minuto a Gemini')
+        parser.add_argument('--reintentos', type=int, default=5,
+                            help='Reintentos máximos ante errores transitorios (429, 5xx) con backoff exponencial')
+        parser.add_argument('--no-cache', action='store_true', help='No usar la caché de respuestas de Gemini')
+        parser.add_argument('--refresh', action='store_true',
+                            help='Ignorar las respuestas cacheadas y volver a llamar a la API (guardando las nuevas)')
+        parser.add_argument('--cache-max-entradas', type=int, default=10000,
+                            help='Número máximo de respuestas guardadas en la caché')
+        parser.add_argument('--max-dimension', type=int, help='Reducir las imágenes a este tamaño máximo (píxeles)')
+        parser.add_argument('--grises', action='store_true', help='Enviar las imágenes en escala de grises')
+        parser.add_argument('--formato-imagen', choices=['JPEG', 'WEBP', 'PNG'],
+                            help='Recodificar las imágenes en este formato antes de enviarlas')
+        parser.add_argument('--calidad-imagen', type=int, default=85, help='Calidad de compresión JPEG/WebP (1-100)')
+        parser.add_argument('--prefiltro', action='store_true',
+                            help='Revisar las evidencias en local antes de llamar a Gemini (ficheros que faltan, '
+                                 'imágenes corruptas o en blanco y capturas repetidas)')
+        parser.add_argument('--dedup', choices=MODOS_DEDUP, default='exacto',
+                            help='Cómo detecta el prefiltro las capturas repetidas')
+        parser.add_argument('--lote', type=int, default=1,
+                            help='Número de evidencias enviadas en una misma petición a Gemini')
+        parser.add_argument('--lote-por-empleado', action='store_true',
+                            help='Formar los lotes con evidencias del mismo empleado')
+        parser.add_argument('--salida-estructurada', action='store_true',
+                            help='Pedir a Gemini JSON restringido a un esquema con solo los campos que usan las reglas')
+        parser.add_argument('--presupuesto', nargs='+', metavar='CAMPO=N', default=[],
+                            help='Longitud máxima de los campos con salida estructurada '
+                                 f"({', '.join(f'{c}={v}' for c, v in PresupuestoCampos()._asdict().items())})")
+        parser.add_argument('--cascada', action='store_true',
+                            help='Analizar antes cada evidencia con un modelo rápido y la imagen reducida, y solo '
+                                 'hacer el análisis completo si el resultado no es fiable o no valida')
+        parser.add_argument('--modelo-rapido', default=MODELO_RAPIDO, help='Modelo de Gemini del nivel rápido')
+        parser.add_argument('--dimension-rapida', type=int, default=DIMENSION_RAPIDA,
+                            help='Tamaño máximo (píxeles) de la imagen en el nivel rápido')
+        parser.add_argument('--umbral-confianza', type=float, default=UMBRAL_CONFIANZA,
+                            help='Confianza mínima (0-1) del nivel rápido para no escalar')
+        parser.add_argument('--latencia-rapida-falsa', type=float, default=0.2,
+                            help='Latencia artificial (segundos) del modelo falso del nivel rápido')
+        parser.add_argument('--informe', default=None,
+                            help='Guardar el informe JSON de métricas en esta ruta (el detalle por evidencia se '
+                                 'guarda en un CSV al lado); sin ella solo se muestra el resumen en el log')
+        parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE,
+                            help='Filas del CSV de entrada leídas de cada vez (la memoria no depende del tamaño del fichero)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Reanudar una ejecución interrumpida procesando solo las evidencias que faltan')
         args = parser.parse_args()
         
         # Configurar nivel de logging
@@ -285,14 +829,54 @@ def main():
             logger.debug("Modo debug activado")
         
         # Inicializar componentes
-        validator = EvidenciaValidator()
+        modelo = None
+        if args.backend == 'falso':
+            modelo = crear_modelo(
+                'falso',
+                latencia=args.latencia_falsa,
+                tasa_429=args.tasa_429_falsa,
+                tasa_error=args.tasa_error_falsa,
+                tasa_malformada=args.tasa_malformada_falsa
+            )
+        cache = None
+        if not args.no_cache:
+            cache = CacheResultados(max_entradas=args.cache_max_entradas, refrescar=args.refresh)
+        preprocesador = PreprocesadorImagenes(
+            max_dimension=args.max_dimension,
+            escala_grises=args.grises,
+            formato=args.formato_imagen,
+            calidad=args.calidad_imagen
+        )
+        opciones_cliente = {
+            'peticiones_por_minuto': args.rpm,
+            'tokens_por_minuto': args.tpm,
+            'max_reintentos': args.reintentos
+        }
+        prefiltro = PrefiltroEvidencias(dedup=args.dedup) if args.prefiltro else None
+        cascada = None
+        if args.cascada:
+            cascada = NivelRapido(
+                crear_modelo('falso', latencia=args.latencia_rapida_falsa) if args.backend == 'falso' else None,
+                nombre_modelo=args.modelo_rapido,
+                preprocesador=PreprocesadorImagenes(max_dimension=args.dimension_rapida, formato='JPEG'),
+                umbral_confianza=args.umbral_confianza
+            )
+        validator = EvidenciaValidator(modelo, cache, preprocesador, opciones_cliente, prefiltro=prefiltro,
+                                       periodo=args.periodo, salida_estructurada=args.salida_estructurada,
+                                       presupuesto=leer_presupuesto(args.presupuesto), cascada=cascada)
         procesador = ProcesadorEvidencias(validator)
         
         # Procesar evidencias
         procesador.procesar_csv(
-            "evidencias_2024.csv",
-            "resultados_validacion.csv",
-            args.limite
+            args.entrada,
+            args.salida,
+            args.limite,
+            workers=args.workers,
+            reanudar=args.resume,
+            tamano_lote=args.lote,
+            agrupar_por_empleado=args.lote_por_empleado,
+            ruta_informe=args.informe,
+            tamano_bloque=args.bloque
         )
         
     except Exception as e:
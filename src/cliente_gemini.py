@@ -0,0 +1,275 @@
+'''
+Cliente que envuelve generate_content con control de ritmo y reintentos.
+
+- Limitador de tipo token bucket por peticiones/minuto y tokens/minuto, adaptativo:
+  cada error 429 reduce el ritmo a la mitad y cada éxito lo recupera poco a poco
+- Reintentos con backoff exponencial y jitter para los errores transitorios
+  (429, 500, 503, 504, timeouts)
+- Circuit breaker: tras varios fallos seguidos deja de llamar a la API durante
+  un tiempo en lugar de seguir acumulando errores
+- Métricas de llamadas, reintentos y tiempo de espera
+
+ClienteGemini tiene la misma interfaz que genai.GenerativeModel (generate_content),
+así que se puede usar con el modelo real o con el modelo falso.
+'''
+
+import logging
+import random
+import threading
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+CODIGOS_REINTENTABLES = {429, 500, 503, 504}
+ERRORES_REINTENTABLES = {
+    'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'InternalServerError',
+    'DeadlineExceeded', 'GatewayTimeout', 'ConnectionError', 'TimeoutError',
+}
+# Tokens que Gemini cuenta por cada imagen enviada
+TOKENS_POR_IMAGEN = 258
+
+
+class CircuitoAbiertoError(Exception):
+    """Se lanza cuando el circuit breaker está abierto y no se permite llamar a la API."""
+
+
+def _codigo_error(error: Exception):
+    codigo = getattr(error, 'code', None)
+    try:
+        return int(codigo)
+    except (TypeError, ValueError):
+        return None
+
+
+def es_reintentable(error: Exception) -> bool:
+    """Indica si el error es transitorio (cuota, sobrecarga, red) y merece reintentarse."""
+    if _codigo_error(error) in CODIGOS_REINTENTABLES:
+        return True
+    return any(clase.__name__ in ERRORES_REINTENTABLES for clase in type(error).__mro__)
+
+
+def es_error_cuota(error: Exception) -> bool:
+    return _codigo_error(error) == 429 or type(error).__name__ in ('ResourceExhausted', 'TooManyRequests')
+
+
+class LimitadorTokens:
+    def __init__(self, capacidad_por_minuto: float):
+        """
+        Token bucket que se rellena de forma continua.
+
+        Args:
+            capacidad_por_minuto: Unidades (peticiones o tokens) permitidas por minuto
+        """
+        self.capacidad = capacidad_por_minuto
+        self.tasa = capacidad_por_minuto / 60.0
+        self._disponibles = capacidad_por_minuto
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reservar(self, cantidad: float = 1) -> float:
+        """
+        Reserva unidades y devuelve los segundos que hay que esperar antes de usarlas.
+
+        Las reservas pueden dejar el cubo en negativo: así las peticiones
+        concurrentes se ordenan sin bloquear el lock mientras esperan.
+        Una cantidad negativa devuelve unidades (p. ej. al ajustar una estimación).
+        """
+        with self._lock:
+            ahora = time.monotonic()
+            self._disponibles = min(self.capacidad, self._disponibles + (ahora - self._ultimo) * self.tasa)
+            self._ultimo = ahora
+            self._disponibles -= cantidad
+            if self._disponibles >= 0:
+                return 0.0
+            return -self._disponibles / self.tasa
+
+    def ajustar_tasa(self, factor: float):
+        """Cambia el ritmo de recarga a factor × la capacidad configurada."""
+        with self._lock:
+            self.tasa = self.capacidad * factor / 60.0
+
+
+class CircuitBreaker:
+    def __init__(self, umbral_fallos: int = 5, tiempo_apertura: float = 60.0):
+        """
+        Args:
+            umbral_fallos: Fallos seguidos que abren el circuito
+            tiempo_apertura: Segundos que permanece abierto antes de dejar pasar una petición de prueba
+        """
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self.fallos_seguidos = 0
+        self.aperturas = 0
+        self._abierto_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """Lanza CircuitoAbiertoError si el circuito está abierto."""
+        with self._lock:
+            if self.fallos_seguidos >= self.umbral_fallos:
+                restante = self._abierto_hasta - time.monotonic()
+                if restante > 0:
+                    raise CircuitoAbiertoError(f"Circuito abierto tras {self.fallos_seguidos} fallos seguidos, "
+                                               f"se reintentará en {restante:.0f} s")
+                # Semiabierto: se deja pasar esta petición y si falla se vuelve a abrir
+                self._abierto_hasta = time.monotonic() + self.tiempo_apertura
+
+    def exito(self):
+        with self._lock:
+            self.fallos_seguidos = 0
+
+    def fallo(self):
+        with self._lock:
+            self.fallos_seguidos += 1
+            if self.fallos_seguidos == self.umbral_fallos:
+                self.aperturas += 1
+                self._abierto_hasta = time.monotonic() + self.tiempo_apertura
+                logger.warning(f"Circuito abierto durante {self.tiempo_apertura:.0f} s tras {self.fallos_seguidos} fallos seguidos")
+
+
+class ClienteGemini:
+    def __init__(self, modelo, peticiones_por_minuto: float = None, tokens_por_minuto: float = None,
+                 max_reintentos: int = 5, backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 umbral_circuito: int = 5, apertura_circuito: float = 60.0,
+                 limitador_peticiones: LimitadorTokens = None, limitador_tokens: LimitadorTokens = None):
+        """
+        Envuelve un modelo con limitador de ritmo, reintentos y circuit breaker.
+
+        Args:
+            modelo: Objeto con método generate_content (Gemini o modelo falso)
+            peticiones_por_minuto: Límite de peticiones por minuto (None sin límite)
+            tokens_por_minuto: Límite de tokens por minuto (None sin límite)
+            max_reintentos: Reintentos máximos por petición ante errores transitorios
+            backoff_base: Espera base (segundos) del backoff exponencial
+            backoff_max: Espera máxima (segundos) entre reintentos
+            umbral_circuito: Fallos seguidos que abren el circuito
+            apertura_circuito: Segundos que el circuito permanece abierto
+            limitador_peticiones: Limitador ya creado (p. ej. compartido entre procesos) que
+                sustituye al de peticiones_por_minuto
+            limitador_tokens: Ídem para tokens_por_minuto
+        """
+        self.modelo = modelo
+        if limitador_peticiones is None and peticiones_por_minuto:
+            limitador_peticiones = LimitadorTokens(peticiones_por_minuto)
+        if limitador_tokens is None and tokens_por_minuto:
+            limitador_tokens = LimitadorTokens(tokens_por_minuto)
+        self.limitador_peticiones = limitador_peticiones
+        self.limitador_tokens = limitador_tokens
+        self.max_reintentos = max_reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuito = CircuitBreaker(umbral_circuito, apertura_circuito)
+        self._factor_ritmo = 1.0
+        self._lock = threading.Lock()
+        self._metricas = {
+            'llamadas': 0,
+            'exitos': 0,
+            'reintentos': 0,
+            'errores_cuota': 0,
+            'errores': {},
+            'espera_limitador_s': 0.0,
+            'espera_backoff_s': 0.0,
+            'rechazos_circuito': 0,
+        }
+
+    def generate_content(self, contents, generation_config=None):
+        """Llama al modelo respetando los límites y reintentando los errores transitorios."""
+        tokens_estimados = self._estimar_tokens(contents)
+        for intento in range(self.max_reintentos + 1):
+            try:
+                self.circuito.permitir()
+            except CircuitoAbiertoError:
+                self._sumar('rechazos_circuito', 1)
+                raise
+            self._esperar_turno(tokens_estimados)
+            self._sumar('llamadas', 1)
+            try:
+                respuesta = self.modelo.generate_content(contents, generation_config=generation_config)
+            except Exception as e:
+                self._registrar_error(e)
+                if not es_reintentable(e):
+                    raise
+                self.circuito.fallo()
+                if es_error_cuota(e):
+                    self._reducir_ritmo()
+                if intento == self.max_reintentos:
+                    raise
+                # Backoff exponencial con jitter completo
+                espera = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** intento))
+                logger.warning(f"Error transitorio de la API ({type(e).__name__}), reintento "
+                               f"{intento + 1}/{self.max_reintentos} en {espera:.1f} s: {str(e)}")
+                self._sumar('reintentos', 1)
+                self._sumar('espera_backoff_s', espera)
+                time.sleep(espera)
+                continue
+            self.circuito.exito()
+            self._sumar('exitos', 1)
+            self._recuperar_ritmo()
+            self._ajustar_tokens(respuesta, tokens_estimados)
+            return respuesta
+
+    def metricas(self) -> Dict:
+        """Devuelve una copia de las métricas acumuladas."""
+        with self._lock:
+            metricas = dict(self._metricas, errores=dict(self._metricas['errores']))
+            metricas['factor_ritmo'] = self._factor_ritmo
+        metricas['aperturas_circuito'] = self.circuito.aperturas
+        return metricas
+
+    def _esperar_turno(self, tokens_estimados: int):
+        espera = 0.0
+        if self.limitador_peticiones is not None:
+            espera = max(espera, self.limitador_peticiones.reservar(1))
+        if self.limitador_tokens is not None:
+            espera = max(espera, self.limitador_tokens.reservar(tokens_estimados))
+        if espera > 0:
+            self._sumar('espera_limitador_s', espera)
+            time.sleep(espera)
+
+    @staticmethod
+    def _estimar_tokens(contents) -> int:
+        """Estimación de tokens de entrada (≈4 caracteres por token de texto)."""
+        tokens = 0
+        for parte in contents if isinstance(contents, list) else [contents]:
+            tokens += len(parte) // 4 if isinstance(parte, str) else TOKENS_POR_IMAGEN
+        return tokens
+
+    def _ajustar_tokens(self, respuesta, tokens_estimados: int):
+        """Corrige el consumo de tokens con el recuento real de la respuesta."""
+        if self.limitador_tokens is None:
+            return
+        total = getattr(getattr(respuesta, 'usage_metadata', None), 'total_token_count', None)
+        if total:
+            self.limitador_tokens.reservar(total - tokens_estimados)
+
+    def _reducir_ritmo(self):
+        """Ante un 429 se reduce el ritmo a la mitad (con un mínimo del 10%)."""
+        with self._lock:
+            self._metricas['errores_cuota'] += 1
+            self._factor_ritmo = max(0.1, self._factor_ritmo * 0.5)
+            factor = self._factor_ritmo
+        self._aplicar_ritmo(factor)
+
+    def _recuperar_ritmo(self):
+        """Cada éxito recupera un 5% del ritmo configurado."""
+        with self._lock:
+            if self._factor_ritmo >= 1.0:
+                return
+            self._factor_ritmo = min(1.0, self._factor_ritmo + 0.05)
+            factor = self._factor_ritmo
+        self._aplicar_ritmo(factor)
+
+    def _aplicar_ritmo(self, factor: float):
+        for limitador in (self.limitador_peticiones, self.limitador_tokens):
+            if limitador is not None:
+                limitador.ajustar_tasa(factor)
+
+    def _registrar_error(self, error: Exception):
+        with self._lock:
+            nombre = type(error).__name__
+            self._metricas['errores'][nombre] = self._metricas['errores'].get(nombre, 0) + 1
+
+    def _sumar(self, metrica: str, valor):
+        with self._lock:
+            self._metricas[metrica] += valor
@@ -6,130 +6,266 @@ Este script lee la pestaña 'Proyectossubproyectos evidencia' del excel Control
 - extrae los IDs de empleado y subproyecto en columnas separadas
 - busca y asigna las evidencias correspondientes basándose en el nombre del empleado y subproyecto
 - crea una columna 'Evidencia' que rellena con el nombre del archivo correspondiente de la carpeta 'Evidencias 2024'
+
+Para que regenerar el CSV sea casi instantáneo:
+
+- la pestaña ya procesada se guarda en .cache/ingesta indexada por el hash del Excel
+  (Parquet si está instalado pyarrow, pickle si no), así que solo se vuelve a leer
+  con openpyxl cuando el Excel cambia
+- los IDs y nombres se extraen en una sola pasada por los valores distintos de cada columna
+- se guarda una instantánea de la carpeta de evidencias con la asignación de cada
+  (empleado, subproyecto). En la siguiente ejecución solo se comparan los ficheros
+  nuevos, y solo se recalculan del todo las filas cuyo fichero asignado ha desaparecido
+
+Las rutas y la pestaña se pueden cambiar para preparar otros años o empresas:
+    uv run python src/crear_fichero_data.py --excel "data/Control de evidencias 2025.xlsx" \
+        --evidencias "data/Evidencias 2025" --salida evidencias_2025.csv
 '''
 
 #importamos las librerías
-import pandas as pd
+import argparse
+import hashlib
+import json
+import logging
 import os
-from difflib import SequenceMatcher
+import re
+import time
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from matcher_evidencias import UMBRAL_TOTAL, IndiceEvidencias
+
+logger = logging.getLogger(__name__)
+
+#rutas por defecto (certificación 2024)
+RUTA_EXCEL = 'data/Control de evidencias 2024.xlsx'
+HOJA_EXCEL = 'Proyectossubproyectos evidencia'
+RUTA_EVIDENCIAS = 'data/Evidencias 2024'
+RUTA_SALIDA = 'evidencias_2024.csv'
+DIR_CACHE_INGESTA = '.cache/ingesta'
+EXTENSIONES_EVIDENCIA = ('.png', '.pdf', '.jpg', '.jpeg')
+# Cambiar si cambia el procesado de la pestaña, para invalidar las cachés existentes
+VERSION_INGESTA = 1
+
+# Columna original -> (patrón del ID, patrón del nombre, columna ID, columna nombre)
+EXTRACCIONES = {
+    'Empleado': (re.compile(r'\[(\d+)\]'), re.compile(r'\]\s*(.+)'), 'ID_Empleado', 'Nombre_Empleado'),
+    'Subproyecto': (re.compile(r'\[([^]]+)\]'), re.compile(r'\]\s*(.+)'), 'ID_Subproyecto', 'Nombre_Subproyecto'),
+    # Proyecto tiene otro formato, sin corchetes (ej: "1.- Plataforma...")
+    'Proyecto': (re.compile(r'^(\d+)\.-'), re.compile(r'^\d+\.-\s*(.+)'), 'ID_Proyecto', 'Nombre_Proyecto'),
+}
+
+
+def _hash_fichero(ruta: str) -> str:
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def _extraer_id_nombre(serie: pd.Series, patron_id: re.Pattern, patron_nombre: re.Pattern) -> Tuple[pd.Series, pd.Series]:
+    """Equivale a dos str.extract, pero aplicando ambos patrones una sola vez por valor distinto."""
+    ids, nombres = {}, {}
+    for valor in serie.dropna().unique():
+        if not isinstance(valor, str):
+            continue
+        coincidencia = patron_id.search(valor)
+        if coincidencia:
+            ids[valor] = coincidencia.group(1)
+        coincidencia = patron_nombre.search(valor)
+        if coincidencia:
+            nombres[valor] = coincidencia.group(1)
+    return serie.map(ids), serie.map(nombres)
+
+
+def _procesar_hoja(df: pd.DataFrame) -> pd.DataFrame:
+    """Rellena empleado/proyecto y separa IDs y nombres."""
+    #Rellenamos el nombre del empleado hasta que se encuentra otro nombre diferente, porque aparece sólo el primero del grupo de filas
+    df['Empleado'] = df['Empleado'].ffill()
+    if 'Proyecto' in df.columns:
+        # Rellenamos también la columna Proyecto como hicimos con Empleado
+        df['Proyecto'] = df['Proyecto'].ffill()
+
+    # Extraemos el ID y el nombre de empleado, subproyecto y proyecto (si existe)
+    columnas_a_eliminar = []
+    for columna, (patron_id, patron_nombre, columna_id, columna_nombre) in EXTRACCIONES.items():
+        if columna not in df.columns:
+            continue
+        df[columna_id], df[columna_nombre] = _extraer_id_nombre(df[columna], patron_id, patron_nombre)
+        columnas_a_eliminar.append(columna)
+
+    # Eliminamos las columnas originales que ya no necesitamos
+    return df.drop(columns=columnas_a_eliminar)
+
+
+def _guardar_hoja(df: pd.DataFrame, clave: str):
+    """Guarda la pestaña procesada en Parquet (o en pickle si no hay pyarrow o el Parquet falla)."""
+    os.makedirs(DIR_CACHE_INGESTA, exist_ok=True)
+    ruta = os.path.join(DIR_CACHE_INGESTA, f"excel_{clave}")
+    try:
+        df.to_parquet(f"{ruta}.{os.getpid()}.tmp", index=False)
+        os.replace(f"{ruta}.{os.getpid()}.tmp", f"{ruta}.parquet")
+    except Exception as e:
+        logger.debug(f"No se pudo guardar la pestaña en Parquet ({str(e)}), se usa pickle")
+        df.to_pickle(f"{ruta}.{os.getpid()}.tmp")
+        os.replace(f"{ruta}.{os.getpid()}.tmp", f"{ruta}.pkl")
+
+
+def leer_hoja(ruta_excel: str = RUTA_EXCEL, hoja: str = HOJA_EXCEL) -> pd.DataFrame:
+    """Devuelve la pestaña ya procesada, desde la caché si el Excel no ha cambiado."""
+    clave = hashlib.sha256(f"{_hash_fichero(ruta_excel)}|{hoja}|{VERSION_INGESTA}".encode('utf-8')).hexdigest()[:32]
+    ruta_cache = os.path.join(DIR_CACHE_INGESTA, f"excel_{clave}")
+    if os.path.exists(f"{ruta_cache}.parquet"):
+        logger.info(f"Pestaña '{hoja}' leída de la caché ({ruta_cache}.parquet)")
+        return pd.read_parquet(f"{ruta_cache}.parquet")
+    if os.path.exists(f"{ruta_cache}.pkl"):
+        logger.info(f"Pestaña '{hoja}' leída de la caché ({ruta_cache}.pkl)")
+        return pd.read_pickle(f"{ruta_cache}.pkl")
+
+    inicio = time.perf_counter()
+    #leemos el excel
+    df = _procesar_hoja(pd.read_excel(ruta_excel, sheet_name=hoja))
+    logger.info(f"Excel {ruta_excel} procesado en {time.perf_counter() - inicio:.2f} s")
+    _guardar_hoja(df, clave)
+    return df
+
 
-def similar(a, b):
-    """Función para calcular la similitud entre dos strings"""
-    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+def listar_evidencias(ruta_evidencias: str) -> List[str]:
+    """Ficheros de evidencia de la carpeta, ordenados por nombre para que los empates sean reproducibles."""
+    if not os.path.exists(ruta_evidencias):
+        return []
+    return sorted(
+        entrada.name for entrada in os.scandir(ruta_evidencias)
+        if entrada.name.lower().endswith(EXTENSIONES_EVIDENCIA) and not entrada.name.startswith('.')
+    )
 
-def buscar_evidencia(nombre_empleado, nombre_subproyecto, archivos_evidencias):
+
+def _ruta_instantanea(ruta_evidencias: str) -> str:
+    clave = hashlib.sha256(os.path.abspath(ruta_evidencias).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(DIR_CACHE_INGESTA, f"instantanea_{clave}.json")
+
+
+def _clave_par(empleado, subproyecto) -> str:
+    return json.dumps([empleado if pd.notna(empleado) else None, subproyecto if pd.notna(subproyecto) else None],
+                      ensure_ascii=False)
+
+
+def asignar_evidencias(df: pd.DataFrame, ruta_evidencias: str) -> Tuple[List[str], Dict]:
     """
-    Busca la evidencia que mejor coincida con el empleado y subproyecto
+    Asigna a cada fila su fichero de evidencia reutilizando la instantánea anterior de la carpeta.
+
+    El emparejamiento solo depende del nombre de los ficheros, así que basta con comparar
+    los nombres nuevos con la mejor asignación guardada de cada (empleado, subproyecto):
+    el resultado es el mismo que indexando la carpeta completa.
+
+    Returns:
+        Lista con el fichero de cada fila ("" si no hay) y estadísticas de la actualización
     """
-    mejor_coincidencia = ""
-    mejor_score = 0
-    
-    # Limpiamos el nombre del empleado (quitamos el ID)
-    empleado_limpio = nombre_empleado.strip() if pd.notna(nombre_empleado) else ""
-    subproyecto_limpio = nombre_subproyecto.strip() if pd.notna(nombre_subproyecto) else ""
-    
-    for archivo in archivos_evidencias:
-        # Dividimos el nombre del archivo en partes
-        if '_' in archivo:
-            nombre_archivo_empleado = archivo.split('_')[0].strip()
-            resto_archivo = '_'.join(archivo.split('_')[1:])
-            
-            # Calculamos similitud con el empleado
-            similitud_empleado = similar(empleado_limpio, nombre_archivo_empleado)
-            
-            # Calculamos similitud con el subproyecto
-            similitud_subproyecto = similar(subproyecto_limpio, resto_archivo)
-            
-            # Score combinado (damos más peso al empleado)
-            score_total = (similitud_empleado * 0.6) + (similitud_subproyecto * 0.4)
-            
-            # Si encontramos una mejor coincidencia
-            if score_total > mejor_score and similitud_empleado > 0.7:  # Mínimo 70% similitud en empleado
-                mejor_score = score_total
-                mejor_coincidencia = archivo
-    
-    return mejor_coincidencia if mejor_score > 0.5 else ""
-
-#definimos la ruta de la carpeta de evidencias
-ruta_evidencias = 'data/Evidencias 2024'
-
-# Obtenemos la lista de archivos de evidencias
-archivos_evidencias = []
-if os.path.exists(ruta_evidencias):
-    archivos_evidencias = [f for f in os.listdir(ruta_evidencias) 
-                          if f.lower().endswith(('.png', '.pdf', '.jpg', '.jpeg')) 
-                          and not f.startswith('.')]
-
-#leemos el excel
-df = pd.read_excel('data/Control de evidencias 2024.xlsx', sheet_name='Proyectossubproyectos evidencia')
-
-#Rellenamos el nombre del empleado hasta que se encuentra otro nombre diferente, porque aparece sólo el primero del grupo de filas
-df['Empleado'] = df['Empleado'].fillna(method='ffill')
-
-# Extraemos el ID del empleado y el nombre del empleado
-df['ID_Empleado'] = df['Empleado'].str.extract(r'\[(\d+)\]')
-df['Nombre_Empleado'] = df['Empleado'].str.extract(r'\]\s*(.+)')
-
-# Extraemos el ID del subproyecto y el nombre del subproyecto
-df['ID_Subproyecto'] = df['Subproyecto'].str.extract(r'\[([^]]+)\]')
-df['Nombre_Subproyecto'] = df['Subproyecto'].str.extract(r'\]\s*(.+)')
-
-# Si existe la columna Proyecto, extraemos su ID y nombre (formato diferente sin corchetes)
-if 'Proyecto' in df.columns:
-    # Rellenamos también la columna Proyecto como hicimos con Empleado
-    df['Proyecto'] = df['Proyecto'].fillna(method='ffill')
-    # Extraemos el número del proyecto (ej: "1" de "1.- Plataforma...")
-    df['ID_Proyecto'] = df['Proyecto'].str.extract(r'^(\d+)\.-')
-    # Extraemos el nombre del proyecto (todo después de "número.- ")
-    df['Nombre_Proyecto'] = df['Proyecto'].str.extract(r'^\d+\.-\s*(.+)')
-
-# Eliminamos las columnas originales que ya no necesitamos
-columnas_a_eliminar = ['Empleado', 'Subproyecto']
-if 'Proyecto' in df.columns:
-    columnas_a_eliminar.append('Proyecto')
-df = df.drop(columns=columnas_a_eliminar)
-
-# Buscamos las evidencias correspondientes
-print(f"Encontrados {len(archivos_evidencias)} archivos de evidencia")
-print("Buscando coincidencias...")
-
-df['Evidencia'] = df.apply(
-    lambda row: buscar_evidencia(
-        row['Nombre_Empleado'], 
-        row['Nombre_Subproyecto'], 
-        archivos_evidencias
-    ), 
-    axis=1
-)
-
-# Añadimos la ruta completa de la evidencia
-df['Ruta_Evidencia'] = df['Evidencia'].apply(
-    lambda x: os.path.join(ruta_evidencias, x) if x else ""
-)
-
-print("Columnas disponibles:", df.columns.tolist())
-print("\nPrimeras 5 filas:")
-print(df.head())
-
-print("\nEjemplo de extracción de IDs:")
-print("ID_Empleado:", df['ID_Empleado'].head().tolist())
-print("Nombre_Empleado:", df['Nombre_Empleado'].head().tolist())
-print("ID_Subproyecto:", df['ID_Subproyecto'].head().tolist())
-print("Nombre_Subproyecto:", df['Nombre_Subproyecto'].head().tolist())
-if 'Proyecto' in df.columns:
-    print("ID_Proyecto:", df['ID_Proyecto'].head().tolist())
-    print("Nombre_Proyecto:", df['Nombre_Proyecto'].head().tolist())
-
-print("\nEvidencias encontradas:")
-evidencias_encontradas = df[df['Evidencia'] != '']
-print(f"Total de evidencias asignadas: {len(evidencias_encontradas)} de {len(df)}")
-if len(evidencias_encontradas) > 0:
-    print(evidencias_encontradas[['Nombre_Empleado', 'Nombre_Subproyecto', 'Evidencia']].head(10))
-
-# Guardamos el dataframe en un archivo CSV
-output_file = 'evidencias_2024.csv'
-df.to_csv(output_file, index=False, encoding='utf-8')
-print(f"\n✅ Archivo guardado exitosamente como: {output_file}")
-print(f"Total de filas: {len(df)}")
-print(f"Total de columnas: {len(df.columns)}")
-print("Columnas incluidas:", list(df.columns))
\ No newline at end of file
+    archivos = listar_evidencias(ruta_evidencias)
+    ruta_instantanea = _ruta_instantanea(ruta_evidencias)
+    anteriores, asignaciones = set(), {}
+    if os.path.exists(ruta_instantanea):
+        with open(ruta_instantanea, 'r', encoding='utf-8') as f:
+            instantanea = json.load(f)
+        if instantanea.get('version') == VERSION_INGESTA:
+            anteriores = set(instantanea['archivos'])
+            asignaciones = instantanea['asignaciones']
+
+    actuales = set(archivos)
+    nuevos = sorted(actuales - anteriores)
+    eliminados = anteriores - actuales
+    indice_nuevos = IndiceEvidencias(nuevos) if nuevos else None
+    indice_completo = None
+    estadisticas = {'archivos': len(archivos), 'nuevos': len(nuevos), 'eliminados': len(eliminados),
+                    'pares_reutilizados': 0, 'pares_actualizados': 0, 'pares_recalculados': 0}
+
+    nuevas_asignaciones = {}
+    evidencias = []
+    for empleado, subproyecto in zip(df['Nombre_Empleado'], df['Nombre_Subproyecto']):
+        clave = _clave_par(empleado, subproyecto)
+        mejor = nuevas_asignaciones.get(clave)
+        if mejor is None:
+            previo = asignaciones.get(clave)
+            if previo is None or previo[0] in eliminados:
+                # Par nuevo o cuyo fichero ya no existe: se busca en toda la carpeta
+                if indice_completo is None:
+                    indice_completo = IndiceEvidencias(archivos)
+                mejor = list(indice_completo.mejor_coincidencia(empleado, subproyecto))
+                estadisticas['pares_recalculados'] += 1
+            elif indice_nuevos is not None:
+                # Solo los ficheros nuevos pueden mejorar la asignación guardada
+                candidato = indice_nuevos.mejor_coincidencia(empleado, subproyecto)
+                mejor = previo
+                if candidato[0] and (candidato[1] > previo[1] or (candidato[1] == previo[1] and candidato[0] < previo[0])):
+                    mejor = list(candidato)
+                estadisticas['pares_actualizados'] += 1
+            else:
+                mejor = previo
+                estadisticas['pares_reutilizados'] += 1
+            nuevas_asignaciones[clave] = mejor
+        evidencias.append(mejor[0] if mejor[1] > UMBRAL_TOTAL else "")
+
+    os.makedirs(DIR_CACHE_INGESTA, exist_ok=True)
+    ruta_temporal = f"{ruta_instantanea}.{os.getpid()}.tmp"
+    with open(ruta_temporal, 'w', encoding='utf-8') as f:
+        json.dump({'version': VERSION_INGESTA, 'archivos': archivos, 'asignaciones': nuevas_asignaciones},
+                  f, ensure_ascii=False)
+    os.replace(ruta_temporal, ruta_instantanea)
+    return evidencias, estadisticas
+
+
+def crear_fichero_data(ruta_excel: str = RUTA_EXCEL, ruta_evidencias: str = RUTA_EVIDENCIAS,
+                       ruta_salida: str = RUTA_SALIDA, hoja: str = HOJA_EXCEL) -> pd.DataFrame:
+    """Genera el CSV de evidencias a partir del Excel de control y la carpeta de evidencias."""
+    inicio = time.perf_counter()
+    df = leer_hoja(ruta_excel, hoja)
+
+    # Buscamos las evidencias correspondientes
+    df['Evidencia'], estadisticas = asignar_evidencias(df, ruta_evidencias)
+    logger.info(f"Evidencias de {ruta_evidencias}: {estadisticas}")
+
+    # Añadimos la ruta completa de la evidencia
+    df['Ruta_Evidencia'] = [os.path.join(ruta_evidencias, x) if x else "" for x in df['Evidencia']]
+
+    # Guardamos el dataframe en un archivo CSV
+    df.to_csv(ruta_salida, index=False, encoding='utf-8')
+    logger.info(f"{ruta_salida} generado en {time.perf_counter() - inicio:.2f} s")
+    return df
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Genera el CSV de evidencias a partir del Excel de control')
+    parser.add_argument('--excel', default=RUTA_EXCEL, help='Excel de control de evidencias')
+    parser.add_argument('--hoja', default=HOJA_EXCEL, help='Pestaña del Excel con los proyectos y subproyectos')
+    parser.add_argument('--evidencias', default=RUTA_EVIDENCIAS, help='Carpeta con los ficheros de evidencia')
+    parser.add_argument('--salida', default=RUTA_SALIDA, help='CSV de evidencias generado')
+    args = parser.parse_args()
+    df = crear_fichero_data(args.excel, args.evidencias, args.salida, args.hoja)
+
+    print("Columnas disponibles:", df.columns.tolist())
+    print("\nPrimeras 5 filas:")
+    print(df.head())
+
+    print("\nEjemplo de extracción de IDs:")
+    for columna in ['ID_Empleado', 'Nombre_Empleado', 'ID_Subproyecto', 'Nombre_Subproyecto',
+                    'ID_Proyecto', 'Nombre_Proyecto']:
+        if columna in df.columns:
+            print(f"{columna}:", df[columna].head().tolist())
+
+    print("\nEvidencias encontradas:")
+    evidencias_encontradas = df[df['Evidencia'] != '']
+    print(f"Total de evidencias asignadas: {len(evidencias_encontradas)} de {len(df)}")
+    if len(evidencias_encontradas) > 0:
+        print(evidencias_encontradas[['Nombre_Empleado', 'Nombre_Subproyecto', 'Evidencia']].head(10))
+
+    print(f"\n✅ Archivo guardado exitosamente como: {args.salida}")
+    print(f"Total de filas: {len(df)}")
+    print(f"Total de columnas: {len(df.columns)}")
+    print("Columnas incluidas:", list(df.columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+'''
+Validaciones lanzadas desde el servidor y su progreso en vivo (Server-Sent Events).
+
+Una ejecución corre ProcesadorEvidencias.procesar_csv en un hilo aparte. Cada
+resultado, en cuanto se escribe, se añade también al CSV de revisión
+(AlmacenResultados.anadir), de modo que el revisor puede consultarlo y corregirlo
+con la API mientras el resto del lote sigue en marcha, y se publica como evento:
+
+    inicio   -> opciones de la ejecución
+    fila     -> posición en el CSV de revisión, la fila y el progreso
+    fin      -> resumen de la ejecución (porcentajes de validación y métricas)
+    error    -> mensaje si la ejecución falla
+
+El progreso incluye evidencias terminadas, total, evidencias por minuto y los
+segundos estimados hasta terminar. Los eventos se numeran para que un cliente que
+se reconecta (cabecera Last-Event-ID) reciba solo los que le faltan. Para que la
+memoria no crezca con el tamaño del lote solo se guardan los últimos
+MAX_EVENTOS_GUARDADOS: un cliente que se queda más atrás recibe desde el más antiguo
+guardado (las filas anteriores ya están en el CSV de revisión). Del mismo modo se
+conservan solo las últimas MAX_EJECUCIONES_GUARDADAS ejecuciones terminadas.
+
+Solo se permite una ejecución a la vez: todas escriben en el mismo CSV de revisión.
+Si ya tiene filas hay que pedir sobrescribir, y antes de vaciarlo se guarda una copia
+(<csv>.<fecha>.bak) con las correcciones del revisor.
+'''
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, Optional
+
+from escritor_resultados import COLUMNAS_RESULTADO, ResumenValidacion
+from orquestador import OPCIONES_POR_DEFECTO, crear_validador
+
+logger = logging.getLogger(__name__)
+
+# Opciones que se pueden indicar al lanzar una ejecución desde la API
+OPCIONES_EJECUCION = {
+    **{clave: valor for clave, valor in OPCIONES_POR_DEFECTO.items() if clave != 'reanudar'},
+    'periodo': None,
+    'limite': None,
+}
+# Segundos sin eventos tras los que se envía un comentario para mantener viva la conexión
+INTERVALO_LATIDO = 15.0
+# Últimos eventos de cada ejecución que se guardan para los clientes que se reconectan
+MAX_EVENTOS_GUARDADOS = 1000
+# Ejecuciones terminadas que se conservan para consultar su estado
+MAX_EJECUCIONES_GUARDADAS = 20
+
+
+class EjecucionEnCurso(Exception):
+    """Ya hay una validación en marcha o el CSV de revisión tiene filas que se perderían."""
+
+
+class Ejecucion:
+    """Estado y eventos de una validación lanzada desde el servidor."""
+
+    def __init__(self, id_ejecucion: int, opciones: Dict):
+        self.id = id_ejecucion
+        self.opciones = opciones
+        self.estado = 'preparando'
+        self.hechas = 0
+        self.total = 0
+        self.error = None
+        self.copia_seguridad = None
+        self.inicio = time.monotonic()
+        self.fin = None
+        self.resumen = ResumenValidacion()
+        self._condicion = threading.Condition()
+        self._eventos = deque(maxlen=MAX_EVENTOS_GUARDADOS)
+        self._ultimo_id = 0
+
+    def publicar(self, tipo: str, datos: Dict, estado: str = None):
+        """Añade un evento; si se indica estado, se cambia a la vez para que nadie lo vea sin su evento."""
+        with self._condicion:
+            if estado is not None:
+                self.estado = estado
+            self._ultimo_id += 1
+            self._eventos.append({'id': self._ultimo_id, 'tipo': tipo, 'datos': datos})
+            self._condicion.notify_all()
+
+    def progreso(self) -> Dict:
+        """Evidencias terminadas, total, ritmo (evidencias/min) y segundos estimados hasta terminar."""
+        segundos = (self.fin or time.monotonic()) - self.inicio
+        por_minuto = self.hechas / segundos * 60 if segundos and self.hechas else 0.0
+        restantes = max(self.total - self.hechas, 0)
+        eta = restantes / por_minuto * 60 if por_minuto else None
+        return {
+            'hechas': self.hechas,
+            'total': self.total,
+            'segundos': round(segundos, 1),
+            'por_minuto': round(por_minuto, 1),
+            'eta_s': round(eta, 1) if eta is not None else None,
+        }
+
+    def estado_actual(self) -> Dict:
+        return {'id': self.id, 'estado': self.estado, 'opciones': self.opciones, 'error': self.error,
+                'copia_seguridad': self.copia_seguridad, **self.progreso()}
+
+    @property
+    def terminada(self) -> bool:
+        return self.estado in ('terminada', 'error')
+
+    def eventos(self, desde: int = 0, latido: float = INTERVALO_LATIDO) -> Iterator[Optional[Dict]]:
+        """
+        Recorre los eventos a partir del siguiente a desde, esperando a los nuevos.
+
+        Devuelve None cuando pasa latido segundos sin eventos y termina tras el
+        último evento de una ejecución terminada. Si los eventos posteriores a desde
+        ya no están guardados, empieza por el más antiguo que se conserva.
+        """
+        ultimo = desde
+        while True:
+            with self._condicion:
+                if ultimo >= self._ultimo_id and not self.terminada:
+                    self._condicion.wait(latido)
+                primero = self._eventos[0]['id'] if self._eventos else self._ultimo_id + 1
+                nuevos = list(itertools.islice(self._eventos, max(0, ultimo + 1 - primero), None))
+                terminada = self.terminada
+            if not nuevos:
+                if terminada:
+                    return
+                yield None
+                continue
+            ultimo = nuevos[-1]['id']
+            yield from nuevos
+
+
+def formato_sse(evento: Optional[Dict]) -> str:
+    """Serializa un evento en formato text/event-stream (None es un latido)."""
+    if evento is None:
+        return ': latido\n\n'
+    datos = json.dumps(evento['datos'], ensure_ascii=False)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+class GestorEjecuciones:
+    def __init__(self, almacen, ruta_entrada: str, ruta_salida: str):
+        """
+        Inicializa el gestor de ejecuciones.
+
+        Args:
+            almacen: AlmacenResultados del CSV de revisión donde se añaden los resultados
+            ruta_entrada: CSV de evidencias a validar
+            ruta_salida: CSV de resultados que escribe procesar_csv
+        """
+        self.almacen = almacen
+        self.ruta_entrada = ruta_entrada
+        self.ruta_salida = ruta_salida
+        self._lock = threading.Lock()
+        self._ejecuciones: Dict[int, Ejecucion] = {}
+        self._ids = itertools.count(1)
+        self._actual: Optional[Ejecucion] = None
+
+    def iniciar(self, opciones: Dict = None, sobrescribir: bool = False) -> Ejecucion:
+        """
+        Lanza una validación en segundo plano.
+
+        Args:
+            opciones: Opciones de validación (ver OPCIONES_EJECUCION)
+            sobrescribir: Vaciar el CSV de revisión aunque ya tenga filas (antes se
+                guarda una copia de seguridad)
+
+        Raises:
+            ValueError: Si alguna opción no existe o no hay CSV de entrada
+            EjecucionEnCurso: Si ya hay una ejecución en marcha o el CSV de revisión tiene filas
+        """
+        opciones = opciones or {}
+        desconocidas = set(opciones) - set(OPCIONES_EJECUCION)
+        if desconocidas:
+            raise ValueError(f"Opciones desconocidas: {', '.join(sorted(desconocidas))}")
+        opciones = {**OPCIONES_EJECUCION, **opciones}
+        if not os.path.exists(self.ruta_entrada):
+            raise ValueError(f"No se encontró el CSV de evidencias {self.ruta_entrada}")
+
+        with self._lock:
+            if self._actual is not None and not self._actual.terminada:
+                raise EjecucionEnCurso(f"La ejecución {self._actual.id} sigue en marcha")
+            if not sobrescribir and os.path.exists(self.almacen.ruta_csv) and self.almacen.num_filas():
+                raise EjecucionEnCurso(f"{self.almacen.ruta_csv} ya tiene resultados; "
+                                       "indica sobrescribir para empezar de cero")
+            # Los resultados nuevos se van añadiendo a un CSV de revisión vacío; lo revisado
+            # hasta ahora queda en la copia de seguridad
+            copia = self.almacen.reemplazar(','.join(COLUMNAS_RESULTADO) + '\r\n', copia_seguridad=sobrescribir)
+            ejecucion = Ejecucion(next(self._ids), opciones)
+            ejecucion.copia_seguridad = copia
+            self._ejecuciones[ejecucion.id] = ejecucion
+            # Solo quedan terminadas las anteriores: se descartan las más antiguas
+            while len(self._ejecuciones) > MAX_EJECUCIONES_GUARDADAS + 1:
+                del self._ejecuciones[min(self._ejecuciones)]
+            self._actual = ejecucion
+
+        hilo = threading.Thread(target=self._ejecutar, args=(ejecucion,), name=f"validacion-{ejecucion.id}",
+                                daemon=True)
+        hilo.start()
+        return ejecucion
+
+    def obtener(self, id_ejecucion: int) -> Optional[Ejecucion]:
+        return self._ejecuciones.get(id_ejecucion)
+
+    def actual(self) -> Optional[Ejecucion]:
+        """La ejecución en marcha o, si no hay ninguna, la última lanzada."""
+        return self._actual
+
+    def _ejecutar(self, ejecucion: Ejecucion):
+        from check_evidencias import PERIODO_POR_DEFECTO, ProcesadorEvidencias
+
+        opciones = ejecucion.opciones
+        validator = None
+        try:
+            validator = crear_validador(opciones, opciones['periodo'] or PERIODO_POR_DEFECTO)
+            ejecucion.inicio = time.monotonic()
+            ejecucion.publicar('inicio', {'opciones': opciones}, estado='validando')
+
+            def al_terminar_fila(hechas: int, total: int, resultado: Dict):
+                posicion, = self.almacen.anadir([resultado])
+                ejecucion.hechas, ejecucion.total = hechas, total
+                ejecucion.resumen.anadir(resultado)
+                ejecucion.publicar('fila', {'fila': posicion, 'datos': resultado, **ejecucion.progreso()})
+
+            ProcesadorEvidencias(validator).procesar_csv(
+                self.ruta_entrada,
+                self.ruta_salida,
+                limite_lineas=opciones['limite'],
+                workers=opciones['workers'],
+                tamano_lote=opciones['lote'],
+                agrupar_por_empleado=opciones['lote_por_empleado'],
+                progreso=al_terminar_fila
+            )
+            ejecucion.fin = time.monotonic()
+            resumen = ejecucion.resumen
+            ejecucion.publicar('fin', {
+                **ejecucion.progreso(),
+                'nombre_ok_pct': resumen.porcentaje('Nombre_ok'),
+                'periodo_ok_pct': resumen.porcentaje('Periodo_ok'),
+                'tarea_ok_pct': resumen.porcentaje('Tarea_ok'),
+                'metricas': validator.metricas.informe(),
+            }, estado='terminada')
+            logger.info(f"Ejecución {ejecucion.id} terminada: {ejecucion.hechas} evidencias")
+        except Exception as e:
+            logger.error(f"Error en la ejecución {ejecucion.id}: {str(e)}", exc_info=True)
+            ejecucion.fin = time.monotonic()
+            ejecucion.error = str(e)
+            ejecucion.publicar('error', {'error': str(e), **ejecucion.progreso()}, estado='error')
+        finally:
+            if validator is not None and validator.cache is not None:
+                validator.cache.cerrar()
@@ -0,0 +1,183 @@
+'''
+Escritura incremental del CSV de resultados y soporte para reanudar ejecuciones.
+
+Cada resultado se escribe y se vuelca a disco en cuanto se valida, de modo que si
+el proceso se interrumpe (error, Ctrl+C, límite de la API) el CSV de salida
+contiene todas las evidencias terminadas hasta ese momento. Con --resume se leen
+esas filas y solo se procesan las evidencias que faltan.
+
+ResumenValidacion acumula los totales de Nombre_ok/Periodo_ok/Tarea_ok según se
+escriben los resultados, sin tener que volver a cargar el CSV completo.
+'''
+
+import csv
+import logging
+import os
+from collections import Counter
+from typing import Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Columnas del CSV de resultados, en el orden en el que se escriben
+COLUMNAS_RESULTADO = [
+    "Nombre_ok",
+    "Periodo_ok",
+    "Tarea_ok",
+    "Nombre_a_validar",
+    "Nombre_encontrado",
+    "Periodo_a_validar",
+    "Fecha_encontrada",
+    "Tarea_a_validar",
+    "Tareas_encontradas",
+    "Justificacion",
+    "Link_imagen",
+    "Descripcion_tarea",
+    "Fecha_respuesta",
+]
+# Columnas añadidas después de la primera versión del CSV: un fichero anterior no las
+# tiene en la cabecera y sus filas siguen valiendo al reanudar
+COLUMNAS_OPCIONALES = {"Fecha_respuesta"}
+
+
+def _fila_terminada(fila: Dict) -> bool:
+    """Una fila está terminada si está completa, tiene imagen y no es un error de procesamiento."""
+    if any(fila.get(columna) is None for columna in COLUMNAS_RESULTADO
+           if columna not in COLUMNAS_OPCIONALES or columna in fila):
+        # Fila cortada a medias por una interrupción durante la escritura
+        return False
+    return bool(fila['Link_imagen']) and fila['Nombre_encontrado'] != 'Error'
+
+
+def _leer_filas(ruta_salida: str) -> Iterable[Dict]:
+    """Recorre las filas del CSV de resultados sin cargarlo entero en memoria."""
+    with open(ruta_salida, 'r', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def _escribir_filas(ruta_salida: str, filas: Iterable[Dict]):
+    """Reescribe el CSV completo de forma atómica (fichero temporal + rename)."""
+    ruta_temporal = ruta_salida + '.tmp'
+    with open(ruta_temporal, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNAS_RESULTADO, restval='', extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(filas)
+    os.replace(ruta_temporal, ruta_salida)
+
+
+def preparar_reanudacion(ruta_salida: str) -> Counter:
+    """
+    Deja en el CSV de salida solo las filas terminadas y las devuelve contadas por Link_imagen.
+
+    Las filas con error o incompletas se eliminan para que se vuelvan a procesar.
+    """
+    if not os.path.exists(ruta_salida):
+        return Counter()
+    terminadas = Counter()
+    descartadas = 0
+
+    def filtrar():
+        nonlocal descartadas
+        for fila in _leer_filas(ruta_salida):
+            if _fila_terminada(fila):
+                terminadas[fila['Link_imagen']] += 1
+                yield fila
+            else:
+                descartadas += 1
+
+    # Se reescribe siempre en streaming; si no había nada que descartar el contenido no cambia
+    _escribir_filas(ruta_salida, filtrar())
+    if descartadas:
+        logger.info(f"Descartando {descartadas} filas con error o incompletas de {ruta_salida}")
+    return terminadas
+
+
+def reordenar_salida(ruta_salida: str, links_entrada: Iterable[str]):
+    """
+    Reordena el CSV de salida según el orden del CSV de entrada.
+
+    Tras reanudar, las evidencias nuevas quedan al final del fichero; esta función
+    las coloca en su posición original emparejando por Link_imagen. Es la única
+    operación que necesita tener todas las filas de salida en memoria a la vez.
+    """
+    filas = _leer_filas(ruta_salida)
+    pendientes = {}
+    for fila in filas:
+        pendientes.setdefault(fila['Link_imagen'], []).append(fila)
+    ordenadas = []
+    for link in links_entrada:
+        if pendientes.get(link):
+            ordenadas.append(pendientes[link].pop(0))
+    # Las filas que no se pueden emparejar (p. ej. errores sin imagen) se mantienen al final
+    for resto in pendientes.values():
+        ordenadas.extend(resto)
+    _escribir_filas(ruta_salida, ordenadas)
+
+
+def limpiar_resultado(resultado: Dict) -> Dict:
+    """Cambia los NaN de pandas (celdas vacías de la entrada) por cadenas vacías, igual que DataFrame.to_csv."""
+    return {clave: '' if isinstance(valor, float) and valor != valor else valor for clave, valor in resultado.items()}
+
+
+def _es_ok(valor) -> bool:
+    """Interpreta una columna *_ok tanto recién validada (bool/int) como leída del CSV (texto)."""
+    if isinstance(valor, str):
+        return valor.strip().lower() in ('true', '1')
+    return bool(valor) and valor == valor
+
+
+class ResumenValidacion:
+    """Totales de la validación calculados de forma incremental, resultado a resultado."""
+
+    CAMPOS = ('Nombre_ok', 'Periodo_ok', 'Tarea_ok')
+
+    def __init__(self):
+        self.total = 0
+        self.correctos = Counter()
+
+    def anadir(self, resultado: Dict):
+        self.total += 1
+        for campo in self.CAMPOS:
+            if _es_ok(resultado.get(campo)):
+                self.correctos[campo] += 1
+
+    def anadir_csv(self, ruta_salida: str):
+        """Suma los resultados ya guardados en un CSV (p. ej. los conservados al reanudar)."""
+        if os.path.exists(ruta_salida):
+            for fila in _leer_filas(ruta_salida):
+                self.anadir(fila)
+
+    def porcentaje(self, campo: str) -> float:
+        return self.correctos[campo] / self.total * 100 if self.total else 0.0
+
+
+class EscritorResultados:
+    def __init__(self, ruta_salida: str, anadir: bool = False):
+        """
+        Abre el CSV de resultados para escritura incremental.
+
+        Args:
+            ruta_salida: Ruta del CSV de resultados
+            anadir: Si es True se añaden filas al fichero existente en lugar de sobrescribirlo
+        """
+        escribir_cabecera = not (anadir and os.path.exists(ruta_salida))
+        self._fichero = open(ruta_salida, 'a' if anadir else 'w', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._fichero, fieldnames=COLUMNAS_RESULTADO, restval='', extrasaction='ignore')
+        if escribir_cabecera:
+            self._writer.writeheader()
+        self.filas_escritas = 0
+
+    def escribir(self, resultado: Dict):
+        """Escribe un resultado y lo vuelca a disco inmediatamente."""
+        self._writer.writerow(limpiar_resultado(resultado))
+        self._fichero.flush()
+        os.fsync(self._fichero.fileno())
+        self.filas_escritas += 1
+
+    def cerrar(self):
+        self._fichero.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
@@ -0,0 +1,127 @@
+'''
+Servicio del frontend compilado (frontend/dist) desde el propio servidor.
+
+- Los ficheros de texto (js, css, html, svg, json...) se comprimen una vez al
+  arrancar junto al original (.gz y, si está instalado brotli, .br) y se sirve la
+  versión que acepte el navegador, sin comprimir en cada petición
+- Los ficheros de assets/ llevan un hash en el nombre (los genera Vite), así que
+  se marcan como inmutables durante un año; index.html se revalida siempre para
+  que un despliegue nuevo se vea enseguida
+- Cualquier otra ruta sin fichero devuelve index.html (navegación del frontend)
+
+Uso:
+    estaticos = EstaticosFrontend('frontend/dist')
+    estaticos.precomprimir()
+    respuesta = estaticos.servir('assets/index-3f2a1b.js', request.accept_encodings)
+'''
+
+import gzip
+import logging
+import mimetypes
+import os
+from typing import Dict, Optional
+
+from flask import send_file
+from werkzeug.security import safe_join
+
+# brotli es opcional: si no está instalado solo se generan las versiones gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES_COMPRIMIBLES = ('.js', '.mjs', '.css', '.html', '.svg', '.json', '.map', '.txt', '.ico', '.webmanifest')
+# No compensa comprimir ficheros muy pequeños
+TAMANO_MINIMO_COMPRESION = 1024
+MAX_AGE_INMUTABLE = 365 * 24 * 3600
+# Versiones precomprimidas por orden de preferencia: (codificación, extensión)
+CODIFICACIONES = (('br', '.br'), ('gzip', '.gz'))
+
+
+class EstaticosFrontend:
+    def __init__(self, dir_dist: str, dir_inmutable: str = 'assets'):
+        """
+        Inicializa el servicio de estáticos.
+
+        Args:
+            dir_dist: Carpeta con el build del frontend (npm run build)
+            dir_inmutable: Subcarpeta cuyos ficheros llevan hash en el nombre y no cambian nunca
+        """
+        self.dir_dist = dir_dist
+        self.dir_inmutable = dir_inmutable.strip('/') + '/'
+
+    @property
+    def disponible(self) -> bool:
+        return os.path.isfile(os.path.join(self.dir_dist, 'index.html'))
+
+    def precomprimir(self) -> Dict[str, int]:
+        """
+        Genera las versiones .gz/.br que falten o estén desfasadas respecto al original.
+
+        Se escriben con fichero temporal + rename, así que varios workers pueden
+        llamarlo a la vez al arrancar.
+
+        Returns:
+            Número de ficheros comprimidos por codificación
+        """
+        generados = {'gzip': 0, 'br': 0}
+        if not os.path.isdir(self.dir_dist):
+            return generados
+        for raiz, _, ficheros in os.walk(self.dir_dist):
+            for nombre in ficheros:
+                ruta = os.path.join(raiz, nombre)
+                if not nombre.endswith(EXTENSIONES_COMPRIMIBLES) or os.path.getsize(ruta) < TAMANO_MINIMO_COMPRESION:
+                    continue
+                for codificacion, extension in CODIFICACIONES:
+                    if codificacion == 'br' and brotli is None:
+                        continue
+                    destino = ruta + extension
+                    if os.path.exists(destino) and os.path.getmtime(destino) >= os.path.getmtime(ruta):
+                        continue
+                    with open(ruta, 'rb') as f:
+                        contenido = f.read()
+                    comprimido = brotli.compress(contenido) if codificacion == 'br' else gzip.compress(contenido, 9)
+                    temporal = f"{destino}.{os.getpid()}.tmp"
+                    with open(temporal, 'wb') as f:
+                        f.write(comprimido)
+                    os.replace(temporal, destino)
+                    generados[codificacion] += 1
+        if any(generados.values()):
+            logger.info(f"Frontend precomprimido en {self.dir_dist}: {generados}")
+        return generados
+
+    def servir(self, ruta: str, codificaciones_aceptadas) -> Optional[object]:
+        """
+        Respuesta para una ruta del frontend, o None si no hay build.
+
+        Args:
+            ruta: Ruta relativa pedida ('' para la raíz)
+            codificaciones_aceptadas: request.accept_encodings
+        """
+        if not self.disponible:
+            return None
+        ruta_fichero = safe_join(self.dir_dist, ruta) if ruta else None
+        if ruta_fichero is None or not os.path.isfile(ruta_fichero):
+            # Rutas del frontend sin fichero propio: las resuelve index.html
+            ruta, ruta_fichero = 'index.html', os.path.join(self.dir_dist, 'index.html')
+
+        mimetype = mimetypes.guess_type(ruta_fichero)[0] or 'application/octet-stream'
+        codificacion = None
+        for candidata, extension in CODIFICACIONES:
+            if candidata in codificaciones_aceptadas and os.path.isfile(ruta_fichero + extension):
+                codificacion, ruta_fichero = candidata, ruta_fichero + extension
+                break
+
+        inmutable = ruta.startswith(self.dir_inmutable)
+        respuesta = send_file(ruta_fichero, mimetype=mimetype, conditional=True,
+                              max_age=MAX_AGE_INMUTABLE if inmutable else None)
+        if inmutable:
+            respuesta.headers['Cache-Control'] = f'public, max-age={MAX_AGE_INMUTABLE}, immutable'
+        else:
+            respuesta.headers['Cache-Control'] = 'no-cache'
+        if codificacion:
+            respuesta.headers['Content-Encoding'] = codificacion
+        respuesta.headers['Vary'] = 'Accept-Encoding'
+        return respuesta
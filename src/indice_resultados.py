@@ -0,0 +1,153 @@
+'''
+Índice SQLite de los resultados para consultas paginadas desde la interfaz.
+
+Los resultados se cargan desde AlmacenResultados en una base de datos SQLite en
+memoria con índices en los campos de filtrado y una tabla FTS5 sobre
+Justificacion para la búsqueda de texto. Antes de cada consulta se sincroniza
+con el almacén: si el CSV se ha recargado se reconstruye, y si solo han cambiado
+algunas filas (PATCH) se actualizan esas filas.
+
+La conexión se abre en la primera consulta de cada proceso y no al crear el
+índice: con un servidor que hace fork de varios workers (gunicorn), cada worker
+tiene su propia base de datos en lugar de heredar la conexión del proceso padre.
+'''
+
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List
+
+from almacen_resultados import AlmacenResultados
+
+# Filtros exactos admitidos: parámetro de la consulta -> columna
+FILTROS = {
+    'Nombre_ok': 'Nombre_ok',
+    'Periodo_ok': 'Periodo_ok',
+    'Tarea_ok': 'Tarea_ok',
+    'empleado': 'Nombre_a_validar',
+    'subproyecto': 'Tarea_a_validar',
+}
+COLUMNAS_INDEXADAS = ['Nombre_ok', 'Periodo_ok', 'Tarea_ok', 'Nombre_a_validar', 'Tarea_a_validar']
+MAX_POR_PAGINA = 500
+
+
+def _columna(nombre: str) -> str:
+    """Entrecomilla un nombre de columna para usarlo en SQL."""
+    return '"' + nombre.replace('"', '""') + '"'
+
+
+def _consulta_fts(texto: str) -> str:
+    """Convierte el texto del usuario en una consulta FTS5 segura (todas las palabras, por prefijo)."""
+    palabras = re.findall(r'\w+', texto)
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+class IndiceResultados:
+    def __init__(self, almacen: AlmacenResultados):
+        self.almacen = almacen
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._version = 0
+        self._columnas: List[str] = []
+
+    def _conectar(self):
+        """Abre la base de datos en memoria del proceso actual (la primera vez o tras un fork)."""
+        if self._pid == os.getpid():
+            return
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._pid = os.getpid()
+        self._version = 0
+        self._columnas = []
+
+    def _sincronizar(self):
+        self._conectar()
+        version, columnas, filas, completa = self.almacen.instantanea(self._version)
+        if version == self._version:
+            return
+        if completa or columnas != self._columnas:
+            self._reconstruir(columnas, filas)
+        else:
+            self._actualizar_filas(filas)
+        self._version = version
+
+    def _reconstruir(self, columnas: List[str], filas: List):
+        conn = self._conn
+        conn.execute('DROP TABLE IF EXISTS resultados')
+        conn.execute('DROP TABLE IF EXISTS resultados_fts')
+        definicion = ', '.join(f'{_columna(c)} TEXT' for c in columnas)
+        conn.execute(f'CREATE TABLE resultados (fila INTEGER PRIMARY KEY, {definicion})')
+        for columna in COLUMNAS_INDEXADAS:
+            if columna in columnas:
+                conn.execute(f'CREATE INDEX {_columna("idx_" + columna)} ON resultados ({_columna(columna)})')
+        conn.execute("CREATE VIRTUAL TABLE resultados_fts USING fts5(Justificacion, tokenize='unicode61 remove_diacritics 2')")
+        self._columnas = columnas
+        self._actualizar_filas(filas)
+
+    def _actualizar_filas(self, filas: List):
+        columnas = self._columnas
+        marcadores = ', '.join('?' for _ in range(len(columnas) + 1))
+        nombres = ', '.join(['fila'] + [_columna(c) for c in columnas])
+        with self._conn:
+            self._conn.executemany(
+                f'INSERT OR REPLACE INTO resultados ({nombres}) VALUES ({marcadores})',
+                [[posicion] + [fila.get(c) for c in columnas] for posicion, fila in filas],
+            )
+            self._conn.executemany('DELETE FROM resultados_fts WHERE rowid = ?', [(posicion,) for posicion, _ in filas])
+            self._conn.executemany(
+                'INSERT INTO resultados_fts (rowid, Justificacion) VALUES (?, ?)',
+                [(posicion, fila.get('Justificacion') or '') for posicion, fila in filas],
+            )
+
+    def consultar(self, pagina: int = 1, por_pagina: int = 50, orden: str = 'fila', descendente: bool = False,
+                  filtros: Dict = None, texto: str = None) -> Dict:
+        """
+        Devuelve una página de resultados.
+
+        Args:
+            pagina: Número de página (empezando en 1)
+            por_pagina: Filas por página (máximo MAX_POR_PAGINA)
+            orden: Columna por la que ordenar
+            descendente: Orden descendente
+            filtros: Filtros exactos (claves de FILTROS)
+            texto: Búsqueda de texto completo en Justificacion
+
+        Returns:
+            Diccionario con total, pagina, por_pagina y resultados (cada fila incluye su posición en "fila")
+
+        Raises:
+            ValueError: Si la columna de orden o algún filtro no son válidos
+        """
+        pagina = max(1, pagina)
+        por_pagina = min(max(1, por_pagina), MAX_POR_PAGINA)
+        with self._lock:
+            self._sincronizar()
+            if orden != 'fila' and orden not in self._columnas:
+                raise ValueError(f"No se puede ordenar por {orden}")
+
+            condiciones, parametros = [], []
+            for nombre, valor in (filtros or {}).items():
+                if nombre not in FILTROS:
+                    raise ValueError(f"Filtro desconocido: {nombre}")
+                condiciones.append(f'{_columna(FILTROS[nombre])} = ?')
+                parametros.append(str(valor))
+            consulta_fts = _consulta_fts(texto) if texto else ''
+            if consulta_fts:
+                condiciones.append('fila IN (SELECT rowid FROM resultados_fts WHERE resultados_fts MATCH ?)')
+                parametros.append(consulta_fts)
+            where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+
+            total = self._conn.execute(f'SELECT COUNT(*) FROM resultados {where}', parametros).fetchone()[0]
+            direccion = 'DESC' if descendente else 'ASC'
+            filas = self._conn.execute(
+                f'SELECT * FROM resultados {where} ORDER BY {_columna(orden)} {direccion}, fila ASC LIMIT ? OFFSET ?',
+                parametros + [por_pagina, (pagina - 1) * por_pagina],
+            ).fetchall()
+        return {
+            'total': total,
+            'pagina': pagina,
+            'por_pagina': por_pagina,
+            'resultados': [dict(fila) for fila in filas],
+        }
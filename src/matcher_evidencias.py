@@ -0,0 +1,167 @@
+'''
+Asignación de ficheros de evidencia a filas del Excel de control.
+
+Los ficheros se llaman "<Empleado>_<Subproyecto ...>.<ext>". Para cada fila se
+busca el fichero cuyo empleado y subproyecto se parezcan más (SequenceMatcher),
+con un peso de 0.6 para el empleado y 0.4 para el subproyecto, exigiendo más de
+un 70% de similitud en el empleado y más de 0.5 de puntuación total.
+
+buscar_evidencia es la implementación original: recorre todos los ficheros para
+cada fila, así que su coste es filas × ficheros. IndiceEvidencias produce
+exactamente las mismas asignaciones pero:
+
+- trocea los nombres de fichero una sola vez y los agrupa por empleado normalizado
+- compara cada empleado de la tabla solo con los empleados distintos del índice,
+  descartando antes los que no pueden superar el 70% con las cotas superiores
+  de SequenceMatcher (longitud y caracteres en común), que son exactas
+- calcula la similitud de subproyecto solo para los ficheros de esos empleados,
+  solo si la cota superior de la puntuación puede mejorar la mejor encontrada y
+  una única vez por cada par (subproyecto, resto del nombre de fichero)
+'''
+
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+PESO_EMPLEADO = 0.6
+PESO_SUBPROYECTO = 0.4
+UMBRAL_EMPLEADO = 0.7
+UMBRAL_TOTAL = 0.5
+
+
+def similar(a, b):
+    """Función para calcular la similitud entre dos strings"""
+    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+
+
+def buscar_evidencia(nombre_empleado, nombre_subproyecto, archivos_evidencias):
+    """
+    Busca la evidencia que mejor coincida con el empleado y subproyecto
+    """
+    mejor_coincidencia = ""
+    mejor_score = 0
+    
+    # Limpiamos el nombre del empleado (quitamos el ID)
+    empleado_limpio = nombre_empleado.strip() if pd.notna(nombre_empleado) else ""
+    subproyecto_limpio = nombre_subproyecto.strip() if pd.notna(nombre_subproyecto) else ""
+    
+    for archivo in archivos_evidencias:
+        # Dividimos el nombre del archivo en partes
+        if '_' in archivo:
+            nombre_archivo_empleado = archivo.split('_')[0].strip()
+            resto_archivo = '_'.join(archivo.split('_')[1:])
+            
+            # Calculamos similitud con el empleado
+            similitud_empleado = similar(empleado_limpio, nombre_archivo_empleado)
+            
+            # Calculamos similitud con el subproyecto
+            similitud_subproyecto = similar(subproyecto_limpio, resto_archivo)
+            
+            # Score combinado (damos más peso al empleado)
+            score_total = (similitud_empleado * 0.6) + (similitud_subproyecto * 0.4)
+            
+            # Si encontramos una mejor coincidencia
+            if score_total > mejor_score and similitud_empleado > 0.7:  # Mínimo 70% similitud en empleado
+                mejor_score = score_total
+                mejor_coincidencia = archivo
+    
+    return mejor_coincidencia if mejor_score > 0.5 else ""
+
+
+class _FicheroIndexado:
+    """Fichero de evidencia ya troceado."""
+
+    __slots__ = ('posicion', 'archivo', 'resto')
+
+    def __init__(self, posicion: int, archivo: str, resto: str):
+        self.posicion = posicion
+        self.archivo = archivo
+        self.resto = resto.lower()
+
+
+class IndiceEvidencias:
+    def __init__(self, archivos_evidencias: List[str]):
+        """
+        Indexa los ficheros de evidencia por nombre de empleado normalizado.
+
+        Args:
+            archivos_evidencias: Nombres de fichero en el orden en que se listaron
+                (el orden decide los empates, igual que en buscar_evidencia)
+        """
+        self.total_archivos = len(archivos_evidencias)
+        self._grupos: Dict[str, List[_FicheroIndexado]] = {}
+        for posicion, archivo in enumerate(archivos_evidencias):
+            if '_' not in archivo:
+                continue
+            partes = archivo.split('_')
+            empleado = partes[0].strip().lower()
+            resto = '_'.join(partes[1:])
+            self._grupos.setdefault(empleado, []).append(_FicheroIndexado(posicion, archivo, resto))
+        # SequenceMatcher precalcula su índice sobre seq2, así que la parte fija (el fichero) va en seq2.
+        # Los matchers de subproyecto se crean al primer uso y se comparten entre ficheros con el mismo resto.
+        self._matchers_empleado = {empleado: SequenceMatcher(None, '', empleado) for empleado in self._grupos}
+        self._matchers_subproyecto: Dict[str, SequenceMatcher] = {}
+        self._similitudes_subproyecto: Dict[Tuple[str, str], float] = {}
+        self._candidatos = lru_cache(maxsize=None)(self._calcular_candidatos)
+        self.buscar = lru_cache(maxsize=None)(self._buscar)
+
+    def _calcular_candidatos(self, empleado: str) -> List[Tuple[float, _FicheroIndexado]]:
+        """Ficheros cuyo empleado supera el umbral de similitud, en el orden original."""
+        candidatos = []
+        for nombre, matcher in self._matchers_empleado.items():
+            matcher.set_seq1(empleado)
+            # real_quick_ratio y quick_ratio son cotas superiores de ratio: si no
+            # superan el umbral, ratio tampoco lo hará
+            if matcher.real_quick_ratio() <= UMBRAL_EMPLEADO or matcher.quick_ratio() <= UMBRAL_EMPLEADO:
+                continue
+            similitud = matcher.ratio()
+            if similitud > UMBRAL_EMPLEADO:
+                candidatos.extend((similitud, fichero) for fichero in self._grupos[nombre])
+        candidatos.sort(key=lambda candidato: candidato[1].posicion)
+        return candidatos
+
+    def _similitud_subproyecto(self, subproyecto: str, resto: str) -> float:
+        """Similitud subproyecto/resto del fichero, memorizada por par."""
+        clave = (subproyecto, resto)
+        similitud = self._similitudes_subproyecto.get(clave)
+        if similitud is None:
+            matcher = self._matchers_subproyecto.get(resto)
+            if matcher is None:
+                matcher = self._matchers_subproyecto[resto] = SequenceMatcher(None, '', resto)
+            matcher.set_seq1(subproyecto)
+            similitud = self._similitudes_subproyecto[clave] = matcher.ratio()
+        return similitud
+
+    def _buscar(self, nombre_empleado, nombre_subproyecto) -> str:
+        """Devuelve el fichero que asignaría buscar_evidencia (o "" si ninguno supera los umbrales)."""
+        mejor_coincidencia, mejor_score = self.mejor_coincidencia(nombre_empleado, nombre_subproyecto)
+        return mejor_coincidencia if mejor_score > UMBRAL_TOTAL else ""
+
+    def mejor_coincidencia(self, nombre_empleado, nombre_subproyecto) -> Tuple[str, float]:
+        """
+        Devuelve el fichero con mejor puntuación y esa puntuación, sin aplicar el umbral total.
+
+        Sirve para combinar índices parciales: el mejor de la unión es el de mayor puntuación
+        y, a igualdad, el que va antes en el orden de los ficheros.
+        """
+        empleado_limpio = nombre_empleado.strip() if pd.notna(nombre_empleado) else ""
+        subproyecto_limpio = nombre_subproyecto.strip() if pd.notna(nombre_subproyecto) else ""
+        subproyecto = subproyecto_limpio.lower()
+
+        mejor_coincidencia = ""
+        mejor_score = 0
+        for similitud_empleado, fichero in self._candidatos(empleado_limpio.lower()):
+            score_empleado = similitud_empleado * PESO_EMPLEADO
+            # Cota por longitudes: si ni con ella se mejora la mejor puntuación, se descarta sin comparar
+            longitud_total = len(subproyecto) + len(fichero.resto)
+            cota = 2.0 * min(len(subproyecto), len(fichero.resto)) / longitud_total if longitud_total else 1.0
+            if score_empleado + (cota * PESO_SUBPROYECTO) <= mejor_score:
+                continue
+            score_total = score_empleado + (self._similitud_subproyecto(subproyecto, fichero.resto) * PESO_SUBPROYECTO)
+            if score_total > mejor_score:
+                mejor_score = score_total
+                mejor_coincidencia = fichero.archivo
+
+        return mejor_coincidencia, mejor_score
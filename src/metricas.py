@@ -0,0 +1,331 @@
+'''
+Métricas de tiempo por etapa del proceso de validación.
+
+Cada evidencia (o cada lote, en modo lotes) se registra como una unidad de trabajo
+con el tiempo de cada etapa:
+
+- prefiltro: revisión local previa (fichero, imagen en blanco/corrupta, duplicados)
+- carga_imagen: lectura y preprocesado de la imagen
+- prompt: construcción del prompt
+- cache: consulta a la caché de respuestas
+- api_rapido: llamada al nivel rápido de la cascada, si está activa
+- api: llamada a Gemini (incluye esperas del limitador y reintentos)
+- parseo: interpretación del JSON de la respuesta
+- validacion: reglas de nombre, periodo y tarea
+
+El informe de la ejecución incluye percentiles p50/p95/p99 por etapa, throughput
+(evidencias/minuto), tokens de la respuesta de Gemini (también por evidencia),
+respuestas con JSON válido, reparado o irrecuperable, errores por categoría y, con
+la cascada de modelos, las evidencias resueltas en cada nivel y su latencia, y
+se guarda en JSON (resumen) y CSV (una fila por unidad de trabajo) para comparar
+ejecuciones.
+
+La memoria no crece con el número de evidencias: cada unidad se suma a contadores y
+a muestras de tamaño acotado (muestreo de reservorio) para los percentiles, y su
+fila de detalle se escribe en el CSV en cuanto termina (abrir_detalle). Hasta
+TAMANO_MUESTRA valores por distribución los percentiles son exactos; a partir de ahí
+se estiman sobre una muestra uniforme de todos los valores.
+'''
+
+import csv
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ETAPAS = ['prefiltro', 'carga_imagen', 'prompt', 'cache', 'api_rapido', 'api', 'parseo', 'validacion']
+# Cómo se ha interpretado el JSON de cada respuesta de Gemini
+ESTADOS_RESPUESTA = ['valida', 'reparada', 'malformada']
+NIVELES_CASCADA = ('rapido', 'completo')
+# Valores guardados de cada distribución para calcular sus percentiles
+TAMANO_MUESTRA = 10000
+COLUMNAS_DETALLE = (['id', 'evidencias', 'total'] + ETAPAS + ['tokens_entrada', 'tokens_salida']
+                    + [f'respuestas_{estado}' for estado in ESTADOS_RESPUESTA]
+                    + ['nivel', 'motivo_escalado', 'errores'])
+
+
+def categoria_error(error: Exception) -> str:
+    """Agrupa las excepciones en categorías estables para el informe."""
+    nombre = type(error).__name__
+    if isinstance(error, FileNotFoundError):
+        return 'imagen_no_encontrada'
+    if nombre == 'EvidenciaDescartada':
+        return 'descartada_prefiltro'
+    if nombre == 'UnidentifiedImageError':
+        return 'imagen_invalida'
+    if isinstance(error, json.JSONDecodeError):
+        return 'json_invalido'
+    if nombre == 'CircuitoAbiertoError':
+        return 'circuito_abierto'
+    if getattr(error, 'code', None) == 429 or nombre in ('ResourceExhausted', 'TooManyRequests'):
+        return 'cuota'
+    return nombre
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil p (0-100) con interpolación lineal."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicion = (len(ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicion - inferior)
+
+
+class Muestra:
+    """Número, suma y una muestra acotada (reservorio, algoritmo R) de los valores de una distribución."""
+
+    def __init__(self, capacidad: int = TAMANO_MUESTRA, semilla: int = 0):
+        self.capacidad = capacidad
+        self.n = 0
+        self.suma = 0.0
+        self._valores: List[float] = []
+        self._random = random.Random(semilla)
+
+    def anadir(self, valor: float):
+        self.n += 1
+        self.suma += valor
+        if len(self._valores) < self.capacidad:
+            self._valores.append(valor)
+        else:
+            # Cada valor visto tiene la misma probabilidad de estar en la muestra
+            posicion = self._random.randrange(self.n)
+            if posicion < self.capacidad:
+                self._valores[posicion] = valor
+
+    def percentil(self, p: float) -> float:
+        return percentil(self._valores, p)
+
+    @property
+    def media(self) -> float:
+        return self.suma / self.n if self.n else 0.0
+
+    def resumen(self) -> Dict:
+        return {
+            'n': self.n,
+            'media_s': self.media,
+            'p50_s': self.percentil(50),
+            'p95_s': self.percentil(95),
+            'p99_s': self.percentil(99),
+            'suma_s': self.suma,
+        }
+
+
+class NivelCascada:
+    """Totales de las unidades resueltas en un nivel de la cascada."""
+
+    def __init__(self):
+        self.unidades = 0
+        self.evidencias = 0
+        self.tokens_salida = 0
+        self.totales = Muestra()
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._actual = threading.local()
+        self._inicio = None
+        self._fin = None
+        self._unidades = 0
+        self._evidencias = 0
+        self._etapas: Dict[str, Muestra] = {}
+        self._tokens = Counter()
+        self._salida_por_evidencia = Muestra()
+        self._respuestas = Counter()
+        self._errores = Counter()
+        self._niveles = {nivel: NivelCascada() for nivel in NIVELES_CASCADA}
+        self._motivos = Counter()
+        self._fichero_detalle = None
+        self._escritor_detalle: Optional[csv.DictWriter] = None
+
+    def abrir_detalle(self, ruta_csv: str):
+        """Empieza a escribir en ruta_csv una fila por unidad de trabajo según van terminando."""
+        with self._lock:
+            self._cerrar_detalle()
+            self._fichero_detalle = open(ruta_csv, 'w', encoding='utf-8', newline='')
+            self._escritor_detalle = csv.DictWriter(self._fichero_detalle, fieldnames=COLUMNAS_DETALLE)
+            self._escritor_detalle.writeheader()
+
+    def cerrar_detalle(self):
+        with self._lock:
+            self._cerrar_detalle()
+
+    def _cerrar_detalle(self):
+        if self._fichero_detalle is not None:
+            self._fichero_detalle.close()
+            logger.info(f"Detalle de métricas guardado en {self._fichero_detalle.name}")
+        self._fichero_detalle = None
+        self._escritor_detalle = None
+
+    @contextmanager
+    def unidad(self, identificador, evidencias: int = 1):
+        """
+        Registra una unidad de trabajo (una evidencia o un lote) del hilo actual.
+
+        Las llamadas a medir, registrar_tokens y registrar_error hechas dentro
+        del bloque se asocian a esta unidad.
+        """
+        registro = {
+            'id': identificador,
+            'evidencias': evidencias,
+            'etapas': {},
+            'tokens_entrada': 0,
+            'tokens_salida': 0,
+            'respuestas': dict.fromkeys(ESTADOS_RESPUESTA, 0),
+            'nivel': '',
+            'motivo_escalado': '',
+            'errores': [],
+        }
+        anterior = getattr(self._actual, 'registro', None)
+        self._actual.registro = registro
+        inicio = time.perf_counter()
+        with self._lock:
+            if self._inicio is None:
+                self._inicio = inicio
+        try:
+            yield registro
+        finally:
+            fin = time.perf_counter()
+            registro['total'] = fin - inicio
+            self._actual.registro = anterior
+            with self._lock:
+                self._acumular(registro)
+                self._fin = fin if self._fin is None else max(self._fin, fin)
+
+    def _acumular(self, registro: Dict):
+        """Suma una unidad terminada a los totales y escribe su fila de detalle (con el lock tomado)."""
+        self._unidades += 1
+        self._evidencias += registro['evidencias']
+        for etapa, segundos in list(registro['etapas'].items()) + [('total', registro['total'])]:
+            self._etapas.setdefault(etapa, Muestra()).anadir(segundos)
+        self._tokens['entrada'] += registro['tokens_entrada']
+        self._tokens['salida'] += registro['tokens_salida']
+        if registro['tokens_salida'] and registro['evidencias']:
+            self._salida_por_evidencia.anadir(registro['tokens_salida'] / registro['evidencias'])
+        self._respuestas.update(registro['respuestas'])
+        self._errores.update(registro['errores'])
+        if registro['nivel'] in self._niveles:
+            nivel = self._niveles[registro['nivel']]
+            nivel.unidades += 1
+            nivel.evidencias += registro['evidencias']
+            nivel.tokens_salida += registro['tokens_salida']
+            nivel.totales.anadir(registro['total'])
+            if registro['motivo_escalado']:
+                self._motivos[registro['motivo_escalado']] += 1
+        if self._escritor_detalle is not None:
+            fila = {etapa: registro['etapas'].get(etapa, '') for etapa in ETAPAS}
+            fila.update({
+                'id': registro['id'],
+                'evidencias': registro['evidencias'],
+                'total': registro['total'],
+                'tokens_entrada': registro['tokens_entrada'],
+                'tokens_salida': registro['tokens_salida'],
+                **{f'respuestas_{estado}': n for estado, n in registro['respuestas'].items()},
+                'nivel': registro['nivel'],
+                'motivo_escalado': registro['motivo_escalado'],
+                'errores': ';'.join(registro['errores']),
+            })
+            self._escritor_detalle.writerow(fila)
+            self._fichero_detalle.flush()
+
+    @contextmanager
+    def medir(self, etapa: str):
+        """Suma al registro actual el tiempo del bloque en la etapa indicada."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            registro = getattr(self._actual, 'registro', None)
+            if registro is not None:
+                registro['etapas'][etapa] = registro['etapas'].get(etapa, 0.0) + time.perf_counter() - inicio
+
+    def registrar_tokens(self, respuesta):
+        """Suma los tokens de usage_metadata de una respuesta de Gemini (si los trae)."""
+        registro = getattr(self._actual, 'registro', None)
+        uso = getattr(respuesta, 'usage_metadata', None)
+        if registro is None or uso is None:
+            return
+        registro['tokens_entrada'] += getattr(uso, 'prompt_token_count', 0) or 0
+        registro['tokens_salida'] += getattr(uso, 'candidates_token_count', 0) or 0
+
+    def registrar_respuesta(self, estado: str):
+        """Anota si el JSON de una respuesta de Gemini era válido, se ha reparado o es irrecuperable."""
+        registro = getattr(self._actual, 'registro', None)
+        if registro is not None:
+            registro['respuestas'][estado] += 1
+
+    def registrar_nivel(self, nivel: str, motivo: str = ''):
+        """Anota en qué nivel de la cascada se resolvió la evidencia y, si se escaló, por qué."""
+        registro = getattr(self._actual, 'registro', None)
+        if registro is not None:
+            registro['nivel'] = nivel
+            registro['motivo_escalado'] = motivo
+
+    def registrar_error(self, categoria: str):
+        registro = getattr(self._actual, 'registro', None)
+        if registro is not None:
+            registro['errores'].append(categoria)
+
+    def informe(self) -> Dict:
+        """Resumen de la ejecución: percentiles por etapa, throughput, tokens y errores."""
+        with self._lock:
+            duracion = (self._fin - self._inicio) if self._unidades else 0.0
+            evidencias = self._evidencias
+            etapas = {etapa: self._etapas[etapa].resumen() for etapa in ETAPAS + ['total'] if etapa in self._etapas}
+            respuestas = {estado: self._respuestas[estado] for estado in ESTADOS_RESPUESTA}
+            total_respuestas = sum(respuestas.values())
+            informe = {
+                'unidades': self._unidades,
+                'evidencias': evidencias,
+                'duracion_s': duracion,
+                'evidencias_por_minuto': evidencias / duracion * 60 if duracion > 0 else 0.0,
+                'etapas': etapas,
+                'tokens': {
+                    'entrada': self._tokens['entrada'],
+                    'salida': self._tokens['salida'],
+                    'salida_por_evidencia': self._tokens['salida'] / evidencias if evidencias else 0.0,
+                    'salida_por_evidencia_p50': self._salida_por_evidencia.percentil(50),
+                    'salida_por_evidencia_p95': self._salida_por_evidencia.percentil(95),
+                },
+                'respuestas': {
+                    **respuestas,
+                    'tasa_reparadas': respuestas['reparada'] / total_respuestas if total_respuestas else 0.0,
+                    'tasa_malformadas': respuestas['malformada'] / total_respuestas if total_respuestas else 0.0,
+                },
+                'errores': dict(self._errores),
+            }
+            if any(nivel.unidades for nivel in self._niveles.values()):
+                informe['cascada'] = self._informe_cascada()
+        return informe
+
+    def _informe_cascada(self) -> Dict:
+        """Evidencias resueltas en cada nivel de la cascada, su latencia y los motivos de escalado."""
+        con_nivel = sum(nivel.unidades for nivel in self._niveles.values())
+        niveles = {}
+        for nombre, nivel in self._niveles.items():
+            niveles[nombre] = {
+                'evidencias': nivel.evidencias,
+                'tasa': nivel.unidades / con_nivel,
+                'p50_s': nivel.totales.percentil(50),
+                'p95_s': nivel.totales.percentil(95),
+                'media_s': nivel.totales.media,
+                'tokens_salida_por_evidencia': nivel.tokens_salida / nivel.evidencias if nivel.evidencias else 0.0,
+            }
+        return {'niveles': niveles, 'motivos_escalado': dict(self._motivos)}
+
+    def guardar_informe(self, ruta_json: str) -> Dict:
+        """Guarda el resumen en JSON y cierra el CSV de detalle, si se abrió con abrir_detalle."""
+        informe = self.informe()
+        with open(ruta_json, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        self.cerrar_detalle()
+        logger.info(f"Informe de métricas guardado en {ruta_json}")
+        return informe
@@ -0,0 +1,93 @@
+'''
+Miniaturas de las evidencias para la interfaz de revisión.
+
+Las miniaturas se generan bajo demanda en WebP y se guardan en disco indexadas
+por el hash del fichero original y el ancho, así que solo se generan una vez y
+un cambio en el original produce una miniatura (y un ETag) nuevos. Los anchos
+pedidos se redondean al ancho permitido inmediatamente superior para no llenar
+la caché con tamaños arbitrarios. Las evidencias PDF se miniaturizan a partir
+de su primera página.
+'''
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from typing import Dict, Tuple
+
+from PIL import Image
+
+from preprocesado_imagenes import rasterizar_pdf
+
+logger = logging.getLogger(__name__)
+
+ANCHOS_POR_DEFECTO = (160, 320, 640, 1280)
+DIR_CACHE_POR_DEFECTO = '.cache/miniaturas'
+CALIDAD_WEBP = 80
+
+
+class GeneradorMiniaturas:
+    def __init__(self, dir_cache: str = DIR_CACHE_POR_DEFECTO, anchos=ANCHOS_POR_DEFECTO):
+        """
+        Args:
+            dir_cache: Carpeta donde se guardan las miniaturas generadas
+            anchos: Anchos permitidos en píxeles
+        """
+        self.dir_cache = dir_cache
+        self.anchos = tuple(sorted(anchos))
+        self._lock = threading.Lock()
+        # Hash del contenido por (ruta, mtime, tamaño) para no releer los originales en cada petición
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+
+    def ancho_permitido(self, ancho: int) -> int:
+        """Redondea al ancho permitido inmediatamente superior (o al mayor disponible)."""
+        for permitido in self.anchos:
+            if ancho <= permitido:
+                return permitido
+        return self.anchos[-1]
+
+    def _hash_original(self, ruta: str) -> str:
+        estado = os.stat(ruta)
+        clave = (ruta, estado.st_mtime_ns, estado.st_size)
+        with self._lock:
+            hash_original = self._hashes.get(clave)
+        if hash_original is None:
+            with open(ruta, 'rb') as f:
+                hash_original = hashlib.sha256(f.read()).hexdigest()
+            with self._lock:
+                self._hashes[clave] = hash_original
+        return hash_original
+
+    def obtener(self, ruta_original: str, ancho: int) -> Tuple[str, str]:
+        """
+        Devuelve la ruta de la miniatura (generándola si no existe) y su ETag.
+
+        Raises:
+            FileNotFoundError: Si el original no existe
+            ImportError: Si el original es un PDF y no está instalado pypdfium2
+        """
+        ancho = self.ancho_permitido(ancho)
+        etag = f"{self._hash_original(ruta_original)[:32]}-{ancho}"
+        ruta_miniatura = os.path.join(self.dir_cache, f"{etag}.webp")
+        if os.path.exists(ruta_miniatura):
+            return ruta_miniatura, etag
+
+        with open(ruta_original, 'rb') as f:
+            datos = f.read()
+        imagen = rasterizar_pdf(datos) if datos.startswith(b'%PDF') else Image.open(io.BytesIO(datos))
+        if imagen.mode not in ('RGB', 'RGBA', 'L'):
+            imagen = imagen.convert('RGBA')
+        if imagen.width > ancho:
+            imagen.thumbnail((ancho, ancho * imagen.height // imagen.width or 1), Image.Resampling.LANCZOS)
+        salida = io.BytesIO()
+        imagen.save(salida, format='WEBP', quality=CALIDAD_WEBP)
+
+        # Escritura atómica: otra petición simultánea nunca ve una miniatura a medias
+        os.makedirs(self.dir_cache, exist_ok=True)
+        ruta_temporal = f"{ruta_miniatura}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(ruta_temporal, 'wb') as f:
+            f.write(salida.getvalue())
+        os.replace(ruta_temporal, ruta_miniatura)
+        logger.info(f"Miniatura generada: {ruta_original} ({len(datos)} bytes) -> {ancho}px ({salida.tell()} bytes)")
+        return ruta_miniatura, etag
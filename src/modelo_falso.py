@@ -0,0 +1,120 @@
+'''
+Modelo falso que imita la interfaz de genai.GenerativeModel.
+
+Devuelve siempre una respuesta JSON fija tras una latencia artificial, de forma
+que el procesamiento de evidencias se puede probar y medir sin API key ni red.
+También puede simular errores 429 (cuota agotada), errores 503 (servicio sobrecargado)
+y respuestas con JSON inválido, cada uno con su probabilidad. Con una semilla fija la
+secuencia de latencias y errores es reproducible, lo que permite comparar benchmarks.
+
+Uso:
+    uv run python src/check_evidencias.py --backend falso --latencia-falsa 0.5 --workers 8
+'''
+
+import json
+import random
+import threading
+import time
+
+RESPUESTA_POR_DEFECTO = {
+    "nombre_encontrado": "Nombre Falso",
+    "fecha_encontrada": "15 de marzo de 2024",
+    "contenido_relevante": "Respuesta generada por el modelo falso",
+    "tareas_identificadas": ["Tarea simulada"],
+    "justificacion": "Respuesta generada por el modelo falso",
+}
+# Valores de los campos que un response_schema pide y la respuesta fija no tiene
+# (los numéricos, como la confianza del nivel rápido de la cascada, se sortean entre 0 y 1)
+VALORES_ESQUEMA = {
+    "actividad": "Tarea simulada",
+}
+
+
+class ErrorCuotaFalso(Exception):
+    """Imita google.api_core.exceptions.ResourceExhausted (HTTP 429)."""
+
+    code = 429
+
+
+class ErrorServidorFalso(Exception):
+    """Imita google.api_core.exceptions.ServiceUnavailable (HTTP 503)."""
+
+    code = 503
+
+
+class UsoFalso:
+    """Imita usage_metadata con un recuento aproximado de tokens (≈4 caracteres por token)."""
+
+    def __init__(self, tokens_entrada: int, tokens_salida: int):
+        self.prompt_token_count = tokens_entrada
+        self.candidates_token_count = tokens_salida
+        self.total_token_count = tokens_entrada + tokens_salida
+
+
+class RespuestaFalsa:
+    """Imita el objeto de respuesta de Gemini (atributos text y usage_metadata)."""
+
+    def __init__(self, text: str, usage_metadata: UsoFalso = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class ModeloFalso:
+    def __init__(self, latencia: float = 0.5, respuesta: dict = None, tasa_429: float = 0.0, semilla: int = None,
+                 tasa_error: float = 0.0, tasa_malformada: float = 0.0, variacion_latencia: float = 0.0):
+        """
+        Inicializa el modelo falso.
+
+        Args:
+            latencia: Segundos que tarda cada llamada a generate_content
+            respuesta: Diccionario a devolver como JSON (por defecto RESPUESTA_POR_DEFECTO)
+            tasa_429: Probabilidad (0-1) de que una llamada falle con un error de cuota
+            semilla: Semilla para que los errores simulados sean reproducibles
+            tasa_error: Probabilidad (0-1) de que una llamada falle con un error 503
+            tasa_malformada: Probabilidad (0-1) de que la respuesta no sea un JSON válido
+            variacion_latencia: Variación relativa (0-1) de la latencia alrededor del valor medio
+        """
+        self.latencia = latencia
+        self.respuesta = respuesta if respuesta is not None else RESPUESTA_POR_DEFECTO
+        self.tasa_429 = tasa_429
+        self.tasa_error = tasa_error
+        self.tasa_malformada = tasa_malformada
+        self.variacion_latencia = variacion_latencia
+        self.llamadas = 0
+        self._random = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, generation_config=None):
+        """
+        Simula una llamada a Gemini esperando la latencia configurada.
+
+        Si la petición incluye varias imágenes devuelve un array con una respuesta por imagen.
+        Con response_schema en generation_config solo devuelve los campos del esquema.
+        """
+        with self._lock:
+            self.llamadas += 1
+            sorteo = self._random.random()
+            sorteo_numeros = self._random.random()
+            latencia = self.latencia * (1 + self.variacion_latencia * self._random.uniform(-1, 1))
+        time.sleep(max(0.0, latencia))
+        if sorteo < self.tasa_429:
+            raise ErrorCuotaFalso("429 Resource has been exhausted (e.g. check quota).")
+        if sorteo < self.tasa_429 + self.tasa_error:
+            raise ErrorServidorFalso("503 The model is overloaded. Please try again later.")
+        imagenes = sum(1 for parte in contents if not isinstance(parte, str))
+        respuesta = self.respuesta
+        esquema = (generation_config or {}).get('response_schema') if isinstance(generation_config, dict) else None
+        if esquema:
+            campos = esquema.get('items', esquema).get('properties', {})
+            respuesta = {
+                campo: respuesta.get(campo, VALORES_ESQUEMA.get(campo, ''))
+                if definicion.get('type') != 'number' else round(sorteo_numeros, 2)
+                for campo, definicion in campos.items()
+            }
+        respuesta = [respuesta] * imagenes if imagenes > 1 else respuesta
+        texto = json.dumps(respuesta, ensure_ascii=False)
+        if sorteo < self.tasa_429 + self.tasa_error + self.tasa_malformada:
+            # Respuesta cortada a mitad, como cuando se agota max_output_tokens
+            texto = texto[:len(texto) // 2]
+        tokens_entrada = sum(len(parte) // 4 if isinstance(parte, str) else 258 for parte in contents)
+        return RespuestaFalsa(texto, UsoFalso(tokens_entrada, len(texto) // 4))
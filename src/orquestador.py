@@ -0,0 +1,310 @@
+'''
+Orquestador de validaciones de varios años o empresas a partir de un manifiesto.
+
+Cada dataset del manifiesto se valida en su propio proceso (ProcessPoolExecutor).
+Todos comparten:
+
+- un único presupuesto de ritmo: los limitadores de peticiones/tokens por minuto
+  viven en un proceso gestor (multiprocessing.managers) y todos los procesos
+  reservan turno en ellos, así que la suma nunca supera el límite de la cuenta
+- la caché de respuestas (SQLite en modo WAL) y la de imágenes preprocesadas,
+  de modo que una evidencia repetida entre datasets no se vuelve a enviar
+
+Durante la ejecución se muestra el progreso de cada dataset y al final un informe
+con duración, evidencias por minuto y porcentajes de validación de cada uno.
+
+Formato del manifiesto (JSON):
+    {
+        "rpm": 60,
+        "tpm": 1000000,
+        "opciones": {"workers": 4, "lote": 1, "max_dimension": 1600},
+        "datasets": [
+            {
+                "nombre": "2024",
+                "periodo": "2024",
+                "excel": "data/Control de evidencias 2024.xlsx",
+                "evidencias": "data/Evidencias 2024",
+                "entrada": "evidencias_2024.csv",
+                "salida": "resultados_validacion_2024.csv"
+            }
+        ]
+    }
+
+Si un dataset indica "excel" y "evidencias" se genera antes su CSV de entrada con
+crear_fichero_data; si no, se usa directamente "entrada". Las "opciones" de un
+dataset se combinan con las generales.
+
+Uso:
+    uv run python src/orquestador.py manifiesto.json --procesos 3
+'''
+
+import argparse
+import json
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing.managers import SyncManager
+from typing import Dict, List
+
+from cascada_modelos import DIMENSION_RAPIDA, MODELO_RAPIDO, UMBRAL_CONFIANZA
+from cliente_gemini import LimitadorTokens
+
+logger = logging.getLogger(__name__)
+
+# Opciones de validación admitidas en el manifiesto y sus valores por defecto
+OPCIONES_POR_DEFECTO = {
+    'backend': 'gemini',
+    'latencia_falsa': 0.5,
+    'workers': 4,
+    'lote': 1,
+    'lote_por_empleado': False,
+    'reintentos': 5,
+    'cache': True,
+    'cache_max_entradas': 10000,
+    'max_dimension': None,
+    'grises': False,
+    'formato_imagen': None,
+    'calidad_imagen': 85,
+    'prefiltro': False,
+    'dedup': 'exacto',
+    'salida_estructurada': False,
+    'presupuesto': {},
+    'cascada': False,
+    'modelo_rapido': MODELO_RAPIDO,
+    'dimension_rapida': DIMENSION_RAPIDA,
+    'umbral_confianza': UMBRAL_CONFIANZA,
+    'reanudar': False,
+}
+# Segundos entre actualizaciones del progreso
+INTERVALO_PROGRESO = 5.0
+
+
+class GestorRitmo(SyncManager):
+    """Proceso gestor que aloja los limitadores compartidos por todos los datasets."""
+
+
+GestorRitmo.register('LimitadorTokens', LimitadorTokens)
+
+
+def cargar_manifiesto(ruta: str) -> Dict:
+    """Lee el manifiesto y completa los valores por defecto de cada dataset."""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        manifiesto = json.load(f)
+    datasets = manifiesto.get('datasets') or []
+    if not datasets:
+        raise ValueError(f"El manifiesto {ruta} no contiene datasets")
+    opciones_generales = manifiesto.get('opciones', {})
+    desconocidas = set(opciones_generales) - set(OPCIONES_POR_DEFECTO)
+    nombres = set()
+    for dataset in datasets:
+        if 'periodo' not in dataset:
+            raise ValueError(f"Falta el periodo en el dataset {dataset}")
+        dataset.setdefault('nombre', str(dataset['periodo']))
+        if dataset['nombre'] in nombres:
+            raise ValueError(f"Nombre de dataset repetido en el manifiesto: {dataset['nombre']}")
+        nombres.add(dataset['nombre'])
+        nombre = dataset['nombre']
+        dataset.setdefault('entrada', f"evidencias_{nombre}.csv")
+        dataset.setdefault('salida', f"resultados_validacion_{nombre}.csv")
+        dataset.setdefault('informe', f"informe_validacion_{nombre}.json")
+        desconocidas |= set(dataset.get('opciones', {})) - set(OPCIONES_POR_DEFECTO)
+        dataset['opciones'] = {**OPCIONES_POR_DEFECTO, **opciones_generales, **dataset.get('opciones', {})}
+    if desconocidas:
+        raise ValueError(f"Opciones desconocidas en el manifiesto: {', '.join(sorted(desconocidas))}")
+    return manifiesto
+
+
+def crear_validador(opciones: Dict, periodo: str, limitadores: Dict = None):
+    """Crea el EvidenciaValidator configurado con las opciones de validación (ver OPCIONES_POR_DEFECTO)."""
+    # Importación diferida: cada proceso configura su propio logging al importar
+    from backends_modelo import crear_modelo
+    from cache_resultados import CacheResultados
+    from cascada_modelos import NivelRapido
+    from check_evidencias import EvidenciaValidator
+    from prefiltro_evidencias import PrefiltroEvidencias
+    from preprocesado_imagenes import PreprocesadorImagenes
+    from salida_estructurada import leer_presupuesto
+
+    limitadores = limitadores or {}
+    modelo = None
+    if opciones['backend'] != 'gemini':
+        modelo = crear_modelo(opciones['backend'], latencia=opciones['latencia_falsa'])
+    cache = CacheResultados(max_entradas=opciones['cache_max_entradas']) if opciones['cache'] else None
+    preprocesador = PreprocesadorImagenes(
+        max_dimension=opciones['max_dimension'],
+        escala_grises=opciones['grises'],
+        formato=opciones['formato_imagen'],
+        calidad=opciones['calidad_imagen']
+    )
+    opciones_cliente = {
+        'max_reintentos': opciones['reintentos'],
+        'limitador_peticiones': limitadores.get('peticiones'),
+        'limitador_tokens': limitadores.get('tokens'),
+    }
+    prefiltro = PrefiltroEvidencias(dedup=opciones['dedup']) if opciones['prefiltro'] else None
+    cascada = None
+    if opciones['cascada']:
+        # Con el backend falso, el nivel rápido tarda la mitad que el análisis completo
+        cascada = NivelRapido(
+            crear_modelo(opciones['backend'], latencia=opciones['latencia_falsa'] / 2)
+            if opciones['backend'] != 'gemini' else None,
+            nombre_modelo=opciones['modelo_rapido'],
+            preprocesador=PreprocesadorImagenes(max_dimension=opciones['dimension_rapida'], formato='JPEG'),
+            umbral_confianza=opciones['umbral_confianza']
+        )
+    presupuesto = leer_presupuesto(f"{campo}={valor}" for campo, valor in (opciones['presupuesto'] or {}).items())
+    return EvidenciaValidator(modelo, cache, preprocesador, opciones_cliente, prefiltro=prefiltro, periodo=periodo,
+                              salida_estructurada=opciones['salida_estructurada'], presupuesto=presupuesto,
+                              cascada=cascada)
+
+
+def _procesar_dataset(dataset: Dict, limitadores: Dict, progreso) -> Dict:
+    """Genera la entrada (si hace falta) y valida un dataset. Se ejecuta en un proceso del pool."""
+    from check_evidencias import ProcesadorEvidencias
+    from escritor_resultados import ResumenValidacion
+
+    nombre = dataset['nombre']
+    opciones = dataset['opciones']
+    inicio = time.monotonic()
+
+    if dataset.get('excel') and dataset.get('evidencias'):
+        from crear_fichero_data import HOJA_EXCEL, crear_fichero_data
+        progreso[nombre] = {'estado': 'preparando', 'hechas': 0, 'total': 0}
+        crear_fichero_data(dataset['excel'], dataset['evidencias'], dataset['entrada'],
+                           dataset.get('hoja', HOJA_EXCEL))
+
+    validator = crear_validador(opciones, dataset['periodo'], limitadores)
+
+    ultimo_aviso = [0.0]
+
+    def avisar(hechas: int, total: int, resultado: Dict):
+        # Se limita la frecuencia para no saturar el proceso gestor
+        ahora = time.monotonic()
+        if hechas == total or ahora - ultimo_aviso[0] >= 1.0:
+            ultimo_aviso[0] = ahora
+            progreso[nombre] = {'estado': 'validando', 'hechas': hechas, 'total': total,
+                                'segundos': ahora - inicio}
+
+    ProcesadorEvidencias(validator).procesar_csv(
+        dataset['entrada'],
+        dataset['salida'],
+        workers=opciones['workers'],
+        reanudar=opciones['reanudar'],
+        tamano_lote=opciones['lote'],
+        agrupar_por_empleado=opciones['lote_por_empleado'],
+        ruta_informe=dataset['informe'],
+        progreso=avisar
+    )
+    if validator.cache is not None:
+        validator.cache.cerrar()
+
+    resumen = ResumenValidacion()
+    resumen.anadir_csv(dataset['salida'])
+    informe = validator.metricas.informe()
+    duracion = time.monotonic() - inicio
+    return {
+        'nombre': nombre,
+        'periodo': dataset['periodo'],
+        'salida': dataset['salida'],
+        'evidencias': resumen.total,
+        'procesadas': informe['evidencias'],
+        'duracion_s': duracion,
+        'evidencias_por_minuto': informe['evidencias'] / duracion * 60 if duracion else 0.0,
+        'nombre_ok_pct': resumen.porcentaje('Nombre_ok'),
+        'periodo_ok_pct': resumen.porcentaje('Periodo_ok'),
+        'tarea_ok_pct': resumen.porcentaje('Tarea_ok'),
+        'errores': informe['errores'],
+        'cliente': validator.model.metricas(),
+    }
+
+
+def _mostrar_progreso(progreso: Dict):
+    for nombre, estado in sorted(progreso.items()):
+        if estado['estado'] != 'validando':
+            logger.info(f"[{nombre}] {estado['estado']}")
+            continue
+        total = estado['total'] or 1
+        velocidad = estado['hechas'] / estado['segundos'] * 60 if estado.get('segundos') else 0.0
+        logger.info(f"[{nombre}] {estado['hechas']}/{estado['total']} ({estado['hechas'] / total * 100:.0f}%), "
+                    f"{velocidad:.1f} evidencias/min")
+
+
+def orquestar(manifiesto: Dict, procesos: int = None, ruta_informe: str = None) -> List[Dict]:
+    """
+    Valida todos los datasets del manifiesto en paralelo bajo un mismo límite de ritmo.
+
+    Args:
+        manifiesto: Manifiesto ya cargado con cargar_manifiesto
+        procesos: Número de datasets procesados a la vez (por defecto, todos)
+        ruta_informe: JSON donde guardar el informe conjunto (None para no guardarlo)
+
+    Returns:
+        Lista con el informe de cada dataset, en el orden del manifiesto
+    """
+    datasets = manifiesto['datasets']
+    procesos = procesos or len(datasets)
+    resultados = {}
+    with GestorRitmo() as gestor:
+        limitadores = {}
+        if manifiesto.get('rpm'):
+            limitadores['peticiones'] = gestor.LimitadorTokens(manifiesto['rpm'])
+        if manifiesto.get('tpm'):
+            limitadores['tokens'] = gestor.LimitadorTokens(manifiesto['tpm'])
+        progreso = gestor.dict({d['nombre']: {'estado': 'en cola', 'hechas': 0, 'total': 0} for d in datasets})
+
+        logger.info(f"Orquestando {len(datasets)} datasets con {procesos} procesos "
+                    f"(rpm={manifiesto.get('rpm')}, tpm={manifiesto.get('tpm')})")
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+            futuros = {pool.submit(_procesar_dataset, dataset, limitadores, progreso): dataset['nombre']
+                       for dataset in datasets}
+            pendientes = set(futuros)
+            while pendientes:
+                terminados, pendientes = wait(pendientes, timeout=INTERVALO_PROGRESO, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    nombre = futuros[futuro]
+                    try:
+                        resultados[nombre] = futuro.result()
+                        progreso[nombre] = {'estado': 'terminado', 'hechas': 0, 'total': 0}
+                    except Exception as e:
+                        logger.error(f"[{nombre}] Error al validar el dataset: {str(e)}", exc_info=True)
+                        resultados[nombre] = {'nombre': nombre, 'error': str(e)}
+                        progreso[nombre] = {'estado': f"error: {str(e)}", 'hechas': 0, 'total': 0}
+                if pendientes:
+                    _mostrar_progreso(dict(progreso))
+
+    informe = [resultados[d['nombre']] for d in datasets]
+    _mostrar_informe(informe)
+    if ruta_informe:
+        with open(ruta_informe, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        logger.info(f"Informe de la orquestación guardado en {ruta_informe}")
+    return informe
+
+
+def _mostrar_informe(informe: List[Dict]):
+    lineas = [f"{'dataset':<16} {'evidencias':>10} {'tiempo (s)':>11} {'evid/min':>9} "
+              f"{'nombre %':>9} {'periodo %':>10} {'tarea %':>8}"]
+    for r in informe:
+        if 'error' in r:
+            lineas.append(f"{r['nombre']:<16} ERROR: {r['error']}")
+            continue
+        lineas.append(f"{r['nombre']:<16} {r['evidencias']:>10} {r['duracion_s']:>11.1f} "
+                      f"{r['evidencias_por_minuto']:>9.1f} {r['nombre_ok_pct']:>9.1f} "
+                      f"{r['periodo_ok_pct']:>10.1f} {r['tarea_ok_pct']:>8.1f}")
+    logger.info("Resumen por dataset:\n" + "\n".join(lineas))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Valida varios datasets de evidencias en paralelo')
+    parser.add_argument('manifiesto', help='Fichero JSON con los datasets a validar')
+    parser.add_argument('--procesos', type=int, help='Datasets procesados a la vez (por defecto, todos)')
+    parser.add_argument('--informe', default='informe_orquestador.json', help='JSON con el informe de cada dataset')
+    args = parser.parse_args()
+    orquestar(cargar_manifiesto(args.manifiesto), args.procesos, args.informe)
+
+
+if __name__ == '__main__':
+    main()
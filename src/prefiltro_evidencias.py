@@ -0,0 +1,189 @@
+'''
+Prefiltro local de evidencias antes de llamar a Gemini.
+
+Revisa cada evidencia con operaciones baratas y locales:
+
+- fichero inexistente o vacío en Ruta_Evidencia
+- imagen corrupta o que no se puede decodificar
+- imagen en blanco (un solo color, sin contenido que analizar) o diminuta
+
+Estas evidencias reciben directamente una fila de error sin gastar una petición.
+Además calcula una huella de cada imagen para detectar capturas repetidas en
+varias filas: la respuesta de Gemini a la primera se reutiliza en las demás (las
+reglas de nombre, periodo y tarea se vuelven a aplicar con los datos de cada fila).
+Se guardan como mucho MAX_RESPUESTAS respuestas, desalojando las menos usadas
+recientemente; con la caché de respuestas activa, un duplicado desalojado se
+resuelve igualmente sin llamar a la API.
+
+Modos de deduplicación:
+    exacto      -> SHA-256 de los píxeles decodificados: misma captura aunque el fichero
+                   se haya vuelto a guardar con otros metadatos o compresión sin pérdida
+    perceptual  -> dHash de 256 bits: también empareja recompresiones JPEG, pero dos
+                   capturas casi iguales con distinto texto pequeño podrían coincidir
+'''
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+from PIL import Image, ImageStat
+
+from preprocesado_imagenes import rasterizar_pdf
+
+logger = logging.getLogger(__name__)
+
+MODOS_DEDUP = ('exacto', 'perceptual', 'no')
+# Por debajo de esta desviación típica de grises la imagen se considera en blanco
+UMBRAL_BLANCO = 2.0
+TAMANO_MINIMO = 16
+LADO_DHASH = 16
+# Tiempo máximo esperando a que otra evidencia igual reciba su respuesta
+ESPERA_DUPLICADO = 300
+# Respuestas guardadas para reutilizar en capturas repetidas (LRU)
+MAX_RESPUESTAS = 10000
+
+
+class EvidenciaDescartada(Exception):
+    """La evidencia no se envía a Gemini porque el prefiltro ya sabe que no es válida."""
+
+    def __init__(self, motivo: str, ruta: str):
+        super().__init__(f"{motivo}: {ruta}")
+        self.motivo = motivo
+
+
+def dhash(imagen: Image.Image, lado: int = LADO_DHASH) -> str:
+    """Difference hash: compara cada píxel con su vecino en una miniatura en grises de (lado+1) x lado."""
+    miniatura = imagen.convert('L').resize((lado + 1, lado), Image.Resampling.LANCZOS)
+    pixeles = list(miniatura.getdata())
+    bits = 0
+    for fila in range(lado):
+        for columna in range(lado):
+            izquierda = pixeles[fila * (lado + 1) + columna]
+            bits = (bits << 1) | (izquierda > pixeles[fila * (lado + 1) + columna + 1])
+    return f"{bits:0{lado * lado // 4}x}"
+
+
+class PrefiltroEvidencias:
+    def __init__(self, dedup: str = 'exacto', umbral_blanco: float = UMBRAL_BLANCO,
+                 max_respuestas: int = MAX_RESPUESTAS):
+        """
+        Inicializa el prefiltro.
+
+        Args:
+            dedup: Cómo se detectan las capturas repetidas: 'exacto', 'perceptual' o 'no'
+            umbral_blanco: Desviación típica de grises por debajo de la cual la imagen está en blanco
+            max_respuestas: Respuestas guardadas para deduplicar antes de desalojar las más antiguas
+        """
+        if dedup not in MODOS_DEDUP:
+            raise ValueError(f"Modo de deduplicación no soportado: {dedup}")
+        self.dedup = dedup
+        self.umbral_blanco = umbral_blanco
+        self._lock = threading.Lock()
+        self.max_respuestas = max_respuestas
+        self._respuestas: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._en_curso: Dict[str, threading.Event] = {}
+        self._contadores = Counter()
+
+    def revisar(self, ruta_imagen) -> Optional[str]:
+        """
+        Comprueba la evidencia y devuelve su huella para deduplicar (None si no se deduplica).
+
+        Raises:
+            EvidenciaDescartada: si el fichero falta, está vacío, corrupto o en blanco
+        """
+        with self._lock:
+            self._contadores['revisadas'] += 1
+        if not isinstance(ruta_imagen, str) or not ruta_imagen.strip():
+            self._descartar('Sin ruta de evidencia', str(ruta_imagen))
+        if not os.path.isfile(ruta_imagen):
+            self._descartar('Fichero no encontrado', ruta_imagen)
+        with open(ruta_imagen, 'rb') as f:
+            datos = f.read()
+        if not datos:
+            self._descartar('Fichero vacío', ruta_imagen)
+
+        try:
+            if datos.startswith(b'%PDF'):
+                imagen = rasterizar_pdf(datos)
+            else:
+                imagen = Image.open(io.BytesIO(datos))
+                imagen.load()
+        except ImportError:
+            # Sin pypdfium2 el PDF no se puede revisar aquí (rasterizar_pdf ya lo avisa); se deja pasar
+            return None
+        except Exception as e:
+            logger.debug(f"Imagen no decodificable {ruta_imagen}: {str(e)}")
+            self._descartar('Imagen corrupta o ilegible', ruta_imagen)
+
+        if min(imagen.size) < TAMANO_MINIMO:
+            self._descartar('Imagen demasiado pequeña', ruta_imagen)
+        grises = imagen.convert('L')
+        grises.thumbnail((256, 256))
+        if ImageStat.Stat(grises).stddev[0] < self.umbral_blanco:
+            self._descartar('Imagen en blanco', ruta_imagen)
+
+        if self.dedup == 'exacto':
+            rgb = imagen.convert('RGB')
+            return hashlib.sha256(repr(rgb.size).encode('utf-8') + rgb.tobytes()).hexdigest()
+        if self.dedup == 'perceptual':
+            return dhash(imagen)
+        return None
+
+    def _descartar(self, motivo: str, ruta: str):
+        with self._lock:
+            self._contadores['descartadas'] += 1
+            self._contadores[f"descartadas_{motivo}"] += 1
+        raise EvidenciaDescartada(motivo, ruta)
+
+    def respuesta_duplicada(self, huella: Optional[str], esperar: bool = True) -> Optional[Dict]:
+        """
+        Devuelve la respuesta ya obtenida para una captura igual, o None si hay que llamar a la API.
+
+        Si otra evidencia con la misma huella está esperando su respuesta y esperar es True,
+        se espera a que termine en lugar de repetir la llamada. Quien recibe None con una
+        huella nueva queda como responsable de llamar a publicar() después.
+        """
+        if huella is None:
+            return None
+        with self._lock:
+            if huella in self._respuestas:
+                self._contadores['llamadas_evitadas'] += 1
+                self._respuestas.move_to_end(huella)
+                return self._respuestas[huella]
+            evento = self._en_curso.get(huella)
+            if evento is None:
+                if esperar:
+                    self._en_curso[huella] = threading.Event()
+                return None
+        if not esperar:
+            return None
+        evento.wait(ESPERA_DUPLICADO)
+        with self._lock:
+            respuesta = self._respuestas.get(huella)
+            if respuesta is not None:
+                self._contadores['llamadas_evitadas'] += 1
+            return respuesta
+
+    def publicar(self, huella: Optional[str], respuesta: Optional[Dict]):
+        """Guarda la respuesta de una huella (None si la llamada falló) y libera a quien la esperaba."""
+        if huella is None:
+            return
+        with self._lock:
+            if respuesta is not None:
+                self._respuestas[huella] = respuesta
+                self._respuestas.move_to_end(huella)
+                while len(self._respuestas) > self.max_respuestas:
+                    self._respuestas.popitem(last=False)
+                    self._contadores['respuestas_desalojadas'] += 1
+            evento = self._en_curso.pop(huella, None)
+        if evento is not None:
+            evento.set()
+
+    def resumen(self) -> Dict:
+        """Contadores de evidencias revisadas, descartadas por motivo y llamadas evitadas."""
+        with self._lock:
+            return dict(self._contadores)
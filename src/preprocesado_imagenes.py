@@ -0,0 +1,265 @@
+'''
+Preprocesado de las imágenes de evidencia antes de enviarlas a Gemini.
+
+Las capturas de JIRA o de commits suelen ser grandes y se subían a resolución
+completa en cada petición. Este módulo permite:
+
+- reducir la imagen a una dimensión máxima
+- convertirla a escala de grises
+- recodificarla en JPEG o WebP con una calidad configurable
+- rasterizar la primera página de las evidencias PDF
+
+Sin transformaciones, solo los PNG, JPEG y WebP se envían tal cual; el resto de
+formatos que abre PIL (BMP, GIF, TIFF...) no los admite Gemini y se recodifican
+en PNG, sin pérdida.
+
+Las imágenes preprocesadas se guardan en disco indexadas por el hash del
+original y la configuración, así que solo se procesan una vez. La carpeta tiene
+un tamaño máximo: al superarlo se borran las imágenes usadas hace más tiempo.
+Para cada imagen se registran los bytes antes/después y el tiempo de cada etapa.
+'''
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DIR_CACHE_POR_DEFECTO = '.cache/imagenes'
+FORMATOS = {'JPEG': ('image/jpeg', 'jpg'), 'WEBP': ('image/webp', 'webp'), 'PNG': ('image/png', 'png')}
+# Formatos que se envían sin recodificar cuando no se pide ninguna transformación
+FORMATOS_DIRECTOS = {'PNG', 'JPEG', 'WEBP'}
+# Formato en el que se recodifica el resto cuando no se pide ninguna transformación
+FORMATO_SIN_PERDIDA = 'PNG'
+DPI_PDF = 150
+# Tamaño máximo de la caché de imágenes preprocesadas en disco
+MAX_BYTES_CACHE = 500 * 1024 * 1024
+# Al superar el máximo se desaloja hasta esta fracción, para no recorrer la carpeta en cada escritura
+FRACCION_TRAS_DESALOJO = 0.9
+
+_aviso_sin_pypdfium2 = False
+
+
+def rasterizar_pdf(datos: bytes) -> Image.Image:
+    """Devuelve la primera página del PDF como imagen."""
+    global _aviso_sin_pypdfium2
+    try:
+        import pypdfium2 as pdfium
+    except ImportError as e:
+        # Se avisa una sola vez por proceso, no en cada evidencia PDF
+        if not _aviso_sin_pypdfium2:
+            _aviso_sin_pypdfium2 = True
+            logger.warning("Hay evidencias PDF pero pypdfium2 no está instalado: no se pueden rasterizar "
+                           "ni revisar con el prefiltro (pip install '.[pdf]')")
+        raise ImportError("Para procesar evidencias PDF hay que instalar pypdfium2 (pip install pypdfium2)") from e
+    pdf = pdfium.PdfDocument(datos)
+    try:
+        return pdf[0].render(scale=DPI_PDF / 72).to_pil()
+    finally:
+        pdf.close()
+
+
+class ImagenPreparada:
+    """Imagen lista para enviar a Gemini junto con sus estadísticas de preprocesado."""
+
+    def __init__(self, datos: bytes, mime_type: str, estadisticas: Dict):
+        self.datos = datos
+        self.mime_type = mime_type
+        self.hash = hashlib.sha256(datos).hexdigest()
+        self.estadisticas = estadisticas
+
+    def como_parte(self) -> Dict:
+        """Devuelve la imagen como blob para generate_content (se envían estos bytes tal cual)."""
+        return {'mime_type': self.mime_type, 'data': self.datos}
+
+
+class PreprocesadorImagenes:
+    def __init__(self, max_dimension: int = None, escala_grises: bool = False, formato: str = None,
+                 calidad: int = 85, dir_cache: str = DIR_CACHE_POR_DEFECTO, max_bytes_cache: int = MAX_BYTES_CACHE):
+        """
+        Inicializa el preprocesador.
+
+        Sin parámetros las imágenes PNG, JPEG y WebP se envían sin modificar; los PDF
+        siempre se rasterizan y el resto de formatos se recodifican en PNG.
+
+        Args:
+            max_dimension: Tamaño máximo en píxeles del lado mayor (None para no reducir)
+            escala_grises: Convertir la imagen a escala de grises
+            formato: Formato de recodificación: JPEG, WEBP o PNG (por defecto JPEG si hay que recodificar)
+            calidad: Calidad de compresión para JPEG/WebP (1-100)
+            dir_cache: Carpeta donde se guardan las imágenes ya preprocesadas
+            max_bytes_cache: Tamaño máximo de esa carpeta; al superarlo se borran las menos usadas
+        """
+        if formato is not None and formato.upper() not in FORMATOS:
+            raise ValueError(f"Formato de imagen no soportado: {formato}")
+        self.max_dimension = max_dimension
+        self.escala_grises = escala_grises
+        self.transformar = bool(max_dimension or escala_grises or formato)
+        self.formato = (formato or 'JPEG').upper()
+        self.calidad = calidad
+        self.dir_cache = dir_cache
+        self.max_bytes_cache = max_bytes_cache
+        self._lock = threading.Lock()
+        # Bytes ocupados por la caché según este proceso (None hasta la primera escritura)
+        self._bytes_cache = None
+        self._lock_cache = threading.Lock()
+        self._totales = {'imagenes': 0, 'desde_cache': 0, 'bytes_originales': 0, 'bytes_finales': 0, 'tiempos': {}}
+
+    def _firma(self, formato: str) -> str:
+        """Identifica la configuración para que un cambio de parámetros invalide la caché."""
+        return json.dumps([self.max_dimension, self.escala_grises, formato, self.calidad, DPI_PDF])
+
+    def _ruta_cache(self, hash_original: str, formato: str) -> str:
+        clave = hashlib.sha256((hash_original + self._firma(formato)).encode('utf-8')).hexdigest()
+        return os.path.join(self.dir_cache, f"{clave}.{FORMATOS[formato][1]}")
+
+    def preparar(self, ruta_imagen: str) -> ImagenPreparada:
+        """Lee la evidencia y devuelve la imagen que se enviará a Gemini."""
+        tiempos = {}
+        inicio = time.perf_counter()
+        with open(ruta_imagen, 'rb') as f:
+            original = f.read()
+        tiempos['lectura'] = time.perf_counter() - inicio
+        es_pdf = original.startswith(b'%PDF')
+
+        formato = self.formato
+        if not self.transformar and not es_pdf:
+            # Se envía el fichero original si Gemini admite su formato; abrirlo valida que es
+            # una imagen y da su tipo MIME
+            inicio = time.perf_counter()
+            imagen = Image.open(io.BytesIO(original))
+            tiempos['decodificacion'] = time.perf_counter() - inicio
+            if imagen.format in FORMATOS_DIRECTOS:
+                return self._registrar(ImagenPreparada(original, imagen.get_format_mimetype(), {}),
+                                       len(original), tiempos, False)
+            formato = FORMATO_SIN_PERDIDA
+
+        mime_type = FORMATOS[formato][0]
+        inicio = time.perf_counter()
+        ruta_cache = self._ruta_cache(hashlib.sha256(original).hexdigest(), formato)
+        if os.path.exists(ruta_cache):
+            with open(ruta_cache, 'rb') as f:
+                datos = f.read()
+            self._marcar_uso(ruta_cache)
+            tiempos['cache'] = time.perf_counter() - inicio
+            return self._registrar(ImagenPreparada(datos, mime_type, {}), len(original), tiempos, True)
+
+        inicio = time.perf_counter()
+        if es_pdf:
+            imagen = rasterizar_pdf(original)
+            tiempos['rasterizado'] = time.perf_counter() - inicio
+        else:
+            imagen = Image.open(io.BytesIO(original))
+            imagen.load()
+            tiempos['decodificacion'] = time.perf_counter() - inicio
+
+        if self.max_dimension and max(imagen.size) > self.max_dimension:
+            inicio = time.perf_counter()
+            imagen.thumbnail((self.max_dimension, self.max_dimension), Image.Resampling.LANCZOS)
+            tiempos['redimension'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        if self.escala_grises:
+            imagen = imagen.convert('L')
+        elif imagen.mode not in ('RGB', 'L'):
+            # JPEG no admite transparencia: se aplana sobre fondo blanco
+            fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+            rgba = imagen.convert('RGBA')
+            fondo.paste(rgba, mask=rgba.split()[-1])
+            imagen = fondo
+        salida = io.BytesIO()
+        imagen.save(salida, format=formato, quality=self.calidad, optimize=True)
+        datos = salida.getvalue()
+        tiempos['codificacion'] = time.perf_counter() - inicio
+
+        # Escritura atómica para que otros workers (o procesos) nunca lean un fichero a medias
+        os.makedirs(self.dir_cache, exist_ok=True)
+        ruta_temporal = f"{ruta_cache}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(ruta_temporal, 'wb') as f:
+            f.write(datos)
+        os.replace(ruta_temporal, ruta_cache)
+        self._anotar_en_cache(len(datos))
+
+        return self._registrar(ImagenPreparada(datos, mime_type, {}), len(original), tiempos, False)
+
+    @staticmethod
+    def _marcar_uso(ruta_cache: str):
+        """Actualiza la fecha de modificación, que decide el orden de desalojo."""
+        try:
+            os.utime(ruta_cache)
+        except OSError:
+            # Otro proceso la ha desalojado mientras tanto; ya se ha leído
+            pass
+
+    def _ficheros_cache(self):
+        """(fecha de modificación, tamaño, ruta) de cada imagen de la caché."""
+        ficheros = []
+        with os.scandir(self.dir_cache) as entradas:
+            for entrada in entradas:
+                if not entrada.is_file() or entrada.name.endswith('.tmp'):
+                    continue
+                try:
+                    estado = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                ficheros.append((estado.st_mtime, estado.st_size, entrada.path))
+        return ficheros
+
+    def _anotar_en_cache(self, tamano: int):
+        """Suma una imagen nueva a la caché y desaloja las menos usadas si se supera el máximo."""
+        with self._lock_cache:
+            if self._bytes_cache is None:
+                # Primera escritura: la carpeta puede venir de ejecuciones anteriores
+                self._bytes_cache = sum(fichero[1] for fichero in self._ficheros_cache())
+            else:
+                self._bytes_cache += tamano
+            if self._bytes_cache <= self.max_bytes_cache:
+                return
+            # Se vuelve a medir: otros procesos pueden haber escrito o desalojado en la misma carpeta
+            ficheros = sorted(self._ficheros_cache())
+            total = sum(fichero[1] for fichero in ficheros)
+            objetivo = self.max_bytes_cache * FRACCION_TRAS_DESALOJO
+            desalojadas = 0
+            for _, tamano_fichero, ruta in ficheros:
+                if total <= objetivo:
+                    break
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+                total -= tamano_fichero
+                desalojadas += 1
+            self._bytes_cache = total
+            logger.info(f"Caché de imágenes: desalojadas {desalojadas} imágenes, quedan {total} bytes")
+
+    def _registrar(self, imagen: ImagenPreparada, bytes_originales: int, tiempos: Dict, desde_cache: bool) -> ImagenPreparada:
+        imagen.estadisticas = {
+            'bytes_originales': bytes_originales,
+            'bytes_finales': len(imagen.datos),
+            'desde_cache': desde_cache,
+            'tiempos': tiempos,
+        }
+        logger.debug(f"Imagen preprocesada: {bytes_originales} -> {len(imagen.datos)} bytes, tiempos: {tiempos}")
+        with self._lock:
+            self._totales['imagenes'] += 1
+            self._totales['desde_cache'] += int(desde_cache)
+            self._totales['bytes_originales'] += bytes_originales
+            self._totales['bytes_finales'] += len(imagen.datos)
+            for etapa, segundos in tiempos.items():
+                self._totales['tiempos'][etapa] = self._totales['tiempos'].get(etapa, 0.0) + segundos
+        return imagen
+
+    def resumen(self) -> Dict:
+        """Devuelve los totales de bytes y tiempo por etapa de todas las imágenes preparadas."""
+        with self._lock:
+            totales = dict(self._totales, tiempos=dict(self._totales['tiempos']))
+        if totales['bytes_originales']:
+            totales['reduccion'] = 1 - totales['bytes_finales'] / totales['bytes_originales']
+        return totales
@@ -0,0 +1,337 @@
+'''
+Reglas de validación de nombre, periodo y tarea a partir de lo que extrae Gemini.
+
+Las reglas se aplican en local, así que se pueden cambiar y volver a aplicar sobre
+un CSV de resultados existente sin repetir ninguna llamada a la API:
+
+- nombre: se compara sin tildes, mayúsculas ni signos ("luis.portillo" equivale a
+  "Luis Portillo") contra todos los nombres con los que aparece el ID_Empleado en el
+  CSV de evidencias (índice de alias: "Joel López" y "Joel Urraco" son el mismo
+  empleado 103). Con coincidencia parcial también vale que un nombre contenga al otro
+  completo, con al menos nombre y apellido ("Gabriel Barbarin Gorostegui")
+- periodo: se buscan fechas con meses en español, completos o abreviados ("14 de
+  febrero de 2024", "14 feb. 2024", "febrero de 2024") y numéricas ("14/02/2024",
+  "14-02-24", "2024-02-14"); el periodo es válido si alguna es del año a validar
+- tarea: válida si Gemini identificó alguna tarea
+
+El periodo se puntúa a partir de Fecha_respuesta, la fecha tal como la devolvió Gemini;
+Fecha_encontrada es solo la fecha del periodo que se reconoció en ella, así que se puede
+recalcular con otro año o con otras reglas de fechas sin perder el texto original. En
+un CSV anterior sin Fecha_respuesta, esta se rellena con la Fecha_encontrada guardada.
+
+Al recalcular se sobrescriben Nombre_ok, Periodo_ok y Tarea_ok, así que se aplica a la
+salida de check_evidencias (resultados_validacion.csv) y no a los resultados ya revisados
+a mano, donde se perderían las correcciones del revisor. El resultado se escribe en el
+CSV que se indique con --salida; si es el mismo de entrada, antes se guarda una copia
+(resultados_validacion.csv.<fecha>.bak).
+
+Uso:
+    uv run python src/reglas_validacion.py resultados_validacion.csv --evidencias evidencias_2024.csv \
+        --salida resultados_recalculados.csv
+    uv run python src/reglas_validacion.py resultados_validacion.csv --simular
+'''
+
+import argparse
+import datetime
+import logging
+import os
+import re
+import shutil
+import time
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MESES = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6, 'julio': 7,
+    'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12,
+    'ene': 1, 'feb': 2, 'mar': 3, 'abr': 4, 'may': 5, 'jun': 6, 'jul': 7,
+    'ago': 8, 'sep': 9, 'sept': 9, 'set': 9, 'oct': 10, 'nov': 11, 'dic': 12,
+}
+# Nombres más largos primero para que "septiembre" no se quede en "sep"
+_ALTERNATIVAS_MES = '|'.join(sorted(MESES, key=len, reverse=True))
+PATRON_FECHA = re.compile(
+    rf'''
+    \b(?:(?P<dia>\d{{1,2}})(?:\s+de)?\s+)?(?P<mes>{_ALTERNATIVAS_MES})\.?(?:\s+de|,)?\s+(?P<anio>\d{{4}})\b
+    | \b(?P<dia_n>\d{{1,2}})(?P<sep>[/.-])(?P<mes_n>\d{{1,2}})(?P=sep)(?P<anio_n>\d{{4}}|\d{{2}})\b
+    | \b(?P<anio_iso>\d{{4}})(?P<sep_iso>[/-])(?P<mes_iso>\d{{1,2}})(?P=sep_iso)(?P<dia_iso>\d{{1,2}})\b
+    ''',
+    re.IGNORECASE | re.VERBOSE
+)
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+# Valores que Gemini devuelve cuando no hay nombre en la imagen
+SIN_NOMBRE = 'No se encontró nombre'
+# Tokens mínimos (nombre y apellido) para aceptar que un nombre contenga al otro
+MIN_TOKENS_PARCIAL = 2
+COLUMNAS_REGLAS = ['Nombre_ok', 'Periodo_ok', 'Tarea_ok', 'Fecha_encontrada']
+
+
+class Fecha(NamedTuple):
+    texto: str
+    anio: int
+    mes: int
+    dia: Optional[int]
+
+
+@lru_cache(maxsize=65536)
+def normalizar_nombre(nombre: str) -> str:
+    """Quita tildes, mayúsculas y signos y deja las palabras separadas por un espacio."""
+    if not isinstance(nombre, str):
+        return ''
+    sin_tildes = unicodedata.normalize('NFKD', nombre).encode('ASCII', 'ignore').decode('ASCII').lower()
+    return _NO_ALFANUMERICO.sub(' ', sin_tildes).strip()
+
+
+def extraer_fechas(texto: str) -> List[Fecha]:
+    """Fechas válidas que aparecen en el texto, en orden de aparición."""
+    if not isinstance(texto, str) or not texto:
+        return []
+    fechas = []
+    for m in PATRON_FECHA.finditer(texto):
+        if m.group('mes'):
+            anio, mes, dia = int(m.group('anio')), MESES[m.group('mes').lower()], m.group('dia')
+        elif m.group('mes_n'):
+            anio, mes, dia = int(m.group('anio_n')), int(m.group('mes_n')), m.group('dia_n')
+            if anio < 100:
+                anio += 2000
+        else:
+            anio, mes, dia = int(m.group('anio_iso')), int(m.group('mes_iso')), m.group('dia_iso')
+        dia = int(dia) if dia else None
+        try:
+            datetime.date(anio, mes, dia or 1)
+        except ValueError:
+            continue
+        fechas.append(Fecha(m.group(0), anio, mes, dia))
+    return fechas
+
+
+class IndiceAlias:
+    """Nombres normalizados con los que aparece cada ID_Empleado en el CSV de evidencias."""
+
+    def __init__(self, alias: Dict[str, Set[str]] = None):
+        self._alias: Dict[str, Set[str]] = alias or {}
+
+    @classmethod
+    def desde_filas(cls, filas: Iterable) -> 'IndiceAlias':
+        """Construye el índice a partir de pares (ID_Empleado, Nombre_Empleado)."""
+        alias = defaultdict(set)
+        for id_empleado, nombre in filas:
+            normalizado = normalizar_nombre(nombre)
+            if normalizado and not pd.isna(id_empleado):
+                alias[_clave_id(id_empleado)].add(normalizado)
+        return cls(dict(alias))
+
+    @classmethod
+    def desde_csv(cls, ruta_csv: str, tamano_bloque: int = 10000) -> 'IndiceAlias':
+        """Lee solo las columnas de empleado del CSV de evidencias, por bloques."""
+        bloques = pd.read_csv(ruta_csv, usecols=['ID_Empleado', 'Nombre_Empleado'], dtype=str,
+                              chunksize=tamano_bloque, encoding='utf-8')
+        pares = (par for bloque in bloques for par in bloque.itertuples(index=False, name=None))
+        indice = cls.desde_filas(pares)
+        logger.info(f"Índice de alias: {len(indice)} empleados, {indice.con_varios_nombres()} con varios nombres")
+        return indice
+
+    def nombres(self, id_empleado) -> Set[str]:
+        if id_empleado is None or pd.isna(id_empleado):
+            return set()
+        return self._alias.get(_clave_id(id_empleado), set())
+
+    def con_varios_nombres(self) -> int:
+        return sum(1 for nombres in self._alias.values() if len(nombres) > 1)
+
+    def __len__(self) -> int:
+        return len(self._alias)
+
+
+def _clave_id(id_empleado) -> str:
+    # El CSV puede traer el ID como 103, 103.0 o "103"
+    texto = str(id_empleado).strip()
+    return texto[:-2] if texto.endswith('.0') else texto
+
+
+class ReglasValidacion:
+    def __init__(self, periodo: str, alias: IndiceAlias = None, coincidencia_parcial: bool = True):
+        """
+        Inicializa las reglas.
+
+        Args:
+            periodo: Año que deben acreditar las evidencias
+            alias: Índice de nombres por ID_Empleado (None para comparar solo con Nombre_Empleado)
+            coincidencia_parcial: Aceptar que un nombre contenga al otro (nombre y apellido como mínimo)
+        """
+        self.periodo = str(periodo)
+        self.alias = alias or IndiceAlias()
+        self.coincidencia_parcial = coincidencia_parcial
+
+    def nombre_ok(self, nombre_a_validar: str, nombre_encontrado: str, id_empleado=None) -> int:
+        encontrado = normalizar_nombre(nombre_encontrado)
+        if not encontrado:
+            return 0
+        candidatos = self.alias.nombres(id_empleado) | {normalizar_nombre(nombre_a_validar)}
+        candidatos.discard('')
+        if encontrado in candidatos:
+            return 1
+        if self.coincidencia_parcial:
+            tokens = set(encontrado.split())
+            for candidato in candidatos:
+                tokens_candidato = set(candidato.split())
+                menor = min(len(tokens), len(tokens_candidato))
+                if menor >= MIN_TOKENS_PARCIAL and (tokens_candidato <= tokens or tokens <= tokens_candidato):
+                    return 1
+        return 0
+
+    def fecha_del_periodo(self, texto: str) -> str:
+        """Última fecha del texto que cae en el periodo ('' si no hay ninguna)."""
+        anio = int(self.periodo)
+        fechas = [fecha for fecha in extraer_fechas(texto) if fecha.anio == anio]
+        return fechas[-1].texto if fechas else ''
+
+    @staticmethod
+    def tarea_ok(tareas) -> int:
+        return 1 if tareas else 0
+
+    def aplicar(self, datos: Dict, datos_empleado: Dict) -> Dict:
+        """Aplica las reglas a los datos extraídos por Gemini y devuelve la fila de resultados."""
+        nombre_a_validar = datos_empleado['Nombre_Empleado']
+        nombre_encontrado = datos.get('nombre_encontrado', SIN_NOMBRE)
+        fecha_respuesta = datos.get('fecha_encontrada') or ''
+        fecha_encontrada = self.fecha_del_periodo(fecha_respuesta)
+        tareas_encontradas = datos.get('tareas_identificadas', [])
+        tareas_encontradas_str = ', '.join(tareas_encontradas) if isinstance(tareas_encontradas, list) else tareas_encontradas
+
+        return {
+            "Nombre_ok": self.nombre_ok(nombre_a_validar, nombre_encontrado, datos_empleado.get('ID_Empleado')),
+            "Periodo_ok": 1 if fecha_encontrada else 0,
+            "Tarea_ok": self.tarea_ok(tareas_encontradas),
+            "Nombre_a_validar": nombre_a_validar,
+            "Nombre_encontrado": nombre_encontrado,
+            "Periodo_a_validar": self.periodo,
+            "Fecha_encontrada": fecha_encontrada,
+            "Tarea_a_validar": datos_empleado['Nombre_Subproyecto'],
+            "Tareas_encontradas": tareas_encontradas_str,
+            "Justificacion": datos.get('justificacion', 'No se pudo justificar'),
+            "Link_imagen": datos_empleado.get('Ruta_Evidencia', ''),
+            "Fecha_respuesta": fecha_respuesta,
+        }
+
+    def recalcular(self, resultados: pd.DataFrame, ids_empleado: pd.Series = None) -> pd.DataFrame:
+        """
+        Vuelve a puntuar un DataFrame de resultados (columnas como texto) sin llamar a la API.
+
+        Cada regla se evalúa una sola vez por combinación distinta de valores y se
+        reparte a todas las filas con map, así que el coste depende de los valores
+        distintos y no del número de filas. Las filas de error se dejan como están.
+
+        Periodo_ok y Fecha_encontrada salen de Fecha_respuesta (la fecha original de
+        Gemini), que no se modifica. Si falta, como en los CSV anteriores a esa
+        columna, se rellena con la Fecha_encontrada guardada antes de recalcular.
+
+        Args:
+            resultados: CSV de resultados leído con dtype=str
+            ids_empleado: ID_Empleado de cada fila (mismo índice), para usar los alias
+
+        Returns:
+            Copia del DataFrame con Nombre_ok, Periodo_ok, Tarea_ok y Fecha_encontrada recalculados
+        """
+        nuevos = resultados.copy()
+        validas = (nuevos['Nombre_encontrado'] != 'Error') & (nuevos['Link_imagen'] != '')
+        if 'Fecha_respuesta' not in nuevos:
+            nuevos['Fecha_respuesta'] = ''
+        sin_respuesta = (nuevos['Fecha_respuesta'] == '') & (nuevos['Fecha_encontrada'] != '')
+        nuevos.loc[sin_respuesta, 'Fecha_respuesta'] = nuevos.loc[sin_respuesta, 'Fecha_encontrada']
+        ids = ids_empleado if ids_empleado is not None else pd.Series('', index=nuevos.index)
+        ids = ids.fillna('').astype(str)
+
+        claves_nombre = pd.Series(list(zip(ids, nuevos['Nombre_a_validar'], nuevos['Nombre_encontrado'])),
+                                  index=nuevos.index)
+        nombre_ok = {clave: self.nombre_ok(clave[1], clave[2], clave[0] or None) for clave in set(claves_nombre[validas])}
+        fechas = {texto: self.fecha_del_periodo(texto) for texto in nuevos.loc[validas, 'Fecha_respuesta'].unique()}
+
+        nuevos.loc[validas, 'Nombre_ok'] = claves_nombre[validas].map(nombre_ok).astype(str)
+        nuevos.loc[validas, 'Fecha_encontrada'] = nuevos.loc[validas, 'Fecha_respuesta'].map(fechas)
+        nuevos.loc[validas, 'Periodo_ok'] = (nuevos.loc[validas, 'Fecha_encontrada'] != '').astype(int).astype(str)
+        nuevos.loc[validas, 'Tarea_ok'] = (nuevos.loc[validas, 'Tareas_encontradas'] != '').astype(int).astype(str)
+        return nuevos
+
+
+def recalcular_csv(ruta_resultados: str, ruta_evidencias: str = None, periodo: str = '2024',
+                   ruta_salida: str = None, coincidencia_parcial: bool = True, simular: bool = False) -> Dict:
+    """
+    Aplica las reglas actuales a un CSV de resultados ya generado.
+
+    Args:
+        ruta_resultados: CSV de resultados de check_evidencias
+        ruta_evidencias: CSV de evidencias de entrada, para el índice de alias (opcional)
+        periodo: Año que deben acreditar las evidencias
+        ruta_salida: Dónde guardar el CSV recalculado (obligatoria salvo al simular). Si
+            es el mismo fichero de entrada, antes se copia a <ruta>.<fecha>.bak
+        coincidencia_parcial: Ver ReglasValidacion
+        simular: Solo contar los cambios, sin escribir nada
+
+    Returns:
+        Filas cambiadas por columna, total de filas, segundos empleados y la copia de
+        seguridad del CSV de entrada, si se ha hecho
+
+    Raises:
+        ValueError: Si no se indica ruta_salida y no es una simulación
+    """
+    if not simular and not ruta_salida:
+        raise ValueError("Indica el CSV de salida: el de entrada no se sobrescribe sin copia de seguridad")
+    inicio = time.perf_counter()
+    resultados = pd.read_csv(ruta_resultados, dtype=str, keep_default_na=False, encoding='utf-8')
+    alias = None
+    ids_empleado = None
+    if ruta_evidencias:
+        evidencias = pd.read_csv(ruta_evidencias, usecols=['ID_Empleado', 'Nombre_Empleado', 'Ruta_Evidencia'],
+                                 dtype=str, keep_default_na=False, encoding='utf-8')
+        alias = IndiceAlias.desde_filas(evidencias[['ID_Empleado', 'Nombre_Empleado']].itertuples(index=False, name=None))
+        # Los resultados no guardan el ID_Empleado: se recupera por la ruta de la evidencia
+        id_por_ruta = evidencias.drop_duplicates('Ruta_Evidencia').set_index('Ruta_Evidencia')['ID_Empleado']
+        ids_empleado = resultados['Link_imagen'].map(id_por_ruta)
+
+    reglas = ReglasValidacion(periodo, alias, coincidencia_parcial)
+    nuevos = reglas.recalcular(resultados, ids_empleado)
+    cambios = {columna: int((nuevos[columna] != resultados[columna]).sum()) for columna in COLUMNAS_REGLAS}
+
+    copia = None
+    if not simular:
+        if os.path.exists(ruta_salida) and os.path.samefile(ruta_salida, ruta_resultados):
+            copia = f"{ruta_resultados}.{time.strftime('%Y%m%d-%H%M%S')}.bak"
+            shutil.copy2(ruta_resultados, copia)
+            logger.info(f"Copia de seguridad de {ruta_resultados} en {copia}")
+        ruta_temporal = ruta_salida + '.tmp'
+        nuevos.to_csv(ruta_temporal, index=False, encoding='utf-8')
+        os.replace(ruta_temporal, ruta_salida)
+    return {'filas': len(resultados), 'cambios': cambios, 'segundos': time.perf_counter() - inicio, 'copia': copia}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Vuelve a aplicar las reglas de validación sin llamar a Gemini')
+    parser.add_argument('resultados', help='CSV de resultados a recalcular')
+    parser.add_argument('--evidencias', default='evidencias_2024.csv',
+                        help='CSV de evidencias para el índice de alias por ID_Empleado ("" para no usarlo)')
+    parser.add_argument('--periodo', default='2024', help='Año que deben acreditar las evidencias')
+    parser.add_argument('--salida', help='CSV donde guardar el resultado (obligatorio salvo con --simular; '
+                                         'si es el de entrada, antes se guarda una copia .bak)')
+    parser.add_argument('--sin-parcial', action='store_true',
+                        help='Exigir que el nombre coincida completo (sin nombres que contienen a otros)')
+    parser.add_argument('--simular', action='store_true', help='Mostrar cuántas filas cambiarían sin escribir nada')
+    args = parser.parse_args()
+    if not args.salida and not args.simular:
+        parser.error('indica --salida (puede ser el mismo fichero; se guarda una copia .bak antes) o usa --simular')
+
+    resumen = recalcular_csv(args.resultados, args.evidencias or None, args.periodo, args.salida,
+                             coincidencia_parcial=not args.sin_parcial, simular=args.simular)
+    logger.info(f"{resumen['filas']} filas recalculadas en {resumen['segundos']:.2f} s; "
+                f"filas cambiadas por columna: {resumen['cambios']}"
+                f"{' (simulación, no se ha escrito nada)' if args.simular else ''}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+'''
+Respuestas de Gemini con salida estructurada y reparación de JSON mal formado.
+
+Con salida estructurada la petición lleva response_mime_type='application/json' y un
+response_schema con solo los campos que usan las reglas (nombre, fecha, tareas y
+justificación), así que Gemini devuelve JSON sin marcadores de código ni texto
+alrededor y no gasta tokens en campos que no se usan (contenido_relevante).
+
+Cada campo tiene un presupuesto de longitud. El esquema de la API no admite límites
+de caracteres en las cadenas, así que el presupuesto se aplica en tres sitios:
+
+- en la descripción de cada campo del esquema (y max_items en la lista de tareas)
+- en max_output_tokens, calculado a partir de la suma de los presupuestos
+- al interpretar la respuesta, recortando lo que se pase (recortar_campos)
+
+Con o sin salida estructurada, las respuestas se interpretan con reparar_json, que
+tolera marcadores ```json, texto antes o después del JSON y comas finales. Una
+respuesta cortada al agotar max_output_tokens solo se da por buena si el corte cae
+entre dos campos y están todos los obligatorios: si corta un valor a mitad o falta
+algún campo es una respuesta mal formada (fila de error que se reprocesa con
+--resume), para no convertir un corte en una validación negativa.
+
+Uso:
+    uv run python src/check_evidencias.py --salida-estructurada --presupuesto justificacion=200 tareas=3
+'''
+
+import json
+import math
+import re
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+SIN_NOMBRE = "No se encontró nombre"
+# Campos que debe tener la respuesta de cada imagen
+CAMPOS_RESPUESTA = ('nombre_encontrado', 'fecha_encontrada', 'tareas_identificadas', 'justificacion')
+# Caracteres por token aproximados en las respuestas en español (algo por debajo de la
+# media para no cortar respuestas que cumplen el presupuesto)
+CARACTERES_POR_TOKEN = 3
+# Caracteres de la sintaxis JSON (claves, comillas, corchetes) de una respuesta
+CARACTERES_SINTAXIS = 120
+# Margen sobre el presupuesto antes de cortar la respuesta en max_output_tokens
+MARGEN_TOKENS = 1.25
+
+_MARCADOR_CODIGO = re.compile(r'```(?:json)?', re.IGNORECASE)
+_CIERRES = {'{': '}', '[': ']'}
+
+
+class PresupuestoCampos(NamedTuple):
+    """Longitud máxima (caracteres) de cada campo de la respuesta y número máximo de tareas."""
+    nombre: int = 80
+    fecha: int = 40
+    tareas: int = 5
+    tarea: int = 80
+    justificacion: int = 300
+
+
+def leer_presupuesto(pares: Iterable[str]) -> PresupuestoCampos:
+    """
+    Presupuesto a partir de pares campo=valor (por ejemplo de la línea de comandos).
+
+    Raises:
+        ValueError: Si algún campo no existe o su valor no es un entero positivo
+    """
+    cambios = {}
+    for par in pares or []:
+        campo, _, valor = par.partition('=')
+        if campo not in PresupuestoCampos._fields:
+            raise ValueError(f"Campo de presupuesto desconocido: {campo} "
+                             f"(válidos: {', '.join(PresupuestoCampos._fields)})")
+        if not valor.isdigit() or int(valor) < 1:
+            raise ValueError(f"El presupuesto de {campo} debe ser un entero positivo: {valor!r}")
+        cambios[campo] = int(valor)
+    return PresupuestoCampos()._replace(**cambios)
+
+
+def esquema_respuesta(presupuesto: PresupuestoCampos) -> Dict:
+    """Esquema (formato de response_schema) de la respuesta de una imagen."""
+    return {
+        'type': 'object',
+        'properties': {
+            'nombre_encontrado': {
+                'type': 'string',
+                'description': f'Nombre completo visible en la imagen, como máximo {presupuesto.nombre} '
+                               f'caracteres, o "{SIN_NOMBRE}"',
+            },
+            'fecha_encontrada': {
+                'type': 'string',
+                'description': f'Fecha visible en la imagen tal como aparece, como máximo '
+                               f'{presupuesto.fecha} caracteres, o cadena vacía',
+            },
+            'tareas_identificadas': {
+                'type': 'array',
+                'items': {
+                    'type': 'string',
+                    'description': f'Tarea o actividad, como máximo {presupuesto.tarea} caracteres',
+                },
+                'max_items': presupuesto.tareas,
+            },
+            'justificacion': {
+                'type': 'string',
+                'description': f'Cómo justifica el contenido la participación en el proyecto, '
+                               f'como máximo {presupuesto.justificacion} caracteres',
+            },
+        },
+        'required': list(CAMPOS_RESPUESTA),
+    }
+
+
+def esquema_lote(presupuesto: PresupuestoCampos, imagenes: int) -> Dict:
+    """Esquema de la respuesta de un lote: un objeto por imagen, en el mismo orden."""
+    return {
+        'type': 'array',
+        'items': esquema_respuesta(presupuesto),
+        'min_items': imagenes,
+        'max_items': imagenes,
+    }
+
+
+def max_tokens_salida(presupuesto: PresupuestoCampos, imagenes: int = 1) -> int:
+    """Tokens de salida suficientes para una respuesta por imagen que cumpla el presupuesto."""
+    caracteres = (presupuesto.nombre + presupuesto.fecha + presupuesto.tareas * presupuesto.tarea
+                  + presupuesto.justificacion + CARACTERES_SINTAXIS)
+    return math.ceil(caracteres / CARACTERES_POR_TOKEN * MARGEN_TOKENS) * imagenes
+
+
+def config_generacion(base: Dict, presupuesto: PresupuestoCampos, imagenes: int = 1) -> Dict:
+    """generation_config con salida JSON restringida al esquema y max_output_tokens del presupuesto."""
+    esquema = esquema_respuesta(presupuesto) if imagenes == 1 else esquema_lote(presupuesto, imagenes)
+    return dict(
+        base,
+        response_mime_type='application/json',
+        response_schema=esquema,
+        max_output_tokens=max_tokens_salida(presupuesto, imagenes),
+    )
+
+
+def prompt_estructurado(proyecto: str, presupuesto: PresupuestoCampos) -> str:
+    """Prompt de una imagen con salida estructurada: los campos ya los fija el esquema."""
+    return (
+        f'Analiza esta evidencia del proyecto "{proyecto}". Extrae el nombre completo y la fecha '
+        f'visibles, hasta {presupuesto.tareas} tareas o actividades y una justificación breve de la '
+        f'participación en el proyecto. Respeta la longitud máxima de cada campo.'
+    )
+
+
+def prompt_lote_estructurado(proyectos: List[str], presupuesto: PresupuestoCampos) -> str:
+    """Prompt de un lote con salida estructurada."""
+    lista = "\n".join(f'- Imagen {i}: proyecto "{proyecto}"' for i, proyecto in enumerate(proyectos, start=1))
+    return (
+        f'Vas a recibir {len(proyectos)} evidencias numeradas. Analiza cada una por separado:\n{lista}\n'
+        f'Para cada imagen extrae el nombre completo y la fecha visibles, hasta {presupuesto.tareas} '
+        f'tareas o actividades y una justificación breve de la participación en su proyecto. '
+        f'Devuelve un objeto por imagen, en el mismo orden, respetando la longitud máxima de cada campo.'
+    )
+
+
+def recortar_campos(datos: Dict, presupuesto: PresupuestoCampos) -> Dict:
+    """Recorta los campos que superan el presupuesto (el esquema no limita la longitud)."""
+    if not isinstance(datos, dict):
+        return datos
+    recortados = dict(datos)
+    for campo, limite in (('nombre_encontrado', presupuesto.nombre), ('fecha_encontrada', presupuesto.fecha),
+                          ('justificacion', presupuesto.justificacion)):
+        if isinstance(recortados.get(campo), str):
+            recortados[campo] = recortados[campo][:limite]
+    tareas = recortados.get('tareas_identificadas')
+    if isinstance(tareas, list):
+        recortados['tareas_identificadas'] = [
+            tarea[:presupuesto.tarea] if isinstance(tarea, str) else tarea
+            for tarea in tareas[:presupuesto.tareas]
+        ]
+    return recortados
+
+
+def reparar_json(texto: str, requeridos: Iterable[str] = ()) -> Tuple[object, bool]:
+    """
+    Interpreta el JSON de una respuesta, reparándolo si hace falta.
+
+    Args:
+        texto: Respuesta del modelo
+        requeridos: Campos que debe tener cada objeto de una respuesta reparada (el
+            objeto o, si es un array, cada uno de sus elementos)
+
+    Returns:
+        Tupla (datos, reparado), con reparado=True si el texto no era JSON válido tal cual
+
+    Raises:
+        json.JSONDecodeError: Si no hay ningún JSON recuperable en el texto, está
+            cortado a mitad de un valor o a lo reparado le falta algún campo requerido
+    """
+    try:
+        return json.loads(texto), False
+    except json.JSONDecodeError as error:
+        original = error
+    except TypeError:
+        raise json.JSONDecodeError("La respuesta no es texto", repr(texto), 0)
+
+    limpio = _MARCADOR_CODIGO.sub('', texto).strip()
+    inicio = min((i for i in (limpio.find('{'), limpio.find('[')) if i >= 0), default=-1)
+    if inicio < 0:
+        raise original
+    for candidato in _candidatos(limpio[inicio:]):
+        try:
+            datos = json.loads(candidato)
+        except json.JSONDecodeError:
+            continue
+        objetos = datos if isinstance(datos, list) else [datos]
+        for objeto in objetos:
+            faltan = [campo for campo in requeridos if not isinstance(objeto, dict) or objeto.get(campo) is None]
+            if faltan:
+                raise json.JSONDecodeError(f"Respuesta incompleta, faltan campos: {', '.join(faltan)}",
+                                           texto, len(texto))
+        return datos, True
+    raise original
+
+
+def _candidatos(texto: str) -> Iterable[str]:
+    """
+    Versiones reparadas del JSON que empieza al principio de texto, de la más a la menos completa.
+
+    Se recorre el texto fuera de las cadenas quitando las comas antes de un cierre. Si
+    el valor se cierra, se devuelve hasta ahí (ignorando el texto de después); si está
+    cortado entre dos elementos, se cierra tal cual y después cortando en cada coma
+    anterior, para descartar el último elemento incompleto. Si está cortado dentro de
+    una cadena no se devuelve nada: el valor a medias no se puede distinguir de uno real.
+    """
+    salida: List[str] = []
+    pila: List[str] = []
+    comas: List[Tuple[int, Tuple[str, ...]]] = []
+    en_cadena = escape = False
+    for caracter in texto:
+        if en_cadena:
+            salida.append(caracter)
+            if escape:
+                escape = False
+            elif caracter == '\\':
+                escape = True
+            elif caracter == '"':
+                en_cadena = False
+            continue
+        if caracter == '"':
+            en_cadena = True
+        elif caracter in _CIERRES:
+            pila.append(_CIERRES[caracter])
+        elif caracter in '}]':
+            while salida and (salida[-1].isspace() or salida[-1] == ','):
+                salida.pop()
+            if not pila or pila.pop() != caracter:
+                break
+            salida.append(caracter)
+            if not pila:
+                yield ''.join(salida)
+                return
+            continue
+        elif caracter == ',':
+            comas.append((len(salida), tuple(pila)))
+        salida.append(caracter)
+
+    if en_cadena:
+        return
+    # Valor cortado entre dos elementos: cerrar los corchetes pendientes. Si termina en un
+    # número o literal (true, null...) puede estar a medias y solo valen los cortes en comas
+    final = ''.join(salida).rstrip()
+    if final.endswith(('"', '}', ']', ',', '{', '[')):
+        yield final.rstrip(',') + ''.join(reversed(pila))
+    for posicion, pila_coma in reversed(comas):
+        yield ''.join(salida[:posicion]).rstrip() + ''.join(reversed(pila_coma))
@@ -0,0 +1,63 @@
+import csv
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+# Los módulos del proyecto se importan desde src/, como al ejecutar los scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+# Sin esperas entre reintentos para que las pruebas no dependan del backoff
+SIN_BACKOFF = {'backoff_base': 0, 'backoff_max': 0}
+
+COLUMNAS_EVIDENCIAS = ['ID_Empleado', 'Nombre_Empleado', 'ID_Subproyecto', 'Nombre_Subproyecto', 'ID_Proyecto',
+                       'Nombre_Proyecto', 'Evidencia', 'Ruta_Evidencia']
+
+
+def escribir_evidencias(ruta_csv, rutas_imagen):
+    """CSV de evidencias con una fila por imagen, todas del empleado que devuelve ModeloFalso."""
+    with open(ruta_csv, 'w', encoding='utf-8', newline='') as f:
+        escritor = csv.DictWriter(f, fieldnames=COLUMNAS_EVIDENCIAS)
+        escritor.writeheader()
+        for i, ruta in enumerate(rutas_imagen):
+            escritor.writerow({
+                'ID_Empleado': 100 + i,
+                'Nombre_Empleado': 'Nombre Falso',
+                'ID_Subproyecto': f'SP{i}',
+                'Nombre_Subproyecto': f'Subproyecto {i}',
+                'ID_Proyecto': 1,
+                'Nombre_Proyecto': 'Proyecto de prueba',
+                'Evidencia': os.path.basename(ruta),
+                'Ruta_Evidencia': ruta,
+            })
+
+
+def leer_resultados(ruta_csv):
+    with open(ruta_csv, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def crear_validador(modelo, **opciones):
+    from check_evidencias import EvidenciaValidator
+    return EvidenciaValidator(modelo, opciones_cliente=SIN_BACKOFF, **opciones)
+
+
+def procesar(validador, ruta_csv, ruta_salida, **opciones):
+    """Valida el CSV de evidencias y devuelve las filas del CSV de resultados."""
+    from check_evidencias import ProcesadorEvidencias
+    ProcesadorEvidencias(validador).procesar_csv(ruta_csv, ruta_salida, **opciones)
+    return leer_resultados(ruta_salida)
+
+
+@pytest.fixture
+def evidencias(tmp_path):
+    """CSV con 6 evidencias PNG distintas (cada una con su propio color, y por tanto su hash)."""
+    rutas = []
+    for i in range(6):
+        ruta = tmp_path / f'evidencia_{i}.png'
+        Image.new('RGB', (32, 24), (40 * i, 100, 200)).save(ruta)
+        rutas.append(str(ruta))
+    ruta_csv = tmp_path / 'evidencias.csv'
+    escribir_evidencias(ruta_csv, rutas)
+    return str(ruta_csv), rutas
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from almacen_resultados import AlmacenResultados, ConflictoFila
+from conftest import leer_resultados
+
+CSV_INICIAL = 'Nombre_ok,Justificacion,Link_imagen\r\n1,,a.png\r\n0,,b.png\r\n1,,c.png\r\n'
+
+
+@pytest.fixture
+def ruta_csv(tmp_path):
+    ruta = tmp_path / 'revision.csv'
+    ruta.write_text(CSV_INICIAL, encoding='utf-8')
+    return str(ruta)
+
+
+def test_actualizar_solo_escribe_en_el_registro(ruta_csv):
+    almacen = AlmacenResultados(ruta_csv)
+
+    fila = almacen.actualizar(1, {'Nombre_ok': 1, 'Justificacion': 'Revisado'}, link_imagen='b.png')
+
+    assert fila == {'Nombre_ok': '1', 'Justificacion': 'Revisado', 'Link_imagen': 'b.png'}
+    with open(ruta_csv, encoding='utf-8', newline='') as f:
+        assert f.read() == CSV_INICIAL
+    assert os.path.exists(almacen.ruta_registro)
+    # Otro proceso (otra instancia) ve el cambio pendiente aplicando el registro
+    otro = AlmacenResultados(ruta_csv)
+    _, contenido, _ = otro.exportar()
+    assert b'1,Revisado,b.png' in contenido
+
+
+def test_compactar_aplica_los_cambios_y_borra_el_registro(ruta_csv):
+    almacen = AlmacenResultados(ruta_csv)
+    almacen.actualizar(0, {'Nombre_ok': 0})
+    almacen.actualizar(2, {'Justificacion': 'Sin fecha'})
+
+    assert almacen.compactar()
+
+    assert not os.path.exists(almacen.ruta_registro)
+    filas = leer_resultados(ruta_csv)
+    assert [fila['Nombre_ok'] for fila in filas] == ['0', '0', '1']
+    assert filas[2]['Justificacion'] == 'Sin fecha'
+    assert not almacen.compactar()
+
+
+def test_se_compacta_al_llegar_al_umbral(ruta_csv):
+    almacen = AlmacenResultados(ruta_csv, umbral_compactacion=3)
+    for valor in range(3):
+        almacen.actualizar(0, {'Justificacion': str(valor)})
+
+    assert not os.path.exists(almacen.ruta_registro)
+    assert leer_resultados(ruta_csv)[0]['Justificacion'] == '2'
+
+
+def test_linea_del_registro_a_medio_escribir_se_ignora(ruta_csv):
+    almacen = AlmacenResultados(ruta_csv)
+    almacen.actualizar(0, {'Justificacion': 'completo'})
+    with open(almacen.ruta_registro, 'ab') as f:
+        f.write(b'{"fila": 1, "campos": {"Justif')
+
+    otro = AlmacenResultados(ruta_csv)
+    _, _, filas, _ = otro.instantanea()
+
+    assert filas[0][1]['Justificacion'] == 'completo'
+    assert filas[1][1]['Justificacion'] == ''
+
+
+def test_conflicto_si_la_fila_ya_no_es_la_misma_evidencia(ruta_csv):
+    almacen = AlmacenResultados(ruta_csv)
+    with pytest.raises(ConflictoFila):
+        almacen.actualizar(0, {'Nombre_ok': 0}, link_imagen='b.png')
+    with pytest.raises(KeyError):
+        almacen.actualizar(0, {'No_existe': 0})
+    assert not os.path.exists(almacen.ruta_registro)
+
+
+def test_reemplazar_descarta_los_cambios_pendientes(ruta_csv):
+    almacen = AlmacenResultados(ruta_csv)
+    almacen.actualizar(0, {'Justificacion': 'pendiente'})
+
+    copia = almacen.reemplazar('Nombre_ok,Justificacion,Link_imagen\r\n1,nuevo,z.png\r\n', copia_seguridad=True)
+
+    assert leer_resultados(copia)[0]['Justificacion'] == 'pendiente'
+    assert not os.path.exists(almacen.ruta_registro)
+    assert leer_resultados(ruta_csv) == [{'Nombre_ok': '1', 'Justificacion': 'nuevo', 'Link_imagen': 'z.png'}]
+    assert almacen.num_filas() == 1
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import cache_resultados
+from cache_resultados import CacheResultados
+from conftest import crear_validador, procesar
+from modelo_falso import ModeloFalso
+
+
+def test_la_cache_evita_volver_a_llamar(evidencias, tmp_path):
+    ruta_csv, rutas = evidencias
+    modelo = ModeloFalso(latencia=0)
+    cache = CacheResultados(str(tmp_path / 'cache.sqlite'))
+    try:
+        primera = procesar(crear_validador(modelo, cache=cache), ruta_csv, str(tmp_path / 'primera.csv'))
+        llamadas = modelo.llamadas
+        segunda = procesar(crear_validador(modelo, cache=cache), ruta_csv, str(tmp_path / 'segunda.csv'), workers=2)
+        estadisticas = cache.estadisticas()
+    finally:
+        cache.cerrar()
+
+    assert llamadas == len(rutas)
+    assert modelo.llamadas == llamadas
+    assert estadisticas['hits'] == len(rutas)
+    assert segunda == primera
+
+
+def test_la_clave_cambia_con_el_prompt_y_el_modelo():
+    clave = CacheResultados.clave('hash', 'prompt', 'modelo', {'temperature': 0.1})
+    assert clave == CacheResultados.clave('hash', 'prompt', 'modelo', {'temperature': 0.1})
+    assert clave != CacheResultados.clave('hash', 'otro prompt', 'modelo', {'temperature': 0.1})
+    assert clave != CacheResultados.clave('hash', 'prompt', 'otro modelo', {'temperature': 0.1})
+    assert clave != CacheResultados.clave('hash', 'prompt', 'modelo', {'temperature': 0.2})
+
+
+def test_desaloja_las_menos_usadas(tmp_path, monkeypatch):
+    # Reloj que avanza en cada llamada para que el orden LRU no dependa de la resolución de time.time
+    instantes = iter(range(100))
+    monkeypatch.setattr(cache_resultados, 'time', SimpleNamespace(time=lambda: next(instantes)))
+    cache = CacheResultados(str(tmp_path / 'cache.sqlite'), max_entradas=2)
+    try:
+        cache.guardar('a', 'A')
+        cache.guardar('b', 'B')
+        assert cache.obtener('a') == 'A'
+        cache.guardar('c', 'C')
+
+        assert cache.obtener('b') is None
+        assert cache.obtener('a') == 'A'
+        assert cache.obtener('c') == 'C'
+        assert cache.estadisticas()['desalojos'] == 1
+    finally:
+        cache.cerrar()
+
+
+def test_refrescar_ignora_lo_guardado_pero_guarda_lo_nuevo(tmp_path):
+    ruta = str(tmp_path / 'cache.sqlite')
+    cache = CacheResultados(ruta)
+    cache.guardar('a', 'antigua')
+    cache.cerrar()
+
+    cache = CacheResultados(ruta, refrescar=True)
+    try:
+        assert cache.obtener('a') is None
+        cache.guardar('a', 'nueva')
+    finally:
+        cache.cerrar()
+    cache = CacheResultados(ruta)
+    try:
+        assert cache.obtener('a') == 'nueva'
+    finally:
+        cache.cerrar()
@@ -0,0 +1,33 @@
+from conftest import crear_validador, escribir_evidencias, procesar
+from modelo_falso import ModeloFalso
+
+
+def test_varios_workers_mantienen_el_orden_de_entrada(evidencias, tmp_path):
+    ruta_csv, rutas = evidencias
+    # Latencias muy distintas entre llamadas para que terminen desordenadas
+    modelo = ModeloFalso(latencia=0.02, variacion_latencia=1.0, semilla=1)
+    avisos = []
+
+    resultados = procesar(crear_validador(modelo), ruta_csv, str(tmp_path / 'salida.csv'), workers=4,
+                          progreso=lambda hechas, total, resultado: avisos.append(resultado['Link_imagen']))
+
+    assert [fila['Link_imagen'] for fila in resultados] == rutas
+    assert avisos == rutas
+    assert all(fila['Nombre_ok'] == '1' and fila['Periodo_ok'] == '1' for fila in resultados)
+
+
+def test_el_error_de_una_fila_no_afecta_al_resto(evidencias, tmp_path):
+    _, rutas = evidencias
+    rutas = rutas[:2] + [str(tmp_path / 'no_existe.png')] + rutas[2:]
+    ruta_csv = tmp_path / 'con_error.csv'
+    escribir_evidencias(ruta_csv, rutas)
+
+    resultados = procesar(crear_validador(ModeloFalso(latencia=0)), str(ruta_csv), str(tmp_path / 'salida.csv'),
+                          workers=3)
+
+    assert len(resultados) == len(rutas)
+    assert 'Error al procesar' in resultados[2]['Descripcion_tarea']
+    assert resultados[2]['Nombre_encontrado'] == 'Error'
+    assert [fila['Link_imagen'] for fila in resultados] == rutas
+    correctas = resultados[:2] + resultados[3:]
+    assert all(fila['Nombre_ok'] == '1' for fila in correctas)
@@ -0,0 +1,76 @@
+import pytest
+
+from check_evidencias import EvidenciaValidator
+from cliente_gemini import CircuitoAbiertoError, ClienteGemini
+from conftest import SIN_BACKOFF, procesar
+from modelo_falso import ErrorCuotaFalso, ModeloFalso
+
+
+def test_reintenta_los_429_hasta_responder():
+    modelo = ModeloFalso(latencia=0, tasa_429=0.5, semilla=3)
+    cliente = ClienteGemini(modelo, max_reintentos=20, umbral_circuito=100, **SIN_BACKOFF)
+
+    for _ in range(10):
+        assert cliente.generate_content(['prompt']).text
+
+    metricas = cliente.metricas()
+    assert metricas['exitos'] == 10
+    assert metricas['errores_cuota'] > 0
+    assert metricas['reintentos'] == modelo.llamadas - 10
+    # Cada 429 reduce el ritmo para las siguientes peticiones
+    assert metricas['factor_ritmo'] < 1.0
+
+
+def test_agota_los_reintentos_y_propaga_el_429():
+    modelo = ModeloFalso(latencia=0, tasa_429=1.0)
+    cliente = ClienteGemini(modelo, max_reintentos=2, umbral_circuito=100, **SIN_BACKOFF)
+
+    with pytest.raises(ErrorCuotaFalso):
+        cliente.generate_content(['prompt'])
+    assert modelo.llamadas == 3
+
+
+def test_circuito_se_abre_y_rechaza_sin_llamar():
+    modelo = ModeloFalso(latencia=0, tasa_429=1.0)
+    cliente = ClienteGemini(modelo, max_reintentos=5, umbral_circuito=3, apertura_circuito=60, **SIN_BACKOFF)
+
+    with pytest.raises(CircuitoAbiertoError):
+        cliente.generate_content(['prompt'])
+    assert modelo.llamadas == 3
+    with pytest.raises(CircuitoAbiertoError):
+        cliente.generate_content(['prompt'])
+    assert modelo.llamadas == 3
+
+    metricas = cliente.metricas()
+    assert metricas['aperturas_circuito'] == 1
+    assert metricas['rechazos_circuito'] == 2
+
+
+def test_circuito_semiabierto_se_cierra_con_un_exito():
+    modelo = ModeloFalso(latencia=0, tasa_429=1.0)
+    cliente = ClienteGemini(modelo, max_reintentos=0, umbral_circuito=1, apertura_circuito=0, **SIN_BACKOFF)
+    with pytest.raises(ErrorCuotaFalso):
+        cliente.generate_content(['prompt'])
+
+    # Pasado el tiempo de apertura se deja pasar una petición de prueba
+    modelo.tasa_429 = 0.0
+    assert cliente.generate_content(['prompt']).text
+    assert cliente.circuito.fallos_seguidos == 0
+
+
+def test_circuito_abierto_deja_filas_de_error(evidencias, tmp_path):
+    ruta_csv, rutas = evidencias
+    modelo = ModeloFalso(latencia=0, tasa_429=1.0)
+    validador = EvidenciaValidator(modelo, opciones_cliente={**SIN_BACKOFF, 'max_reintentos': 1,
+                                                             'umbral_circuito': 3, 'apertura_circuito': 60})
+
+    resultados = procesar(validador, ruta_csv, str(tmp_path / 'salida.csv'))
+
+    metricas = validador.model.metricas()
+    assert metricas['aperturas_circuito'] == 1
+    assert metricas['rechazos_circuito'] > 0
+    # Solo llegan al modelo las llamadas anteriores a abrir el circuito
+    assert modelo.llamadas == 3
+    assert len(resultados) == len(rutas)
+    assert [fila['Link_imagen'] for fila in resultados] == rutas
+    assert all(fila['Nombre_ok'] == '0' and fila['Nombre_encontrado'] == 'Error' for fila in resultados)
@@ -0,0 +1,64 @@
+import csv
+import json
+
+import ejecuciones_validacion
+from almacen_resultados import AlmacenResultados
+from conftest import leer_resultados
+from ejecuciones_validacion import GestorEjecuciones, formato_sse
+
+
+def _json_estricto(texto):
+    """json.loads que rechaza NaN e Infinity, como JSON.parse en el navegador."""
+    def rechazar(constante):
+        raise ValueError(f"Valor no válido en JSON: {constante}")
+    return json.loads(texto, parse_constant=rechazar)
+
+
+def test_celdas_vacias_de_la_entrada_no_llegan_como_nan(evidencias, tmp_path):
+    ruta_csv, rutas = evidencias
+    filas = leer_resultados(ruta_csv)
+    filas[1]['Nombre_Subproyecto'] = ''
+    with open(ruta_csv, 'w', encoding='utf-8', newline='') as f:
+        escritor = csv.DictWriter(f, fieldnames=list(filas[0]))
+        escritor.writeheader()
+        escritor.writerows(filas)
+
+    almacen = AlmacenResultados(str(tmp_path / 'revision.csv'))
+    gestor = GestorEjecuciones(almacen, ruta_csv, str(tmp_path / 'salida.csv'))
+    ejecucion = gestor.iniciar({'backend': 'falso', 'latencia_falsa': 0, 'cache': False, 'workers': 2})
+    eventos = list(evento for evento in ejecucion.eventos(latido=0.1) if evento is not None)
+
+    assert ejecucion.estado == 'terminada', ejecucion.error
+    for evento in eventos:
+        datos = formato_sse(evento).split('data: ', 1)[1]
+        _json_estricto(datos)
+    filas_evento = [evento['datos']['datos'] for evento in eventos if evento['tipo'] == 'fila']
+    assert [fila['Link_imagen'] for fila in filas_evento] == rutas
+    assert filas_evento[1]['Tarea_a_validar'] == ''
+
+    revision = leer_resultados(almacen.ruta_csv)
+    assert revision[1]['Tarea_a_validar'] == ''
+    assert all('nan' not in fila.values() for fila in revision)
+    assert leer_resultados(str(tmp_path / 'salida.csv'))[1]['Tarea_a_validar'] == ''
+
+
+def test_anadir_guarda_nan_como_celda_vacia(tmp_path):
+    ruta = tmp_path / 'revision.csv'
+    ruta.write_text('Nombre_ok,Tarea_a_validar,Link_imagen\r\n', encoding='utf-8')
+    almacen = AlmacenResultados(str(ruta))
+
+    almacen.anadir([{'Nombre_ok': 1, 'Tarea_a_validar': float('nan'), 'Link_imagen': 'a.png'}])
+
+    assert leer_resultados(str(ruta)) == [{'Nombre_ok': '1', 'Tarea_a_validar': '', 'Link_imagen': 'a.png'}]
+
+
+def test_solo_se_guardan_los_ultimos_eventos(monkeypatch):
+    monkeypatch.setattr(ejecuciones_validacion, 'MAX_EVENTOS_GUARDADOS', 5)
+    ejecucion = ejecuciones_validacion.Ejecucion(1, {})
+    for i in range(12):
+        ejecucion.publicar('fila', {'fila': i})
+    ejecucion.publicar('fin', {}, estado='terminada')
+
+    assert [evento['id'] for evento in ejecucion.eventos()] == [9, 10, 11, 12, 13]
+    # Un cliente que se reconecta recibe solo lo que le falta
+    assert [evento['id'] for evento in ejecucion.eventos(desde=11)] == [12, 13]
@@ -0,0 +1,80 @@
+from conftest import crear_validador, leer_resultados, procesar
+from escritor_resultados import (
+    COLUMNAS_RESULTADO,
+    EscritorResultados,
+    ResumenValidacion,
+    preparar_reanudacion,
+    reordenar_salida,
+)
+from modelo_falso import ModeloFalso
+
+
+def _resultado(link, nombre_encontrado='Nombre Falso', ok=1):
+    resultado = {columna: '' for columna in COLUMNAS_RESULTADO}
+    resultado.update({'Nombre_ok': ok, 'Periodo_ok': ok, 'Tarea_ok': ok,
+                      'Nombre_encontrado': nombre_encontrado, 'Link_imagen': link})
+    return resultado
+
+
+def test_resume_solo_procesa_lo_pendiente(evidencias, tmp_path):
+    ruta_csv, rutas = evidencias
+    ruta_salida = str(tmp_path / 'salida.csv')
+    modelo = ModeloFalso(latencia=0)
+    procesar(crear_validador(modelo), ruta_csv, ruta_salida, limite_lineas=2)
+    assert modelo.llamadas == 2
+
+    resultados = procesar(crear_validador(modelo), ruta_csv, ruta_salida, reanudar=True, workers=2)
+
+    assert modelo.llamadas == len(rutas)
+    assert [fila['Link_imagen'] for fila in resultados] == rutas
+    assert all(fila['Nombre_ok'] == '1' for fila in resultados)
+
+
+def test_anadir_no_repite_la_cabecera(tmp_path):
+    ruta = str(tmp_path / 'salida.csv')
+    with EscritorResultados(ruta) as escritor:
+        escritor.escribir(_resultado('a.png'))
+    with EscritorResultados(ruta, anadir=True) as escritor:
+        escritor.escribir(_resultado('b.png'))
+
+    assert [fila['Link_imagen'] for fila in leer_resultados(ruta)] == ['a.png', 'b.png']
+
+
+def test_preparar_reanudacion_descarta_errores_y_filas_cortadas(tmp_path):
+    ruta = tmp_path / 'salida.csv'
+    with EscritorResultados(str(ruta)) as escritor:
+        escritor.escribir(_resultado('a.png'))
+        escritor.escribir(_resultado('b.png', nombre_encontrado='Error', ok=0))
+        escritor.escribir(_resultado(''))
+        escritor.escribir(_resultado('a.png'))
+    # Última fila cortada a medias por una interrupción
+    with open(ruta, 'a', encoding='utf-8', newline='') as f:
+        f.write('1,1,1,Nombre')
+
+    terminadas = preparar_reanudacion(str(ruta))
+
+    assert terminadas == {'a.png': 2}
+    assert [fila['Link_imagen'] for fila in leer_resultados(str(ruta))] == ['a.png', 'a.png']
+
+
+def test_reordenar_salida_sigue_el_orden_de_entrada(tmp_path):
+    ruta = str(tmp_path / 'salida.csv')
+    with EscritorResultados(ruta) as escritor:
+        for link in ['c.png', '', 'a.png', 'b.png']:
+            escritor.escribir(_resultado(link))
+
+    reordenar_salida(ruta, ['a.png', 'b.png', 'c.png'])
+
+    # Las filas sin imagen no se pueden emparejar y quedan al final
+    assert [fila['Link_imagen'] for fila in leer_resultados(ruta)] == ['a.png', 'b.png', 'c.png', '']
+
+
+def test_resumen_acepta_valores_recien_validados_y_leidos_del_csv():
+    resumen = ResumenValidacion()
+    resumen.anadir({'Nombre_ok': True, 'Periodo_ok': 0, 'Tarea_ok': float('nan')})
+    resumen.anadir({'Nombre_ok': 'True', 'Periodo_ok': '1', 'Tarea_ok': '0'})
+
+    assert resumen.total == 2
+    assert resumen.porcentaje('Nombre_ok') == 100.0
+    assert resumen.porcentaje('Periodo_ok') == 50.0
+    assert resumen.porcentaje('Tarea_ok') == 0.0
@@ -0,0 +1,45 @@
+import random
+
+from matcher_evidencias import IndiceEvidencias, buscar_evidencia
+
+EMPLEADOS = ['Joel Urraco', 'Alberto López', 'María Blasco', 'Lucía García', 'Javier Martínez', 'Ana Pérez']
+SUBPROYECTOS = ['Menu Planner', 'Group-e MVP', 'Centauro- Scrapping & Consultoría Data', 'Cookbook']
+TIPOS = ['JIRA', 'Commit', 'Figma']
+
+
+def _datos(semilla):
+    rnd = random.Random(semilla)
+    archivos = [f"{rnd.choice(EMPLEADOS)}_{rnd.choice(SUBPROYECTOS)} [{rnd.choice(TIPOS)}].png" for _ in range(150)]
+    # Nombres repetidos (empates que decide el orden), sin guion bajo y con más de un guion bajo
+    archivos += archivos[:10] + ['captura.png', 'Ana Pérez_Cookbook_v2 [JIRA].png']
+    rnd.shuffle(archivos)
+    filas = []
+    for _ in range(60):
+        empleado = rnd.choice(EMPLEADOS)
+        # Variantes habituales: apellido distinto, mayúsculas, sin tildes, espacios
+        empleado = rnd.choice([empleado, empleado.split()[0] + ' Gómez', empleado.upper(),
+                               empleado.replace('í', 'i').replace('é', 'e'), f"  {empleado} "])
+        filas.append((empleado, rnd.choice(SUBPROYECTOS + ['Otro proyecto', ''])))
+    filas += [(float('nan'), 'Cookbook'), ('Ana Pérez', float('nan')), ('Desconocido', 'Cookbook')]
+    return archivos, filas
+
+
+def test_indice_asigna_lo_mismo_que_buscar_evidencia():
+    for semilla in range(2):
+        archivos, filas = _datos(semilla)
+        indice = IndiceEvidencias(archivos)
+
+        for empleado, subproyecto in filas:
+            assert indice.buscar(empleado, subproyecto) == buscar_evidencia(empleado, subproyecto, archivos)
+
+
+def test_mejor_coincidencia_combina_indices_parciales():
+    archivos, filas = _datos(7)
+    mitad = len(archivos) // 2
+    partes = [IndiceEvidencias(archivos[:mitad]), IndiceEvidencias(archivos[mitad:])]
+
+    for empleado, subproyecto in filas:
+        candidatos = [parte.mejor_coincidencia(empleado, subproyecto) for parte in partes]
+        # max se queda con el primero a igualdad de puntuación, como el orden de los ficheros
+        archivo, score = max(candidatos, key=lambda candidato: candidato[1])
+        assert (archivo if score > 0.5 else '') == buscar_evidencia(empleado, subproyecto, archivos)
@@ -0,0 +1,51 @@
+import csv
+
+from metricas import Muestra, RegistroMetricas, percentil
+
+
+def test_muestra_exacta_hasta_la_capacidad():
+    muestra = Muestra(capacidad=100)
+    valores = [float(i) for i in range(100)]
+    for valor in valores:
+        muestra.anadir(valor)
+    assert muestra.percentil(50) == percentil(valores, 50)
+    assert muestra.percentil(95) == percentil(valores, 95)
+
+
+def test_muestra_acotada_con_muchos_valores():
+    muestra = Muestra(capacidad=1000)
+    for i in range(100000):
+        muestra.anadir(i / 100000)
+
+    assert muestra.n == 100000
+    assert len(muestra._valores) == 1000
+    assert abs(muestra.media - 0.5) < 1e-3
+    # Percentiles estimados sobre una muestra uniforme
+    assert abs(muestra.percentil(50) - 0.5) < 0.05
+    assert abs(muestra.percentil(95) - 0.95) < 0.03
+
+
+def test_detalle_se_escribe_al_terminar_cada_unidad(tmp_path):
+    metricas = RegistroMetricas()
+    ruta = tmp_path / 'detalle.csv'
+    metricas.abrir_detalle(str(ruta))
+
+    for i in range(3):
+        with metricas.unidad(i + 1):
+            with metricas.medir('api'):
+                pass
+            metricas.registrar_respuesta('valida')
+        with open(ruta, encoding='utf-8', newline='') as f:
+            assert len(list(csv.DictReader(f))) == i + 1
+
+    with metricas.unidad(4):
+        metricas.registrar_error('cuota')
+    metricas.cerrar_detalle()
+
+    informe = metricas.informe()
+    assert informe['unidades'] == 4
+    assert informe['etapas']['api']['n'] == 3
+    assert informe['respuestas']['valida'] == 3
+    assert informe['errores'] == {'cuota': 1}
+    with open(ruta, encoding='utf-8', newline='') as f:
+        assert [fila['errores'] for fila in csv.DictReader(f)] == ['', '', '', 'cuota']
@@ -0,0 +1,101 @@
+import threading
+
+from PIL import Image, ImageDraw
+
+from conftest import crear_validador, escribir_evidencias, procesar
+from modelo_falso import ModeloFalso
+from prefiltro_evidencias import PrefiltroEvidencias
+
+
+def _esperar_en_hilo(prefiltro, huella):
+    """Lanza respuesta_duplicada en otro hilo y devuelve el hilo y dónde queda su resultado."""
+    resultado = {}
+    hilo = threading.Thread(target=lambda: resultado.setdefault('respuesta', prefiltro.respuesta_duplicada(huella)))
+    hilo.start()
+    hilo.join(0.2)
+    # Sigue bloqueado esperando a que la primera evidencia reciba su respuesta
+    assert hilo.is_alive()
+    return hilo, resultado
+
+
+def test_duplicado_espera_la_respuesta_de_la_primera():
+    prefiltro = PrefiltroEvidencias()
+    assert prefiltro.respuesta_duplicada('huella') is None
+    hilo, resultado = _esperar_en_hilo(prefiltro, 'huella')
+
+    prefiltro.publicar('huella', {'nombre_encontrado': 'Ana'})
+    hilo.join(5)
+
+    assert resultado['respuesta'] == {'nombre_encontrado': 'Ana'}
+    assert prefiltro.resumen()['llamadas_evitadas'] == 1
+
+
+def test_si_la_primera_falla_el_duplicado_llama_por_su_cuenta():
+    prefiltro = PrefiltroEvidencias()
+    assert prefiltro.respuesta_duplicada('huella') is None
+    hilo, resultado = _esperar_en_hilo(prefiltro, 'huella')
+
+    prefiltro.publicar('huella', None)
+    hilo.join(5)
+
+    assert resultado['respuesta'] is None
+    assert 'llamadas_evitadas' not in prefiltro.resumen()
+
+
+def test_se_desalojan_las_respuestas_menos_usadas():
+    prefiltro = PrefiltroEvidencias(max_respuestas=2)
+    for huella in ('a', 'b'):
+        prefiltro.respuesta_duplicada(huella)
+        prefiltro.publicar(huella, {'huella': huella})
+    assert prefiltro.respuesta_duplicada('a') == {'huella': 'a'}
+    prefiltro.respuesta_duplicada('c')
+    prefiltro.publicar('c', {'huella': 'c'})
+
+    assert prefiltro.respuesta_duplicada('b', esperar=False) is None
+    assert prefiltro.respuesta_duplicada('a') == {'huella': 'a'}
+    assert prefiltro.resumen()['respuestas_desalojadas'] == 1
+
+
+def _captura(ruta, texto):
+    """Imagen con contenido (las de la fixture son de un solo color y el prefiltro las descarta)."""
+    imagen = Image.new('RGB', (120, 40), (255, 255, 255))
+    ImageDraw.Draw(imagen).text((5, 10), texto, fill=(0, 0, 0))
+    imagen.save(ruta)
+    return str(ruta)
+
+
+def test_capturas_repetidas_y_en_blanco_no_llegan_al_modelo(tmp_path):
+    rutas = [_captura(tmp_path / f'captura_{i}.png', f'Commit {i}') for i in range(3)]
+    blanco = tmp_path / 'blanco.png'
+    Image.new('RGB', (32, 24), (255, 255, 255)).save(blanco)
+    # Cada captura aparece tres veces y se valida con varios workers a la vez
+    entrada = rutas * 3 + [str(blanco)]
+    ruta_csv = tmp_path / 'repetidas.csv'
+    escribir_evidencias(ruta_csv, entrada)
+    modelo = ModeloFalso(latencia=0.05)
+    validador = crear_validador(modelo, prefiltro=PrefiltroEvidencias())
+
+    resultados = procesar(validador, str(ruta_csv), str(tmp_path / 'salida.csv'), workers=4)
+
+    assert modelo.llamadas == 3
+    assert validador.prefiltro.resumen()['llamadas_evitadas'] == 6
+    assert all(fila['Nombre_ok'] == '1' for fila in resultados[:9])
+    assert 'Imagen en blanco' in resultados[9]['Descripcion_tarea']
+
+
+def test_resume_no_vuelve_a_revisar_las_descartadas(tmp_path):
+    rutas = [_captura(tmp_path / 'captura.png', 'Commit'), str(tmp_path / 'no_existe.png')]
+    ruta_csv = tmp_path / 'evidencias.csv'
+    escribir_evidencias(ruta_csv, rutas)
+    ruta_salida = str(tmp_path / 'salida.csv')
+    procesar(crear_validador(ModeloFalso(latencia=0), prefiltro=PrefiltroEvidencias()), str(ruta_csv), ruta_salida)
+
+    prefiltro = PrefiltroEvidencias()
+    resultados = procesar(crear_validador(ModeloFalso(latencia=0), prefiltro=prefiltro), str(ruta_csv), ruta_salida,
+                          reanudar=True)
+
+    assert 'revisadas' not in prefiltro.resumen()
+    # La fila descartada se puede emparejar con su evidencia en la revisión
+    assert [fila['Link_imagen'] for fila in resultados] == rutas
+    assert 'Fichero no encontrado' in resultados[1]['Descripcion_tarea']
+    assert resultados[1]['Nombre_a_validar'] == 'Nombre Falso'
@@ -0,0 +1,68 @@
+import logging
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+import preprocesado_imagenes
+from prefiltro_evidencias import PrefiltroEvidencias
+from preprocesado_imagenes import PreprocesadorImagenes, rasterizar_pdf
+
+
+def _imagenes(tmp_path, cantidad):
+    rutas = []
+    for i in range(cantidad):
+        ruta = tmp_path / f'evidencia_{i}.bmp'
+        Image.effect_noise((64, 64), 50 + i).save(ruta)
+        rutas.append(str(ruta))
+    return rutas
+
+
+def test_la_cache_de_imagenes_no_supera_el_maximo(tmp_path):
+    dir_cache = tmp_path / 'cache'
+    rutas = _imagenes(tmp_path, 8)
+    # Sin transformaciones los BMP se recodifican en PNG; cada uno ocupa unos pocos KB
+    tamano = len(PreprocesadorImagenes(dir_cache=str(tmp_path / 'medida')).preparar(rutas[0]).datos)
+    preprocesador = PreprocesadorImagenes(dir_cache=str(dir_cache), max_bytes_cache=tamano * 3)
+
+    for ruta in rutas:
+        preprocesador.preparar(ruta)
+        assert sum(f.stat().st_size for f in dir_cache.iterdir()) <= tamano * 3
+
+    # La última sigue en caché; la primera se ha desalojado y se vuelve a procesar
+    assert preprocesador.preparar(rutas[-1]).estadisticas['desde_cache']
+    assert not preprocesador.preparar(rutas[0]).estadisticas['desde_cache']
+
+
+def test_la_cache_respeta_las_imagenes_de_ejecuciones_anteriores(tmp_path):
+    dir_cache = tmp_path / 'cache'
+    rutas = _imagenes(tmp_path, 4)
+    PreprocesadorImagenes(dir_cache=str(dir_cache)).preparar(rutas[0])
+    anterior = next(dir_cache.iterdir())
+    os.utime(anterior, (0, 0))
+    tamano = anterior.stat().st_size
+
+    preprocesador = PreprocesadorImagenes(dir_cache=str(dir_cache), max_bytes_cache=tamano * 2)
+    for ruta in rutas[1:]:
+        preprocesador.preparar(ruta)
+
+    assert not anterior.exists()
+
+
+def test_sin_pypdfium2_se_avisa_una_sola_vez(tmp_path, monkeypatch, caplog):
+    monkeypatch.setitem(sys.modules, 'pypdfium2', None)
+    monkeypatch.setattr(preprocesado_imagenes, '_aviso_sin_pypdfium2', False)
+    ruta_pdf = tmp_path / 'evidencia.pdf'
+    ruta_pdf.write_bytes(b'%PDF-1.4\n%%EOF\n')
+    prefiltro = PrefiltroEvidencias()
+
+    with caplog.at_level(logging.WARNING, logger='preprocesado_imagenes'):
+        # El prefiltro no puede revisarlo y lo deja pasar
+        assert prefiltro.revisar(str(ruta_pdf)) is None
+        assert prefiltro.revisar(str(ruta_pdf)) is None
+        with pytest.raises(ImportError, match='pypdfium2'):
+            rasterizar_pdf(ruta_pdf.read_bytes())
+
+    avisos = [registro for registro in caplog.records if 'pypdfium2' in registro.getMessage()]
+    assert len(avisos) == 1
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from cache_resultados import CacheResultados
+from conftest import crear_validador, procesar
+from modelo_falso import ModeloFalso
+from salida_estructurada import CAMPOS_RESPUESTA, PresupuestoCampos, recortar_campos, reparar_json
+
+RESPUESTA = {
+    'nombre_encontrado': 'Ana Pérez',
+    'fecha_encontrada': '14 de febrero de 2024',
+    'tareas_identificadas': ['Revisión de código', 'Despliegue'],
+    'justificacion': 'Commit de Ana Pérez en el repositorio del proyecto',
+}
+
+
+def test_json_valido_no_se_repara():
+    datos, reparado = reparar_json(json.dumps(RESPUESTA), CAMPOS_RESPUESTA)
+    assert datos == RESPUESTA
+    assert not reparado
+
+
+def test_repara_marcadores_texto_y_comas_finales():
+    texto = 'Aquí tienes el análisis:\n```json\n' + json.dumps(RESPUESTA)[:-1] + ',}\n```\nEspero que ayude'
+    datos, reparado = reparar_json(texto, CAMPOS_RESPUESTA)
+    assert datos == RESPUESTA
+    assert reparado
+
+
+def test_respuesta_cortada_dentro_de_una_cadena_es_mal_formada():
+    texto = json.dumps(RESPUESTA, ensure_ascii=False)
+    corte = texto.index('Commit de Ana') + len('Commit de')
+    with pytest.raises(json.JSONDecodeError):
+        reparar_json(texto[:corte], CAMPOS_RESPUESTA)
+
+
+def test_respuesta_cortada_sin_campos_obligatorios_es_mal_formada():
+    texto = json.dumps(RESPUESTA, ensure_ascii=False)
+    # Cortada justo después de la lista de tareas: falta la justificación
+    corte = texto.index('"justificacion"')
+    with pytest.raises(json.JSONDecodeError, match='justificacion'):
+        reparar_json(texto[:corte], CAMPOS_RESPUESTA)
+
+
+def test_respuesta_cortada_entre_campos_con_todo_lo_obligatorio():
+    texto = json.dumps(dict(RESPUESTA, contenido_relevante='Texto'), ensure_ascii=False)
+    corte = texto.index('"contenido_relevante"')
+    datos, reparado = reparar_json(texto[:corte], CAMPOS_RESPUESTA)
+    assert datos == RESPUESTA
+    assert reparado
+
+
+def test_lote_cortado_con_un_objeto_incompleto_es_mal_formado():
+    texto = json.dumps([RESPUESTA, RESPUESTA], ensure_ascii=False)
+    with pytest.raises(json.JSONDecodeError):
+        reparar_json(texto[:len(texto) - 30], CAMPOS_RESPUESTA)
+
+
+def test_recortar_campos_aplica_el_presupuesto():
+    presupuesto = PresupuestoCampos(nombre=3, tareas=1, tarea=4, justificacion=5)
+    recortados = recortar_campos(RESPUESTA, presupuesto)
+    assert recortados['nombre_encontrado'] == 'Ana'
+    assert recortados['tareas_identificadas'] == ['Revi']
+    assert recortados['justificacion'] == 'Commi'
+    assert recortados['fecha_encontrada'] == RESPUESTA['fecha_encontrada']
+
+
+def test_respuesta_cortada_es_error_y_no_se_cachea(evidencias, tmp_path):
+    ruta_csv, rutas = evidencias
+    ruta_salida = str(tmp_path / 'salida.csv')
+    cache = CacheResultados(str(tmp_path / 'cache.sqlite'))
+    try:
+        # Todas las respuestas cortadas a mitad, como al agotar max_output_tokens
+        cortado = crear_validador(ModeloFalso(latencia=0, tasa_malformada=1.0), cache=cache)
+        resultados = procesar(cortado, ruta_csv, ruta_salida)
+        assert all(fila['Nombre_encontrado'] == 'Error' for fila in resultados)
+        assert cortado.metricas.informe()['respuestas']['malformada'] == len(rutas)
+        assert cache.estadisticas()['entradas'] == 0
+
+        # Al reanudar se vuelven a pedir todas (no hay negativos falsos en la caché)
+        modelo = ModeloFalso(latencia=0)
+        resultados = procesar(crear_validador(modelo, cache=cache), ruta_csv, ruta_salida, reanudar=True)
+    finally:
+        cache.cerrar()
+
+    assert modelo.llamadas == len(rutas)
+    assert [fila['Link_imagen'] for fila in resultados] == rutas
+    assert all(fila['Nombre_ok'] == '1' and fila['Periodo_ok'] == '1' for fila in resultados)
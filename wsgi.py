@@ -0,0 +1,112 @@
+'''
+Punto de entrada de producción del servidor de revisión.
+
+server.py arranca el servidor de desarrollo de Werkzeug (un proceso, con recarga
+automática). Para servir a varios revisores a la vez se usa este módulo, que expone
+la aplicación WSGI (wsgi:app) y la arranca con un pool de workers:
+
+    gunicorn   -> si está instalado (Linux/macOS): por defecto un proceso con M hilos
+    waitress   -> si está instalado (también Windows): un proceso con M hilos
+    werkzeug   -> sin ninguno de los dos: un proceso con hilos, sin recarga ni depurador
+
+Al arrancar se precomprime el build del frontend (frontend/dist), que se sirve en /.
+
+Uso:
+    uv run python wsgi.py --threads 16
+    SERVIDOR_THREADS=16 uv run python wsgi.py
+    uv run gunicorn -w 1 --threads 16 -k gthread -b 0.0.0.0:5001 wsgi:app
+
+Las validaciones lanzadas con POST /api/ejecuciones y sus eventos SSE viven en
+memoria del worker que las recibió; con varios workers, las peticiones que llegan a
+otro responden 404. Por eso por defecto hay un solo worker con varios hilos (el
+trabajo pesado, las llamadas a Gemini, espera E/S y no necesita más procesos).
+--workers N solo tiene sentido sin lanzar validaciones desde el servidor o tras un
+balanceador con afinidad de sesión: cada worker tiene su propia copia en memoria de
+los resultados y del índice de búsqueda (que se abre en cada worker, después del
+fork), coherentes a través del CSV y su registro de cambios con bloqueo de fichero.
+'''
+
+import argparse
+import logging
+import os
+
+from server import app, estaticos
+
+logger = logging.getLogger(__name__)
+
+# Los ficheros .gz/.br se generan una vez; si ya están al día no se tocan
+estaticos.precomprimir()
+
+
+def servir_gunicorn(host: str, puerto: int, workers: int, threads: int):
+    from gunicorn.app.base import BaseApplication
+
+    class Aplicacion(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{host}:{puerto}")
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            # Los hilos atienden las conexiones SSE largas sin bloquear un worker entero
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('timeout', 120)
+            self.cfg.set('accesslog', '-')
+
+        def load(self):
+            return app
+
+    Aplicacion().run()
+
+
+def servir_waitress(host: str, puerto: int, threads: int):
+    from waitress import serve
+
+    serve(app, host=host, port=puerto, threads=threads)
+
+
+def servir_werkzeug(host: str, puerto: int):
+    from werkzeug.serving import run_simple
+
+    run_simple(host, puerto, app, threaded=True, use_reloader=False, use_debugger=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor de producción del validador de evidencias')
+    parser.add_argument('--host', default=os.getenv('SERVIDOR_HOST', '0.0.0.0'))
+    parser.add_argument('--puerto', type=int, default=int(os.getenv('SERVIDOR_PUERTO', '5001')))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SERVIDOR_WORKERS', '1')),
+                        help='Procesos del servidor (solo gunicorn; las validaciones y su SSE viven en uno solo)')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('SERVIDOR_THREADS', '16')),
+                        help='Hilos por proceso')
+    parser.add_argument('--servidor', choices=['auto', 'gunicorn', 'waitress', 'werkzeug'], default='auto',
+                        help='Servidor WSGI (auto: el primero instalado)')
+    args = parser.parse_args()
+
+    servidor = args.servidor
+    if servidor == 'auto':
+        for candidato in ('gunicorn', 'waitress'):
+            try:
+                __import__(candidato)
+                servidor = candidato
+                break
+            except ImportError:
+                continue
+        else:
+            servidor = 'werkzeug'
+
+    logger.info(f"Iniciando servidor {servidor} en {args.host}:{args.puerto} "
+                f"({args.workers if servidor == 'gunicorn' else 1} workers x {args.threads} hilos)")
+    if servidor == 'gunicorn' and args.workers > 1:
+        logger.warning(f"{args.workers} workers: las validaciones lanzadas desde el servidor y su progreso "
+                       "por SSE solo están en el worker que las recibe (usa afinidad de sesión o --workers 1)")
+    if servidor == 'gunicorn':
+        servir_gunicorn(args.host, args.puerto, args.workers, args.threads)
+    elif servidor == 'waitress':
+        servir_waitress(args.host, args.puerto, args.threads)
+    else:
+        logger.warning("Ni gunicorn ni waitress están instalados: se usa Werkzeug con hilos "
+                       "(pip install gunicorn para varios procesos)")
+        servir_werkzeug(args.host, args.puerto)
+
+
+if __name__ == '__main__':
+    main()